@@ -1,6 +1,10 @@
-from django.db.models import Count
+import asyncio
+import copy
+from collections import defaultdict
+from django.db.models import Count, Max, Prefetch, Sum
 from ninja import Router, Form, Query, File
 from ninja.pagination import paginate
+from ninja.decorators import decorate_view
 from ninja.files import UploadedFile
 from ninja.errors import ValidationError
 from django.db import IntegrityError
@@ -11,13 +15,49 @@ from asgiref.sync import sync_to_async
 
 from users.api import AsyncHttpBearer
 from artists.models import Artist
-from helpers import make_errors, image_is_valid
-from schemas import AlbumArtist, AlbumSchemaIn, AlbumFilter, AlbumFull, AlbumArtistTrackCount
-from .models import Album
+from helpers import make_errors, aimage_is_valid
+from batch import match_uploads, save_batch_items, adiscard_files
+from pagination import CursorPagination
+from responsecache.cache import cache_response
+from responsecache.conditional import conditional
+from thumbnails.derivatives import agenerate_thumbnails, adelete_thumbnails
+from tracks.models import Track
+from schemas import (
+    AlbumArtist, AlbumSchemaIn, AlbumFilter, AlbumFull, AlbumArtistTrackCount,
+    AlbumBatchIn, BatchResult, AlbumSchema, ArtistSchema, TrackSchema, only_fields
+)
+from .models import Album, recount_album_artists
+
+
+staff_auth = AsyncHttpBearer(is_staff=True, stateless=True)
+router = Router(tags=['Albums'], auth=staff_auth)
 
 
-staff_auth = AsyncHttpBearer(is_staff=True)
-router = Router(tags=['Albums'], auth=staff_auth)
+# Validators of the representations, see `responsecache.conditional`
+async def albums_state(request, **kwargs):
+    albums = await Album.objects.aaggregate(
+        Max('updated_at'), Count('pk'), Sum('track_count'))
+    artists = await Artist.objects.aaggregate(Max('updated_at'))
+    return (*albums.values(), *artists.values())
+
+
+async def album_state(request, albumID: int):
+    state = await Album.objects.filter(pk=albumID).aaggregate(
+        Max('updated_at'), Max('artist__updated_at'), Max('track__artists__updated_at'))
+    return None if state['updated_at__max'] is None else tuple(state.values())
+
+
+def album_queryset():
+    """
+    Everything rendered by `AlbumFull` is loaded with three queries: album
+    joined with its artist, tracks and artists of all the tracks.
+    """
+    artists = Artist.objects.only(*only_fields(ArtistSchema))
+    tracks = Track.objects.only('album', *only_fields(TrackSchema)).order_by(
+        'number', 'pk').prefetch_related(Prefetch('artists', queryset=artists))
+    return Album.objects.select_related('artist').only(
+        'artist', *only_fields(AlbumSchema), *only_fields(ArtistSchema, 'artist__')
+    ).prefetch_related(Prefetch('track_set', queryset=tracks))
 
 
 @router.post('', response={201: AlbumArtistTrackCount})
@@ -30,11 +70,13 @@ async def create_album(request, data: Form[AlbumSchemaIn], cover: UploadedFile =
         await Artist.objects.aget(pk=data.artist_id)
 
         # Validate image
-        if cover and not image_is_valid(cover):
+        if cover and not await aimage_is_valid(cover):
             errors.append(make_errors('image', _('File is not an image')))
         else:
             album = Album(cover=cover, **attrs)
             await album.asave()
+            if album.cover:
+                await agenerate_thumbnails(album.cover)
             return 201, await Album.objects.select_related('artist').aget(pk=album.pk)
 
     except Artist.DoesNotExist:
@@ -46,27 +88,115 @@ async def create_album(request, data: Form[AlbumSchemaIn], cover: UploadedFile =
     raise ValidationError(errors)
 
 
+@router.post('/batch', response=List[BatchResult])
+async def batch_albums(request, items: List[AlbumBatchIn],
+                       files: List[UploadedFile] = File(None)):
+    """
+    Create or update many albums at once. Sent as multipart form with
+    JSON array in the `items` field, covers are uploaded as `files`.
+    """
+    errors = defaultdict(list)
+    covers = await match_uploads(items, 'cover', files, errors)
+
+    # Whole batch is validated with three queries
+    artist_ids = {pk async for pk in Artist.objects.filter(
+        pk__in={item.artist_id for item in items}).values_list('pk', flat=True)}
+    existing = await Album.objects.ain_bulk(
+        {item.id for item in items if item.id is not None})
+    taken = {(artist_id, name): pk async for pk, artist_id, name in Album.objects.filter(
+        artist_id__in=artist_ids, name__in={item.name for item in items}
+    ).values_list('pk', 'artist_id', 'name')}
+
+    seen, ids = set(), set()
+    for i, item in enumerate(items):
+        key = (item.artist_id, item.name)
+        if item.artist_id not in artist_ids:
+            errors[i].append(make_errors('artist_id', _('Artist does not exist')))
+        if item.id is not None and item.id not in existing:
+            errors[i].append(make_errors('id', _('Album does not exist')))
+        elif item.id is not None and item.id in ids:
+            errors[i].append(make_errors('id', _('Album is changed by another item')))
+        ids.add(item.id)
+        if key in seen or taken.get(key, item.id) != item.id:
+            errors[i].append(make_errors(
+                'name', _("Artist's album with given name already exists")))
+        seen.add(key)
+
+    albums, uploaded, replaced = {}, {}, {}
+    for i, item in enumerate(items):
+        if errors.get(i):
+            continue
+        cover = covers.get(i)
+        attrs = item.dict(exclude={'id', 'cover'})
+        if item.id is None:
+            album = Album(**attrs)
+        else:
+            album = existing[item.id]
+            for k, value in attrs.items():
+                setattr(album, k, value)
+        if cover:
+            # Replaced covers are deleted only after the batch is saved
+            if album.cover:
+                replaced[i] = copy.copy(album.cover)
+            await sync_to_async(album.cover.save)(cover.name, cover, save=False)
+            album.cover_thumbnails = []
+            uploaded[i] = copy.copy(album.cover)
+        albums[i] = album
+
+    fields = ['name', 'genre', 'year', 'artist', 'cover', 'cover_thumbnails']
+    try:
+        conflicts = await save_batch_items(Album, albums, fields, recount_album_artists)
+    except BaseException:
+        await adiscard_files(list(uploaded.values()))
+        raise
+
+    # Albums named after the batch was validated
+    for i in conflicts:
+        errors[i].append(make_errors(
+            'name', _("Artist's album with given name already exists")))
+        del albums[i]
+    await adiscard_files(
+        [uploaded[i] for i in conflicts if i in uploaded]
+        + [file for i, file in replaced.items() if i in albums])
+
+    await asyncio.gather(*[
+        agenerate_thumbnails(albums[i].cover) for i in uploaded if i in albums
+    ])
+
+    return [
+        BatchResult(index=i, status=422, errors=errors[i]) if i not in albums
+        else BatchResult(index=i, status=200 if item.id else 201, id=albums[i].pk)
+        for i, item in enumerate(items)
+    ]
+
+
 @router.get('', response=List[AlbumArtistTrackCount], auth=None)
+@decorate_view(conditional(albums_state, modified=False), cache_response)
 @paginate
 async def get_albums(request, filters: Query[AlbumFilter]):
-    qs = Album.objects.select_related(
-        'artist').annotate(track_count=Count('track'))
-    return await sync_to_async(list)(filters.filter(qs))
+    qs = Album.objects.select_related('artist')
+    return filters.filter(qs)
+
+
+@router.get('/cursor', response=List[AlbumArtistTrackCount], auth=None)
+@decorate_view(conditional(albums_state, modified=False), cache_response)
+@paginate(CursorPagination, ordering='name')
+async def get_albums_cursor(request, filters: Query[AlbumFilter]):
+    qs = Album.objects.select_related('artist')
+    return filters.filter(qs)
 
 
 @router.get('/{int:albumID}', response=AlbumFull, auth=None)
+@decorate_view(conditional(album_state), cache_response)
 async def get_album(request, albumID: int):
-    qs = Album.objects.prefetch_related(
-        'artist', 'track_set', 'track_set__artists')
-    album = await aget_object_or_404(qs, pk=albumID)
-    return album
+    return await aget_object_or_404(album_queryset(), pk=albumID)
 
 
 @router.put('/{int:albumID}', response=AlbumArtist)
 async def update_album(request, albumID: int, data: Form[AlbumSchemaIn], cover: UploadedFile = File(None)):
     errors = []
     args = data.dict(exclude_unset=True)
-    image_ok = cover is not None and image_is_valid(cover)
+    image_ok = cover is not None and await aimage_is_valid(cover)
     try:
         artist = await Artist.objects.aget(pk=data.artist_id)
         album = await Album.objects.aget(pk=albumID)
@@ -78,8 +208,10 @@ async def update_album(request, albumID: int, data: Form[AlbumSchemaIn], cover:
 
         # Delete old picture and set new one
         if image_ok:
+            await adelete_thumbnails(album.cover)
             await sync_to_async(album.cover.delete)(save=False)
             await sync_to_async(album.cover.save)(cover.name, cover)
+            await agenerate_thumbnails(album.cover)
         else:
             await album.asave()
 
@@ -92,6 +224,8 @@ async def update_album(request, albumID: int, data: Form[AlbumSchemaIn], cover:
             args['cover'] = cover
         album = await Album.objects.acreate(
             artist=artist, **args)
+        if album.cover:
+            await agenerate_thumbnails(album.cover)
 
     except IntegrityError:
         errors.append(make_errors('name', _("Artist's album already exists")))
@@ -104,6 +238,7 @@ async def update_album(request, albumID: int, data: Form[AlbumSchemaIn], cover:
 @router.delete('/{int:albumID}', response={204: None})
 async def delete_album(request, albumID: int):
     album = await aget_object_or_404(Album, pk=albumID)
+    await adelete_thumbnails(album.cover)
     await sync_to_async(album.cover.delete)(save=False)
     await album.adelete()
     return 204, None
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from albums.models import update_album_counts
+from tracks.models import update_track_counts
+
+
+class Command(BaseCommand):
+    help = 'Recount albums of artists and tracks of albums'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            artists = update_album_counts()
+            albums = update_track_counts()
+        self.stdout.write(f'Recounted {artists} artists and {albums} albums')
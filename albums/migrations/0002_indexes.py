@@ -0,0 +1,31 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:05
+
+from django.db import migrations, models
+
+from indexes import TrigramIndex
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('albums', '0001_initial'),
+        ('artists', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['year'], name='album_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['genre'], name='album_genre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['artist', 'year'], name='album_artist_year_idx'),
+        ),
+        # PostgreSQL only, used by icontains filters
+        TrigramIndex(model_name='album', field='name', name='album_name_trgm'),
+        TrigramIndex(model_name='album', field='genre', name='album_genre_trgm'),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:09
+
+from django.db import migrations, models
+
+from counters import recount
+
+
+def count_tracks(apps, schema_editor):
+    Album = apps.get_model('albums', 'Album')
+    recount(Album, 'track_count', apps.get_model('tracks', 'Track'), 'album')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('albums', '0002_indexes'),
+        ('tracks', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='track_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_tracks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('albums', '0004_album_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='cover_thumbnails',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
@@ -1,16 +1,28 @@
-from django.db import models
+from django.db import models, transaction, router
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.core.validators import MinValueValidator
 from artists.models import Artist
 
+from counters import CountersMixin, increment, recount, touch
+
 
 year_validators = [MinValueValidator(limit_value=0)]
 
-class Album(models.Model):
+class Album(CountersMixin, models.Model):
     name = models.CharField(max_length=200)
     cover = models.ImageField(upload_to='albums', null=True, blank=True)
+    # Sizes of generated thumbnails, see `thumbnails.derivatives`
+    cover_thumbnails = models.JSONField(default=list, blank=True, editable=False)
     artist = models.ForeignKey(Artist, on_delete=models.CASCADE)
     genre = models.CharField(max_length=50, null=True, blank=True)
     year = models.IntegerField(null=True, blank=True, validators=year_validators)
+    # Also bumped when related records change
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Maintained by `tracks.models`
+    track_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('track_count',)
 
     class Meta:
         constraints = [
@@ -18,3 +30,54 @@ class Album(models.Model):
                 fields=['artist_id', 'name'], name='unique_artist_album'
             )
         ]
+        indexes = [
+            models.Index(fields=['year'], name='album_year_idx'),
+            models.Index(fields=['genre'], name='album_genre_idx'),
+            # Albums of the artist ordered by release year
+            models.Index(fields=['artist', 'year'], name='album_artist_year_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        album = super().from_db(db, field_names, values)
+        # Artist the album is moved from when saved
+        album._loaded_artist_id = album.__dict__.get('artist_id')
+        return album
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        previous = getattr(self, '_loaded_artist_id', None)
+        update_fields = kwargs.get('update_fields')
+        moved = previous != self.artist_id and (
+            update_fields is None or 'artist' in update_fields)
+        using = kwargs.get('using') or router.db_for_write(Album, instance=self)
+
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            if adding:
+                increment(Artist, 'album_count', self.artist_id)
+            elif moved:
+                increment(Artist, 'album_count', previous, -1)
+                increment(Artist, 'album_count', self.artist_id)
+            touch(Artist, [self.artist_id, previous if moved else None])
+        self._loaded_artist_id = self.artist_id
+
+
+@receiver(post_delete, sender=Album)
+def decrement_album_count(sender, instance, **kwargs):
+    increment(Artist, 'album_count', instance.artist_id, -1)
+    touch(Artist, [instance.artist_id])
+
+
+def update_album_counts(artist_ids=None):
+    """Recount albums of the artists, of all artists when no ids are given"""
+    return recount(Artist, 'album_count', Album, 'artist', artist_ids)
+
+
+def recount_album_artists(albums):
+    """Recount albums of the artists the albums belong or belonged to"""
+    ids = set()
+    for album in albums:
+        ids.update([album.artist_id, getattr(album, '_loaded_artist_id', None)])
+    update_album_counts(ids)
+    touch(Artist, ids)
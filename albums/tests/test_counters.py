@@ -0,0 +1,62 @@
+import io
+from datetime import timedelta
+from django.core.management import call_command
+
+from helpers import TestHelper
+
+from artists.models import Artist
+from albums.models import Album
+from tracks.models import Track
+
+
+class TestCounters(TestHelper):
+    async def create_track(self, album):
+        return await Track.objects.acreate(
+            file='tracks/song.wav', title='Piano Man', album=album,
+            duration=timedelta(seconds=200))
+
+    async def counts(self, *objects):
+        for obj in objects:
+            await obj.arefresh_from_db()
+        return [obj.album_count if isinstance(obj, Artist) else obj.track_count
+                for obj in objects]
+
+    async def test_counters_follow_creation_moves_and_deletion(self):
+        artist = await self.create_artist()
+        artist2 = await self.create_artist('Ray Charles')
+        album = await self.create_album('Piano Man', artist)
+        album2 = await self.create_album('Streetlife Serenade', artist)
+        track = await self.create_track(album)
+        await self.create_track(album)
+
+        self.assertEqual(await self.counts(artist, album, album2), [2, 2, 0])
+
+        track.album = album2
+        await track.asave()
+        album2.artist = artist2
+        await album2.asave()
+        # Stale instance does not overwrite the counter
+        await artist.asave()
+
+        self.assertEqual(await self.counts(artist, artist2, album, album2), [1, 1, 1, 1])
+
+        await track.adelete()
+        await album.adelete()
+
+        self.assertEqual(await self.counts(artist, album2), [0, 0])
+
+    def test_counters_can_be_repaired(self):
+        artist = Artist.objects.create(name='Billy Joel')
+        album = Album.objects.create(name='Piano Man', artist=artist)
+        Track.objects.create(file='tracks/song.wav', title='Piano Man', album=album,
+                             duration=timedelta(seconds=200))
+        Artist.objects.update(album_count=7)
+        Album.objects.update(track_count=7)
+
+        out = io.StringIO()
+        call_command('repair_counters', stdout=out)
+
+        artist.refresh_from_db()
+        album.refresh_from_db()
+        self.assertEqual([artist.album_count, album.track_count], [1, 1])
+        self.assertIn('Recounted 1 artists and 1 albums', out.getvalue())
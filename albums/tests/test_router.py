@@ -1,15 +1,19 @@
+import json
 import tempfile
 from datetime import timedelta
 from ninja.testing import TestAsyncClient
 from django.core.files import File
+from django.utils.datastructures import MultiValueDict
 
-from helpers import TestHelper
+from helpers import TestHelper, plain_storage
 
 from albums.api import router
 from albums.models import Album
+from artists.models import Artist
 from tracks.models import Track
 
 
+@plain_storage
 class TestRouter(TestHelper):
     def setUp(self):
         self.client = TestAsyncClient(router)
@@ -37,13 +41,19 @@ class TestRouter(TestHelper):
                 'id': 1,
                 'name': 'Cold Spring Harbor',
                 'cover': '/media/albums/image.jpg',
+                'cover_thumbnails': {
+                    '64': '/media/thumbnails/64/albums/image.jpg.webp',
+                    '256': '/media/thumbnails/256/albums/image.jpg.webp',
+                    '1024': '/media/thumbnails/1024/albums/image.jpg.webp',
+                },
                 'genre': 'Pop',
                 'year': None,
                 'track_count': 0,
                 'artist': {
                     'id': 1,
                     'name': 'Billy Joel',
-                    'image': None
+                    'image': None,
+                    'image_thumbnails': None,
                 }
             }
             self.assertEqual(response.status_code, 201)
@@ -65,12 +75,14 @@ class TestRouter(TestHelper):
                     'id': 1,
                     'name': albums[0].name,
                     'cover': None,
+                    'cover_thumbnails': None,
                     'year': None,
                     'genre': None,
                     'artist': {
                         'id': 1,
                         'name': artist.name,
                         'image': None,
+                        'image_thumbnails': None,
                     },
                     'track_count': 0,
                 }
@@ -99,6 +111,29 @@ class TestRouter(TestHelper):
         self.assertEqual(json['artist']['name'], 'Billy Joel')
         self.assertEqual(json['tracks'][0]['title'], 'Why Judy Why')
 
+    async def test_album_details_are_loaded_with_constant_number_of_queries(self):
+        album = await self.create_album('Piano Man')
+        guests = await Artist.objects.abulk_create(
+            [Artist(name=f'Guest {i}') for i in range(200)])
+        tracks = await Track.objects.abulk_create([
+            Track(file=f'tracks/{i}.wav', title=f'Track {i}', number=40 - i,
+                  duration=timedelta(seconds=200), album=album)
+            for i in range(40)
+        ])
+        await Track.artists.through.objects.abulk_create([
+            Track.artists.through(track_id=track.pk, artist_id=guest.pk)
+            for i, track in enumerate(tracks) for guest in guests[i * 5:i * 5 + 5]
+        ])
+
+        # One query for the validators, three to load album, tracks and artists
+        async with self.assertMaxQueries(4):
+            response = await self.client.get(f'/{album.pk}')
+        json = response.json()
+
+        self.assertEqual([t['number'] for t in json['tracks']], list(range(1, 41)))
+        self.assertEqual(sum(len(t['artists']) for t in json['tracks']), 200)
+        self.assertEqual(json['artist']['name'], 'Billy Joel')
+
     async def test_regular_user_can_not_update_album(self):
         user = await self.create_user()
         head = self.make_auth_header(user)
@@ -126,12 +161,18 @@ class TestRouter(TestHelper):
                 'id': 1,
                 'name': 'Cold Spring Harbor',
                 'cover': '/media/albums/image.jpg',
+                'cover_thumbnails': {
+                    '64': '/media/thumbnails/64/albums/image.jpg.webp',
+                    '256': '/media/thumbnails/256/albums/image.jpg.webp',
+                    '1024': '/media/thumbnails/1024/albums/image.jpg.webp',
+                },
                 'year': 1971,
                 'genre': 'Rock',
                 'artist': {
                     'id': 1,
                     'name': 'Billy Joel',
-                    'image': None
+                    'image': None,
+                    'image_thumbnails': None,
                 }
             }
             self.assertEqual(response.status_code, 200)
@@ -167,3 +208,33 @@ class TestRouter(TestHelper):
             self.assertFalse(self.fileExists(td, 'albums/image.jpg'))
             self.assertEqual(response.status_code, 204)
             self.assertEqual(response2.status_code, 404)
+
+    async def test_staff_member_can_add_albums_in_batch(self):
+        member = await self.create_staff_member()
+        head = self.make_auth_header(member)
+        artist = await self.create_artist()
+        album = await self.create_album('Pianoman', artist)
+        items = [
+            {'name': 'Piano Man', 'artist_id': artist.pk, 'year': 1973, 'cover': 'cover.png'},
+            {'name': 'The Stranger', 'artist_id': artist.pk},
+            {'name': 'The Stranger', 'artist_id': artist.pk},
+            {'name': 'Arrival', 'artist_id': 42},
+            {'id': album.pk, 'name': 'Cold Spring Harbor', 'artist_id': artist.pk},
+        ]
+
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td, FILE_UPLOAD_TEMP_DIR=td):
+            cover = self.temp_file(self.image_file('cover.png'), 'image/png', write=True)
+            res = await self.client.post(
+                '/batch', {'items': json.dumps(items)},
+                FILES=MultiValueDict({'files': [cover]}), headers=head)
+            results = res.json()
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual([r['status'] for r in results], [201, 201, 422, 422, 200])
+            self.assertEqual(results[3]['errors'][0]['loc'], ['form', 'artist_id'])
+            self.assertTrue(self.fileExists(td, 'albums/cover.png'))
+            self.assertEqual(await Album.objects.filter(artist=artist).acount(), 3)
+            await artist.arefresh_from_db()
+            self.assertEqual(artist.album_count, 3)
+            await album.arefresh_from_db()
+            self.assertEqual(album.name, 'Cold Spring Harbor')
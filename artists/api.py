@@ -1,6 +1,10 @@
-from django.db.models import Count
+import asyncio
+import copy
+from collections import defaultdict
+from django.db.models import Count, Max, Prefetch, Sum
 from ninja import Router, Form, Query, File
 from ninja.pagination import paginate
+from ninja.decorators import decorate_view
 from ninja.files import UploadedFile
 from ninja.errors import ValidationError
 from django.db import IntegrityError
@@ -9,16 +13,44 @@ from django.shortcuts import aget_object_or_404
 from typing import List, Optional
 from asgiref.sync import sync_to_async
 
-from schemas import ArtistSchema, ArtistAlbumCount, ArtistFilter, ArtistFull
+from schemas import (
+    ArtistSchema, ArtistAlbumCount, ArtistFilter, ArtistFull,
+    ArtistBatchIn, BatchResult, AlbumSchema, only_fields
+)
+from albums.models import Album
 from .models import Artist
 from users.api import AsyncHttpBearer
-from helpers import make_errors, image_is_valid
+from helpers import make_errors, aimage_is_valid
+from batch import match_uploads, save_batch_items, adiscard_files
+from pagination import CursorPagination
+from responsecache.cache import cache_response
+from responsecache.conditional import conditional
+from thumbnails.derivatives import agenerate_thumbnails, adelete_thumbnails
 
 
-staff_auth = AsyncHttpBearer(is_staff=True)
+staff_auth = AsyncHttpBearer(is_staff=True, stateless=True)
 router = Router(tags=['Artists'], auth=staff_auth)
 
 
+# Validators of the representations, see `responsecache.conditional`
+async def artists_state(request, **kwargs):
+    state = await Artist.objects.aaggregate(
+        Max('updated_at'), Count('pk'), Sum('album_count'))
+    return tuple(state.values())
+
+
+async def artist_state(request, artistID: int):
+    return await Artist.objects.filter(pk=artistID).values_list(
+        'updated_at', 'album_count').afirst()
+
+
+def artist_queryset():
+    """`ArtistFull` is loaded with two queries, the artist and its albums"""
+    albums = Album.objects.only('artist', *only_fields(AlbumSchema))
+    return Artist.objects.only(*only_fields(ArtistSchema)).prefetch_related(
+        Prefetch('album_set', queryset=albums))
+
+
 @router.post('', response={201: ArtistSchema})
 async def create_artist(request, name: Form[str], image: UploadedFile = File(None)):
     errors = []
@@ -26,7 +58,7 @@ async def create_artist(request, name: Form[str], image: UploadedFile = File(Non
         artist = Artist(name=name)
         # Validate the image if provided
         if image:
-            if image_is_valid(image):
+            if await aimage_is_valid(image):
                 artist.image = image
             else:
                 errors.append(make_errors('image', _('File is not an image')))
@@ -38,20 +70,103 @@ async def create_artist(request, name: Form[str], image: UploadedFile = File(Non
         raise ValidationError(errors)
     else:
         await artist.asave()
+        if artist.image:
+            await agenerate_thumbnails(artist.image)
         return 201, artist
 
 
+@router.post('/batch', response=List[BatchResult])
+async def batch_artists(request, items: List[ArtistBatchIn],
+                        files: List[UploadedFile] = File(None)):
+    """
+    Create or update many artists at once. Sent as multipart form with
+    JSON array in the `items` field, images are uploaded as `files`.
+    """
+    errors = defaultdict(list)
+    images = await match_uploads(items, 'image', files, errors)
+
+    # Whole batch is validated with two queries
+    existing = await Artist.objects.ain_bulk(
+        {item.id for item in items if item.id is not None})
+    taken = {name: pk async for name, pk in Artist.objects.filter(
+        name__in={item.name for item in items}).values_list('name', 'pk')}
+
+    seen, ids = set(), set()
+    for i, item in enumerate(items):
+        if item.id is not None and item.id not in existing:
+            errors[i].append(make_errors('id', _('Artist does not exist')))
+        elif item.id is not None and item.id in ids:
+            errors[i].append(make_errors('id', _('Artist is changed by another item')))
+        ids.add(item.id)
+        if item.name in seen or taken.get(item.name, item.id) != item.id:
+            errors[i].append(make_errors('name', _('Artist already exists')))
+        seen.add(item.name)
+
+    artists, uploaded, replaced = {}, {}, {}
+    for i, item in enumerate(items):
+        if errors.get(i):
+            continue
+        image = images.get(i)
+        if item.id is None:
+            artist = Artist(name=item.name)
+        else:
+            artist = existing[item.id]
+            artist.name = item.name
+        if image:
+            # Replaced images are deleted only after the batch is saved
+            if artist.image:
+                replaced[i] = copy.copy(artist.image)
+            await sync_to_async(artist.image.save)(image.name, image, save=False)
+            artist.image_thumbnails = []
+            uploaded[i] = copy.copy(artist.image)
+        artists[i] = artist
+
+    try:
+        conflicts = await save_batch_items(
+            Artist, artists, ['name', 'image', 'image_thumbnails'])
+    except BaseException:
+        await adiscard_files(list(uploaded.values()))
+        raise
+
+    # Names taken after the batch was validated
+    for i in conflicts:
+        errors[i].append(make_errors('name', _('Artist already exists')))
+        del artists[i]
+    await adiscard_files(
+        [uploaded[i] for i in conflicts if i in uploaded]
+        + [file for i, file in replaced.items() if i in artists])
+
+    await asyncio.gather(*[
+        agenerate_thumbnails(artists[i].image) for i in uploaded if i in artists
+    ])
+
+    return [
+        BatchResult(index=i, status=422, errors=errors[i]) if i not in artists
+        else BatchResult(index=i, status=200 if item.id else 201, id=artists[i].pk)
+        for i, item in enumerate(items)
+    ]
+
+
 @router.get('', response=List[ArtistAlbumCount], auth=None)
+@decorate_view(conditional(artists_state, modified=False), cache_response)
 @paginate
 async def get_artists(request, filters: Query[ArtistFilter]):
-    qs = Artist.objects.annotate(album_count=Count('album'))
-    return await sync_to_async(list)(filters.filter(qs))
+    qs = Artist.objects.all()
+    return filters.filter(qs)
+
+
+@router.get('/cursor', response=List[ArtistAlbumCount], auth=None)
+@decorate_view(conditional(artists_state, modified=False), cache_response)
+@paginate(CursorPagination, ordering='name')
+async def get_artists_cursor(request, filters: Query[ArtistFilter]):
+    qs = Artist.objects.all()
+    return filters.filter(qs)
 
 
 @router.get('/{int:artistID}', response=ArtistFull, auth=None)
+@decorate_view(conditional(artist_state), cache_response)
 async def get_artist(request, artistID: int):
-    qs = Artist.objects.prefetch_related('album_set', 'album_set__artist').annotate(album_count=Count('album'))
-    return await aget_object_or_404(qs, pk=artistID)
+    return await aget_object_or_404(artist_queryset(), pk=artistID)
 
 
 @router.put('/{int:artistID}', response=ArtistSchema)
@@ -77,9 +192,10 @@ async def update_artist(
         except Artist.DoesNotExist:
             artist.name = name
 
-    if image and image_is_valid(image):
+    if image and await aimage_is_valid(image):
         # Remove old image
         if artist.image:
+            await adelete_thumbnails(artist.image)
             await sync_to_async(artist.image.delete)(save=False)
         await sync_to_async(artist.image.save)(image.name, image, save=False)
     else:
@@ -87,6 +203,7 @@ async def update_artist(
             'image', _('File is not an image')))
 
     await artist.asave()
+    await agenerate_thumbnails(artist.image)
 
     return 200, artist
 
@@ -97,6 +214,7 @@ async def delete_artist(request, artistID: int):
 
     # Delete artists image
     if artist.image:
+        await adelete_thumbnails(artist.image)
         await sync_to_async(artist.image.delete)(save=False)
 
     await artist.adelete()
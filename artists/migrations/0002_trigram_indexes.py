@@ -0,0 +1,15 @@
+from django.db import migrations
+
+from indexes import TrigramIndex
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('artists', '0001_initial'),
+    ]
+
+    operations = [
+        # PostgreSQL only, used by icontains filters
+        TrigramIndex(model_name='artist', field='name', name='artist_name_trgm'),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:09
+
+from django.db import migrations, models
+
+from counters import recount
+
+
+def count_albums(apps, schema_editor):
+    Artist = apps.get_model('artists', 'Artist')
+    recount(Artist, 'album_count', apps.get_model('albums', 'Album'), 'artist')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('artists', '0002_trigram_indexes'),
+        ('albums', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='artist',
+            name='album_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_albums, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,19 @@
 from django.db import models
 
+from counters import CountersMixin
 
-class Artist(models.Model):
+
+class Artist(CountersMixin, models.Model):
     name = models.CharField(max_length=200, unique=True)
     image = models.ImageField(upload_to='artists', null=True, blank=True)
+    # Sizes of generated thumbnails, see `thumbnails.derivatives`
+    image_thumbnails = models.JSONField(default=list, blank=True, editable=False)
+    # Also bumped when related records change
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Maintained by `albums.models`
+    album_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('album_count',)
 
     def __str__(self):
         return self.name
@@ -1,14 +1,20 @@
+import json
 import tempfile
+from unittest import mock
 from ninja.testing import TestAsyncClient
 from django.core.files import File
+from django.utils.datastructures import MultiValueDict
 
-from helpers import TestHelper
+from helpers import TestHelper, plain_storage
+from batch import save_batch_items
 
 from artists.api import router
+from pagination import encode_cursor
 from artists.models import Artist
 from albums.models import Album
 
 
+@plain_storage
 class TestRouter(TestHelper):
     def setUp(self):
         self.client = TestAsyncClient(router)
@@ -29,6 +35,11 @@ class TestRouter(TestHelper):
                 'id': 1,
                 'name': 'Billy Joel',
                 'image': '/media/artists/image.jpg',
+                'image_thumbnails': {
+                    '64': '/media/thumbnails/64/artists/image.jpg.webp',
+                    '256': '/media/thumbnails/256/artists/image.jpg.webp',
+                    '1024': '/media/thumbnails/1024/artists/image.jpg.webp',
+                },
             }
             self.assertEqual(res.status_code, 201)
             self.assertEqual(res2.status_code, 401)
@@ -59,11 +70,13 @@ class TestRouter(TestHelper):
             'id': 1,
             'name': 'David Bowie',
             'image': None,
+            'image_thumbnails': None,
             'albums': [
                 {
                     'id': 1,
                     'name': 'The Man Who Sold The World',
                     'cover': None,
+                    'cover_thumbnails': None,
                     'genre': None,
                     'year': None,
                 }
@@ -149,3 +162,124 @@ class TestRouter(TestHelper):
             self.assertFalse(self.fileExists(td, 'artists/test.jpg'))
             with self.assertRaises(Artist.DoesNotExist):
                 await Artist.objects.aget(pk=artist.pk)
+
+    async def test_guest_user_can_scroll_artists_with_cursor(self):
+        names = ['Bob Marley', 'Johnny Cash', 'Bob Dylan', 'Billy Joel', 'ABBA']
+        await Artist.objects.abulk_create([Artist(name=n) for n in names])
+
+        response = await self.client.get('/cursor?limit=2')
+        page = response.json()
+        response2 = await self.client.get(f"/cursor?limit=2&cursor={page['next']}")
+        page2 = response2.json()
+        response3 = await self.client.get(f"/cursor?limit=2&cursor={page2['previous']}")
+        page3 = response3.json()
+
+        self.assertEqual([a['name'] for a in page['items']], ['ABBA', 'Billy Joel'])
+        self.assertIsNone(page['previous'])
+        self.assertEqual([a['name'] for a in page2['items']], ['Bob Dylan', 'Bob Marley'])
+        self.assertEqual(page3['items'], page['items'])
+        self.assertIsNone(page3['previous'])
+
+    async def test_invalid_cursor_is_rejected(self):
+        response = await self.client.get('/cursor?cursor=junk')
+
+        self.assertEqual(response.status_code, 422)
+
+    async def test_tampered_cursor_is_rejected(self):
+        await self.create_artist()
+
+        for value in [None, True, [], {}]:
+            response = await self.client.get(f'/cursor?cursor={encode_cursor(value, 1)}')
+
+            self.assertEqual(response.status_code, 422)
+            self.assertEqual(response.json()['detail'][0]['msg'], 'Invalid cursor')
+
+    async def test_image_is_validated_before_saving_artist(self):
+        member = await self.create_staff_member()
+        head = self.make_auth_header(member)
+
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td, FILE_UPLOAD_TEMP_DIR=td):
+            image = self.temp_file(self.image_file('cover.png'), 'image/png', write=True)
+            junk = self.temp_file(self.content_file(b'%PDF-1.4' * 64, 'junk.png'), 'image/png', write=True)
+
+            res = await self.client.post('', {'name': 'ABBA'}, FILES={'image': image}, headers=head)
+            res2 = await self.client.post('', {'name': 'Queen'}, FILES={'image': junk}, headers=head)
+
+            self.assertEqual(res.status_code, 201)
+            self.assertTrue(self.fileExists(td, 'artists/cover.png'))
+            self.assertEqual(res2.status_code, 422)
+            self.assertFalse(self.fileExists(td, 'artists/junk.png'))
+
+    async def test_staff_member_can_add_artists_in_batch(self):
+        member = await self.create_staff_member()
+        head = self.make_auth_header(member)
+        existing = await self.create_artist()
+        items = [
+            {'name': 'ABBA', 'image': 'abba.png'},
+            {'name': 'Billy Joel'},
+            {'name': 'Queen', 'image': 'missing.png'},
+            {'id': existing.pk, 'name': 'William Joel'},
+            {'name': 'Toto'},
+        ]
+
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td, FILE_UPLOAD_TEMP_DIR=td):
+            image = self.temp_file(self.image_file('abba.png'), 'image/png', write=True)
+            res = await self.client.post(
+                '/batch', {'items': json.dumps(items)},
+                FILES=MultiValueDict({'files': [image]}), headers=head)
+            results = res.json()
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual([r['status'] for r in results], [201, 422, 422, 200, 201])
+            self.assertEqual(results[3]['id'], existing.pk)
+            self.assertEqual(results[2]['errors'][0]['loc'], ['form', 'image'])
+            self.assertTrue(self.fileExists(td, 'artists/abba.png'))
+            self.assertEqual(
+                await Artist.objects.filter(name__in=['ABBA', 'William Joel', 'Toto']).acount(), 3)
+
+    async def test_artist_is_changed_by_one_batch_item(self):
+        head = self.make_auth_header(await self.create_staff_member())
+        existing = await self.create_artist()
+        items = [
+            {'id': existing.pk, 'name': 'William Joel'},
+            {'id': existing.pk, 'name': 'Billy'},
+        ]
+
+        res = await self.client.post('/batch', {'items': json.dumps(items)}, headers=head)
+        results = res.json()
+        await existing.arefresh_from_db()
+
+        self.assertEqual([r['status'] for r in results], [200, 422])
+        self.assertEqual(results[1]['errors'][0]['loc'], ['form', 'id'])
+        self.assertEqual(existing.name, 'William Joel')
+
+    async def test_batch_keeps_files_until_it_is_saved(self):
+        head = self.make_auth_header(await self.create_staff_member())
+
+        async def concurrent(*args, **kwargs):
+            # Name is taken after the batch was validated
+            await Artist.objects.acreate(name='Toto')
+            return await save_batch_items(*args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td, FILE_UPLOAD_TEMP_DIR=td), \
+                mock.patch('artists.api.save_batch_items', concurrent):
+            existing = await Artist.objects.acreate(name='ABBA', image=self.image_file('old.png'))
+            old = existing.image.name
+            items = [
+                {'id': existing.pk, 'name': 'ABBA', 'image': 'new.png'},
+                {'name': 'Toto', 'image': 'toto.png'},
+            ]
+            files = [self.temp_file(self.image_file(name), 'image/png', write=True)
+                     for name in ['new.png', 'toto.png']]
+            res = await self.client.post(
+                '/batch', {'items': json.dumps(items)},
+                FILES=MultiValueDict({'files': files}), headers=head)
+            results = res.json()
+            await existing.arefresh_from_db()
+
+            self.assertEqual([r['status'] for r in results], [200, 422])
+            self.assertEqual(results[1]['errors'][0]['loc'], ['form', 'name'])
+            self.assertEqual(existing.image.name, 'artists/new.png')
+            self.assertTrue(self.fileExists(td, 'artists/new.png'))
+            self.assertFalse(self.fileExists(td, old))
+            self.assertFalse(self.fileExists(td, 'artists/toto.png'))
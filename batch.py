@@ -0,0 +1,105 @@
+import asyncio
+from django.db import IntegrityError, transaction
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django.core.files.uploadedfile import UploadedFile
+from asgiref.sync import sync_to_async
+from typing import Callable, Dict, List, Optional
+
+from helpers import make_errors, aimage_is_valid
+from search.backends import get_backend
+from responsecache.cache import response_cache
+from thumbnails.derivatives import adelete_thumbnails
+
+
+async def match_uploads(items: list, field: str, files: Optional[List[UploadedFile]],
+                        errors: Dict[int, list]) -> Dict[int, UploadedFile]:
+    """
+    Items of a batch reference their images by names of the uploaded files.
+    Returns valid images keyed by item index, problems are added to `errors`.
+    """
+    uploads = {file.name: file for file in files or []}
+    matched, used = {}, set()
+    for i, item in enumerate(items):
+        name = getattr(item, field)
+        if not name:
+            continue
+        if name not in uploads:
+            errors[i].append(make_errors(field, _('Upload does not exist')))
+        elif name in used:
+            errors[i].append(make_errors(field, _('Upload is used by another item')))
+        else:
+            used.add(name)
+            matched[i] = uploads[name]
+
+    valid = await asyncio.gather(*[aimage_is_valid(f) for f in matched.values()])
+    for i, ok in zip(list(matched), valid):
+        if not ok:
+            del matched[i]
+            errors[i].append(make_errors(field, _('File is not an image')))
+    return matched
+
+
+@sync_to_async
+def save_batch(model, created: list, updated: list, fields: List[str],
+               recount: Optional[Callable[[list], None]] = None):
+    """
+    Insert and update records of a batch in a single transaction. Bulk
+    queries bypass `save()`, so counters are fixed up by `recount`.
+    """
+    with transaction.atomic():
+        model.objects.bulk_create(created)
+        if updated:
+            # bulk_update() does not fill in auto_now fields
+            now = timezone.now()
+            for obj in updated:
+                obj.updated_at = now
+            model.objects.bulk_update(updated, fields + ['updated_at'])
+        if recount is not None:
+            recount(created + updated)
+        get_backend().index_objects(created + updated)
+        response_cache.invalidate()
+
+
+async def save_batch_items(model, objects: dict, fields: List[str],
+                           recount: Optional[Callable[[list], None]] = None) -> List[int]:
+    """
+    Save objects of a batch keyed by their item index. When the batch
+    conflicts with records written after it was validated, objects are
+    saved one by one and indices of the conflicting ones are returned.
+    """
+    adding = {i for i, obj in objects.items() if obj.pk is None}
+
+    def reset(indices):
+        # Keys assigned inside the rolled back transaction are gone
+        for i in indices:
+            objects[i].pk = None
+            objects[i]._state.adding = True
+
+    try:
+        await save_batch(model, [objects[i] for i in adding],
+                         [obj for i, obj in objects.items() if i not in adding],
+                         fields, recount)
+        return []
+    except IntegrityError:
+        reset(adding)
+
+    conflicts = []
+    for i, obj in objects.items():
+        try:
+            if i in adding:
+                await save_batch(model, [obj], [], fields, recount)
+            else:
+                await save_batch(model, [], [obj], fields, recount)
+        except IntegrityError:
+            reset({i} & adding)
+            conflicts.append(i)
+    return conflicts
+
+
+async def adiscard_files(files: List[FieldFile]):
+    """Delete stored files with their thumbnails, records are not changed"""
+    for file in files:
+        await adelete_thumbnails(file)
+        await sync_to_async(file.storage.delete)(file.name)
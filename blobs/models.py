@@ -0,0 +1,12 @@
+from django.db import models
+
+
+class Blob(models.Model):
+    """File stored once under its SHA-256 digest and shared by all records"""
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    references = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
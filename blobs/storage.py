@@ -0,0 +1,79 @@
+import hashlib
+import os
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction, IntegrityError
+from django.db.models import F
+
+from .models import Blob
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under `blobs/` named after the SHA-256 digest of its
+    content. Identical uploads share one file, which is removed when the
+    last record referencing it deletes it. Files never change once written,
+    so their URLs can be cached forever.
+    """
+    prefix = 'blobs'
+
+    def blob_name(self, digest: str, ext: str):
+        return f'{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+    def digest(self, content):
+        digest = getattr(content, 'sha256', None)
+        if digest:
+            return digest
+
+        hasher = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        return hasher.hexdigest()
+
+    def _save(self, name, content):
+        digest = self.digest(content)
+        blob_name = Blob.objects.filter(digest=digest).values_list(
+            'name', flat=True).first()
+
+        if blob_name is None:
+            ext = os.path.splitext(name)[1].lower()
+            blob_name = self.blob_name(digest, ext)
+            if not self.exists(blob_name):
+                # Temporary uploads are moved, not copied
+                blob_name = super()._save(blob_name, content)
+            try:
+                with transaction.atomic():
+                    Blob.objects.create(digest=digest, name=blob_name,
+                                        size=content.size, references=1)
+                return blob_name
+            except IntegrityError:
+                # The same content has been stored by a concurrent upload
+                blob_name = Blob.objects.get(digest=digest).name
+
+        Blob.objects.filter(digest=digest).update(references=F('references') + 1)
+        return blob_name
+
+    def references(self, name: str) -> int:
+        refs = Blob.objects.filter(name=name).values_list(
+            'references', flat=True).first()
+        if refs is None:
+            # Files stored before content addressing was enabled
+            return 1 if self.exists(name) else 0
+        return refs
+
+    def delete(self, name):
+        if not name:
+            raise ValueError("The name must be given to delete().")
+
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update().filter(name=name).first()
+            if blob is not None:
+                if blob.references > 1:
+                    Blob.objects.filter(pk=blob.pk).update(
+                        references=F('references') - 1)
+                    return
+                blob.delete()
+        super().delete(name)
@@ -0,0 +1,161 @@
+import hashlib
+import tempfile
+from ninja.testing import TestAsyncClient
+
+from helpers import TestHelper
+from artists.api import router
+from albums.api import router as albums_router
+from tracks.api import router as tracks_router
+from users.api import router as users_router
+from artists.models import Artist
+from albums.models import Album
+from tracks.models import Track
+from blobs.models import Blob
+
+
+class TestContentAddressedStorage(TestHelper):
+    def test_identical_files_are_stored_once(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            data = b'cover' * 100
+            digest = hashlib.sha256(data).hexdigest()
+            artist = Artist.objects.create(
+                name='ABBA', image=self.content_file(data, 'abba.jpg'))
+            album = Album.objects.create(
+                name='Waterloo', artist=artist,
+                cover=self.content_file(data, 'waterloo.JPG'))
+
+            blob = Blob.objects.get()
+            self.assertEqual(artist.image.name, f'blobs/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+            self.assertEqual(album.cover.name, artist.image.name)
+            self.assertEqual(blob.references, 2)
+            self.assertEqual(blob.size, len(data))
+
+    def test_file_is_deleted_with_last_reference(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            data = b'cover' * 100
+            artist = Artist.objects.create(
+                name='ABBA', image=self.content_file(data, 'abba.jpg'))
+            artist2 = Artist.objects.create(
+                name='Queen', image=self.content_file(data, 'queen.jpg'))
+            name = artist.image.name
+
+            artist.image.delete(save=False)
+            self.assertTrue(self.fileExists(td, name))
+            self.assertEqual(Blob.objects.get().references, 1)
+
+            artist2.image.delete(save=False)
+            self.assertFalse(self.fileExists(td, name))
+            self.assertFalse(Blob.objects.exists())
+
+    def test_digest_computed_during_upload_is_used(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            upload = self.content_file(b'data', 'abba.jpg')
+            upload.sha256 = 'f' * 64
+
+            artist = Artist.objects.create(name='ABBA', image=upload)
+
+            self.assertEqual(artist.image.name, f'blobs/ff/ff/{"f" * 64}.jpg')
+
+    async def test_uploaded_image_is_content_addressed(self):
+        client = TestAsyncClient(router)
+        member = await self.create_staff_member()
+        head = self.make_auth_header(member)
+
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td, FILE_UPLOAD_TEMP_DIR=td):
+            image = self.image_file('cover.png')
+            upload = self.temp_file(image, 'image/png', write=True)
+            digest = hashlib.sha256(image.open().read()).hexdigest()
+
+            response = await client.post('', {'name': 'ABBA'}, FILES={'image': upload}, headers=head)
+
+            self.assertEqual(response.status_code, 201)
+            self.assertIn(digest, response.json()['image'])
+            self.assertIsNotNone(response.json()['image_thumbnails'])
+
+
+class TestUploads(TestHelper):
+    """Uploads through the API with the storage used in production"""
+
+    def image_upload(self, size=(64, 64)):
+        return self.temp_file(self.image_file('cover.png', size), 'image/png', write=True)
+
+    async def references(self):
+        return {b.name: b.references async for b in Blob.objects.all()}
+
+    async def test_album_covers_are_shared_and_released(self):
+        client = TestAsyncClient(albums_router)
+        head = self.make_auth_header(await self.create_staff_member())
+        artist = await self.create_artist()
+
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td, FILE_UPLOAD_TEMP_DIR=td):
+            ids = []
+            for name in ['Piano Man', 'Streetlife Serenade']:
+                response = await client.post(
+                    '', {'name': name, 'artist_id': artist.pk},
+                    FILES={'cover': self.image_upload()}, headers=head)
+                ids.append(response.json()['id'])
+            albums = [a async for a in Album.objects.order_by('pk')]
+            shared = albums[0].cover.name
+            refs = await self.references()
+
+            await client.put(
+                f'/{ids[0]}', {'name': 'Piano Man', 'artist_id': artist.pk},
+                FILES={'cover': self.image_upload((32, 32))}, headers=head)
+            refs2 = await self.references()
+            await client.delete(f'/{ids[1]}', headers=head)
+            refs3 = await self.references()
+
+            self.assertEqual(albums[1].cover.name, shared)
+            self.assertEqual(refs, {shared: 2})
+            self.assertEqual(refs2[shared], 1)
+            self.assertEqual(len(refs3), 1)
+            self.assertNotIn(shared, refs3)
+            self.assertFalse(self.fileExists(td, shared))
+
+    async def test_replaced_avatar_is_released(self):
+        client = TestAsyncClient(users_router)
+        user = await self.create_user()
+        head = self.make_auth_header(user)
+
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td, FILE_UPLOAD_TEMP_DIR=td):
+            await self.create_user('jane', image=self.image_file())
+            await client.patch('', {}, FILES={'avatar': self.image_upload()}, headers=head)
+            await user.arefresh_from_db()
+            shared = user.avatar.name
+            refs = await self.references()
+
+            response = await client.patch(
+                '', {}, FILES={'avatar': self.image_upload((32, 32))}, headers=head)
+            refs2 = await self.references()
+            await client.delete('', headers=head)
+            refs3 = await self.references()
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(refs, {shared: 2})
+            self.assertEqual(refs2[shared], 1)
+            self.assertEqual(refs3, {shared: 1})
+            self.assertTrue(self.fileExists(td, shared))
+
+    async def test_track_files_are_shared_and_released(self):
+        client = TestAsyncClient(tracks_router)
+        head = self.make_auth_header(await self.create_staff_member())
+        data = {'title': 'Piano Man', 'duration': 'PT5M38S'}
+
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td, FILE_UPLOAD_TEMP_DIR=td):
+            ids = []
+            for _ in range(2):
+                file = self.temp_file(self.audio_file('piano.wav'), 'audio/wav', write=True)
+                response = await client.post('', data, FILES={'file': file}, headers=head)
+                ids.append(response.json()['id'])
+            shared = (await Track.objects.aget(pk=ids[0])).file.name
+            refs = await self.references()
+
+            await client.delete(f'/{ids[0]}', headers=head)
+            refs2 = await self.references()
+            await client.delete(f'/{ids[1]}', headers=head)
+            refs3 = await self.references()
+
+            self.assertEqual(refs, {shared: 2})
+            self.assertEqual(refs2, {shared: 1})
+            self.assertEqual(refs3, {})
+            self.assertFalse(self.fileExists(td, shared))
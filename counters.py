@@ -0,0 +1,48 @@
+from typing import Iterable, Optional
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+class CountersMixin:
+    """
+    Counter columns listed in `counter_fields` are changed with F() updates
+    only. Saving a loaded record never writes them, so stale values held in
+    memory can not overwrite counts changed in the meantime.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+def increment(model, field: str, pk, delta: int = 1):
+    if pk is None:
+        return
+    qs = model.objects.filter(pk=pk)
+    if delta < 0:
+        # Never below zero, even if counts got out of sync
+        qs = qs.filter(**{f'{field}__gte': -delta})
+    qs.update(**{field: F(field) + delta})
+
+
+def touch(model, pks: Iterable):
+    """Mark records as modified, their representation includes changed children"""
+    pks = set(pks) - {None}
+    if pks:
+        model.objects.filter(pk__in=pks).update(updated_at=timezone.now())
+
+
+def recount(model, field: str, related, fk: str, pks: Optional[Iterable] = None) -> int:
+    """Set the counter from related rows, of all records when `pks` is None"""
+    count = related.objects.filter(**{fk: OuterRef('pk')}).order_by().values(
+        fk).annotate(n=Count('pk')).values('n')
+    qs = model.objects.all()
+    if pks is not None:
+        qs = qs.filter(pk__in=set(pks) - {None})
+    return qs.update(**{field: Coalesce(Subquery(count), Value(0))})
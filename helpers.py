@@ -1,14 +1,25 @@
+import io
 import os
+import threading
+import wave
+from contextlib import asynccontextmanager
 import magic
 from PIL import Image
 from django.utils.translation import gettext_lazy as _
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.conf import settings
+from django.db import connections
+from django.http import QueryDict
+from django.utils.http import urlencode
 from django.core.files import File
 from django.core.files.base import ContentFile
-from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from asgiref.sync import sync_to_async
 
 from users.models import User
+from users.cache import token_cache
+from responsecache.cache import response_cache
 from artists.models import Artist
 from albums.models import Album
 
@@ -20,29 +31,83 @@ def make_errors(field_name: str, msg):
     }
 
 
-def image_is_valid(image: TemporaryUploadedFile):
-    path = image.temporary_file_path()
+# libmagic handles are expensive to create and not thread-safe,
+# so every worker thread keeps its own
+_local = threading.local()
+
+# Number of bytes libmagic needs to recognize image formats
+IMAGE_HEADER_SIZE = 2048
+
+
+def get_magic():
+    if not hasattr(_local, 'magic'):
+        _local.magic = magic.Magic(mime=True)
+    return _local.magic
+
+
+def image_is_valid(image: UploadedFile):
     # check content type
-    if "image" not in image.content_type:
+    if not image.content_type or "image" not in image.content_type:
+        return False
+
+    # check header with libmagic before decoding anything
+    image.seek(0)
+    header = image.read(IMAGE_HEADER_SIZE)
+    image.seek(0)
+    if "image" not in get_magic().from_buffer(header):
         return False
 
     # verify with Pillow
     try:
-        with Image.open(path) as img:
+        with Image.open(image) as img:
             img.verify()
     except (IOError, SyntaxError):
         return False
-
-    # check content with libmagic
-    if "image" not in magic.Magic(mime=True).from_file(path):
-        return False
+    finally:
+        image.seek(0)
 
     return True
 
 
+async def aimage_is_valid(image: UploadedFile):
+    """Validate the image in a worker thread, so the event loop is not blocked"""
+    return await sync_to_async(image_is_valid, thread_sensitive=False)(image)
+
+
+# Containers which libmagic does not report with `audio/` type
+AUDIO_MIME_TYPES = ['application/ogg', 'video/mp4', 'video/webm']
+
+
+def audio_is_valid(file: UploadedFile):
+    # Audio files can be large, only the header is inspected
+    file.seek(0)
+    header = file.read(IMAGE_HEADER_SIZE)
+    file.seek(0)
+    mime = get_magic().from_buffer(header)
+    return mime.startswith('audio/') or mime in AUDIO_MIME_TYPES
+
+
+async def aaudio_is_valid(file: UploadedFile):
+    return await sync_to_async(audio_is_valid, thread_sensitive=False)(file)
+
+
+# For tests which check uploaded files by their names, uploads are stored
+# as they are instead of under their digests
+plain_storage = override_settings(STORAGES={
+    **settings.STORAGES,
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+})
+
+
 class TestHelper(TestCase):
     DATA_DIR = settings.BASE_DIR / 'test_data/'
 
+    def _pre_setup(self):
+        super()._pre_setup()
+        # Database is rolled back after each test, caches are not
+        token_cache.clear()
+        response_cache.clear()
+
     async def create_user(self, username='john', password='test1234',
                           superuser=False, staff=False, email=None,
                           image=None):
@@ -67,6 +132,29 @@ class TestHelper(TestCase):
         await album.asave()
         return album
 
+    @asynccontextmanager
+    async def assertMaxQueries(self, num: int, using: str = 'default'):
+        """
+        Fail when the block runs more than `num` queries. Unlike
+        `assertNumQueries` it works in async tests, queries are captured
+        on the connection of the thread which runs the async ORM calls.
+        """
+        context = await sync_to_async(
+            lambda: CaptureQueriesContext(connections[using]))()
+        await sync_to_async(context.__enter__)()
+        try:
+            yield context
+        finally:
+            await sync_to_async(context.__exit__)(None, None, None)
+
+        executed = len(context)
+        self.assertLessEqual(executed, num, '%d queries executed, at most %d expected\n%s' % (
+            executed, num, '\n'.join(q['sql'] for q in context.captured_queries)))
+
+    def form_data(self, data: dict):
+        """Form data which can hold lists, e.g. IDs of related objects"""
+        return QueryDict(urlencode(data, doseq=True))
+
     def make_auth_header(self, user: User):
         return {
             'Authorization': f'Bearer {user.token}'
@@ -91,6 +179,20 @@ class TestHelper(TestCase):
     def content_file(self, data: bytes, name: str):
         return ContentFile(data, name)
 
+    def audio_file(self, name: str = 'song.wav', seconds: float = 1, rate: int = 8000):
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(rate)
+            wav.writeframes(b'\x00\x01' * int(seconds * rate))
+        return self.content_file(buffer.getvalue(), name)
+
+    def image_file(self, name: str = 'image.png', size=(64, 64), fmt: str = 'PNG'):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, fmt)
+        return self.content_file(buffer.getvalue(), name)
+
     def fileExists(self, location, filename: str):
         path = os.path.join(location, filename)
         return os.path.isfile(path)
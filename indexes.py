@@ -0,0 +1,53 @@
+from django.db import router
+from django.db.migrations.operations.base import Operation
+
+
+class TrigramIndex(Operation):
+    """
+    GIN trigram index serving `icontains` lookups, which PostgreSQL runs as
+    `UPPER(column::text) LIKE UPPER(%s)`. Other backends can not use an
+    index for infix matching, so they skip the operation. The index only
+    exists in the database, it is not part of the model state.
+    """
+    reversible = True
+
+    def __init__(self, model_name: str, field: str, name: str):
+        self.model_name = model_name
+        self.field = field
+        self.name = name
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def allowed(self, app_label, schema_editor):
+        connection = schema_editor.connection
+        return connection.vendor == 'postgresql' and router.allow_migrate(
+            connection.alias, app_label)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not self.allowed(app_label, schema_editor):
+            return
+        model = to_state.apps.get_model(app_label, self.model_name)
+        quote = schema_editor.quote_name
+        column = quote(model._meta.get_field(self.field).column)
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {quote(self.name)} ON '
+            f'{quote(model._meta.db_table)} USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if self.allowed(app_label, schema_editor):
+            schema_editor.execute(
+                f'DROP INDEX IF EXISTS {schema_editor.quote_name(self.name)}')
+
+    def describe(self):
+        return f'Create trigram index {self.name} on {self.model_name}.{self.field}'
+
+    @property
+    def migration_name_fragment(self):
+        return self.name.lower()
+
+    def deconstruct(self):
+        kwargs = {'model_name': self.model_name, 'field': self.field, 'name': self.name}
+        return self.__class__.__qualname__, [], kwargs
@@ -4,9 +4,18 @@ from users.api import router as auth_router
 from artists.api import router as artists_router
 from albums.api import router as albums_router
 from tracks.api import router as tracks_router
+from search.api import router as search_router
+from playlists.api import router as playlists_router
+from metrics.api import router as metrics_router
+from metrics.collector import instrument
 
 api = NinjaAPI()
 api.add_router('/users/', auth_router)
 api.add_router('/artists/', artists_router)
 api.add_router('/albums/', albums_router)
 api.add_router('/tracks/', tracks_router)
+api.add_router('/search/', search_router)
+api.add_router('/playlists/', playlists_router)
+api.add_router('/metrics', metrics_router)
+
+instrument(api)
@@ -17,9 +17,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 AUTH_USER_MODEL = 'users.User'
 
-# This gives access to path of uploaded file
+# This gives access to path of uploaded file, the handler also computes
+# digest of the content for the content addressed storage. Keep
+# FILE_UPLOAD_TEMP_DIR on the same filesystem as MEDIA_ROOT, so uploads are
+# renamed into place instead of being copied
 FILE_UPLOAD_HANDLERS = [
-    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+    "blobs.uploadhandler.HashingFileUploadHandler",
 ]
 
 # Quick-start development settings - unsuitable for production
@@ -41,6 +44,15 @@ INSTALLED_APPS = [
     'artists',
     'albums',
     'tracks',
+    'thumbnails',
+    'blobs',
+    'search',
+    'responsecache',
+    'metrics',
+    'transcoding',
+    'waveforms',
+    'playlists',
+    'server',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -50,13 +62,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
-    'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'metrics.middleware.MetricsMiddleware',
+    # Stock middleware, which does not switch threads under ASGI
+    'server.middleware.SecurityMiddleware',
+    'server.middleware.SessionMiddleware',
+    'server.middleware.CommonMiddleware',
+    'server.middleware.CsrfViewMiddleware',
+    'server.middleware.AuthenticationMiddleware',
+    'server.middleware.MessageMiddleware',
+    'server.middleware.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'main.urls'
@@ -131,6 +145,116 @@ STATIC_URL = 'static/'
 MEDIA_ROOT = BASE_DIR / 'media'
 MEDIA_URL = 'media/'
 
+# Uploads are deduplicated and stored under their digests in `blobs/`,
+# files there never change and can be served with immutable cache headers
+STORAGES = {
+    'default': {
+        'BACKEND': 'blobs.storage.ContentAddressedStorage',
+    },
+    'thumbnails': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'waveforms': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'packages': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Authentication token cache, records are kept in memory of each worker
+# unless `TOKEN_CACHE_ALIAS` points to one of `CACHES`. In memory, tokens
+# revoked by another worker are still accepted for `TOKEN_VERSION_TTL`
+# seconds, a shared alias makes revocations immediate
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 300
+TOKEN_CACHE_ALIAS = None
+TOKEN_VERSION_TTL = 5
+
+# Password hashing runs in a dedicated thread pool, requests above the
+# pending limit are answered with 503
+PASSWORD_HASHING_WORKERS = 4
+PASSWORD_HASHING_MAX_PENDING = 256
+
+# Thumbnails generated for uploaded images, longest edge in pixels
+THUMBNAIL_SIZES = [64, 256, 1024]
+
+# Waveform peaks computed for uploaded tracks, zoom levels in samples per
+# pixel (multiples of the first one) and bits per peak (8 or 16)
+WAVEFORM_LEVELS = [256, 1024, 4096]
+WAVEFORM_BITS = 8
+
+# Pagination class used by `@paginate`
+NINJA_PAGINATION_CLASS = 'pagination.AsyncLimitOffsetPagination'
+
+# Search index of the catalogue, `search.backends.DatabaseBackend` works
+# with any database and relies on its indexes
+SEARCH_BACKEND = 'search.backends.FTS5Backend'
+
+# Public catalogue responses are cached in `RESPONSE_CACHE_ALIAS`, use a
+# shared backend (Redis, Memcached, file) when running several workers,
+# `manage.py serve` warns about caches kept in each worker. For example
+# 'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#            'LOCATION': BASE_DIR / 'cache'}
+# with both `RESPONSE_CACHE_ALIAS` and `TOKEN_CACHE_ALIAS` set to 'shared'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_TTL = 600
+
+# Timings and query counts of API operations, exported for Prometheus at
+# `/api/metrics` and sent back in `Server-Timing` headers. Nothing is
+# recorded when disabled
+METRICS_ENABLED = True
+# Addresses or networks allowed to scrape `/api/metrics` without a token,
+# everyone else needs a staff token. Behind a reverse proxy every request
+# comes from the proxy, so do not list its address there
+METRICS_ALLOWED_IPS = []
+
+# Renditions (codec, kbps) encoded and waveform peaks computed after
+# uploads by `manage.py run_transcoder` workers, jobs are queued in the
+# database. Failed jobs are retried with
+# a doubling delay
+TRANSCODER = 'transcoding.transcoders.FFmpegTranscoder'
+TRANSCODING_RENDITIONS = [
+    ('opus', 64), ('opus', 128), ('aac', 128), ('aac', 256), ('mp3', 320),
+]
+TRANSCODING_WORKERS = 2
+TRANSCODING_MAX_ATTEMPTS = 3
+TRANSCODING_RETRY_DELAY = 60
+
+# Tracks longer than this (seconds) are also split into segments of AAC at
+# each bitrate, served with DASH manifest and HLS playlists. Set to None
+# to turn packaging off
+PACKAGER = 'transcoding.transcoders.FFmpegPackager'
+PACKAGING_MIN_DURATION = 1200
+PACKAGING_SEGMENT_DURATION = 10
+PACKAGING_BITRATES = [64, 128]
+
+# `manage.py serve` runs the ASGI application in uvicorn workers, with
+# uvloop and httptools when installed. Workers default to one per core,
+# they share cached data only through shared cache backends, see `CACHES`.
+# Keep-alive should outlast the idle timeout of the proxy in front, and
+# stopping workers wait for requests in progress
+SERVER_WORKERS = None
+SERVER_KEEP_ALIVE = 75
+SERVER_GRACEFUL_TIMEOUT = 30
+SERVER_BACKLOG = 2048
+SERVER_MAX_REQUESTS = None
+SERVER_LIMIT_CONCURRENCY = None
+SERVER_FORWARDED_ALLOW_IPS = None
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,31 @@
+import ipaddress
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from ninja import Router
+
+from users.api import AsyncHttpBearer
+from .registry import registry, CONTENT_TYPE
+
+
+router = Router(tags=['Metrics'])
+
+
+def allowed_address(request):
+    """Scrapers connecting from `METRICS_ALLOWED_IPS` do not need a token"""
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return None
+    for network in getattr(settings, 'METRICS_ALLOWED_IPS', []):
+        if address in ipaddress.ip_network(network):
+            return str(address)
+    return None
+
+
+@router.get('', auth=[allowed_address, AsyncHttpBearer(is_staff=True, stateless=True)],
+            include_in_schema=False)
+async def get_metrics(request):
+    """Prometheus exposition of the metrics recorded by this worker"""
+    if not getattr(settings, 'METRICS_ENABLED', False):
+        raise Http404
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class MetricsConfig(AppConfig):
+    name = 'metrics'
+
+    def ready(self):
+        if getattr(settings, 'METRICS_ENABLED', False):
+            from django.db.backends.signals import connection_created
+            from .collector import install_query_recorder
+            connection_created.connect(install_query_recorder)
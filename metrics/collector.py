@@ -0,0 +1,135 @@
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+from typing import Optional
+from django.conf import settings
+
+from users.hashing import hasher_pool
+from .registry import registry, Histogram, Gauge, Counter
+
+
+TIME_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50, 100]
+SIZE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+
+REQUEST_DURATION = registry.register(Histogram(
+    'hms_request_duration_seconds', 'Wall time of API operations',
+    ['operation', 'method', 'status'], TIME_BUCKETS))
+DB_QUERIES = registry.register(Histogram(
+    'hms_db_queries', 'Database queries issued by API operations',
+    ['operation'], QUERY_BUCKETS))
+DB_DURATION = registry.register(Histogram(
+    'hms_db_duration_seconds', 'Time API operations spent in database queries',
+    ['operation'], TIME_BUCKETS))
+SERIALIZATION_DURATION = registry.register(Histogram(
+    'hms_serialization_duration_seconds',
+    'Time spent validating and rendering responses of API operations',
+    ['operation'], TIME_BUCKETS))
+RESPONSE_SIZE = registry.register(Histogram(
+    'hms_response_size_bytes', 'Size of response bodies of API operations',
+    ['operation'], SIZE_BUCKETS))
+
+for key, metric in [('pending', Gauge), ('running', Gauge), ('queued', Gauge),
+                    ('peak_pending', Gauge), ('completed', Counter), ('rejected', Counter)]:
+    suffix = '_total' if metric is Counter else ''
+    registry.register(metric(
+        f'hms_password_hasher_{key}{suffix}', f'Password hashing calls, {key.replace("_", " ")}',
+        lambda key=key: hasher_pool.stats()[key]))
+
+
+class RequestMetrics:
+    """Costs of a single request, collected while it is handled"""
+
+    def __init__(self):
+        self.operation: Optional[str] = None
+        self.queries = 0
+        self.db = 0.0
+        self.view = 0.0
+        self.view_end: Optional[float] = None
+        self.serialization = 0.0
+
+    def server_timing(self, total: float) -> str:
+        return ', '.join([
+            f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries"',
+            f'view;dur={self.view * 1000:.2f}',
+            f'serialize;dur={self.serialization * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+    def observe(self, method: str, status: int, total: float, size: Optional[int]):
+        REQUEST_DURATION.observe(total, operation=self.operation, method=method, status=status)
+        DB_QUERIES.observe(self.queries, operation=self.operation)
+        DB_DURATION.observe(self.db, operation=self.operation)
+        SERIALIZATION_DURATION.observe(self.serialization, operation=self.operation)
+        if size is not None:
+            RESPONSE_SIZE.observe(size, operation=self.operation)
+
+
+# Metrics of the request being handled, shared with threads running the
+# ORM calls, as `sync_to_async` copies the context
+current: ContextVar[Optional[RequestMetrics]] = ContextVar('request_metrics', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db += perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """Sent for every new connection, wrappers stay when it reconnects"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _instrument_operation(operation, name: str):
+    run, view = operation.run, operation.view_func
+
+    @wraps(run)
+    async def timed_run(request, *args, **kwargs):
+        metrics = current.get()
+        if metrics is None:
+            return await run(request, *args, **kwargs)
+
+        metrics.operation = name
+        response = await run(request, *args, **kwargs)
+        # Requests rejected by authentication or input validation never
+        # reach the view, which includes the `decorate_view` wrappers
+        if metrics.view_end is not None:
+            metrics.serialization = perf_counter() - metrics.view_end
+        return response
+
+    @wraps(view)
+    async def timed_view(request, *args, **kwargs):
+        metrics = current.get()
+        start = perf_counter()
+        try:
+            return await view(request, *args, **kwargs)
+        finally:
+            if metrics is not None:
+                metrics.view_end = perf_counter()
+                metrics.view = metrics.view_end - start
+
+    operation.run = timed_run
+    operation.view_func = timed_view
+
+
+def instrument(api):
+    """
+    Time the views of all operations of the api, whatever runs after the
+    view returns is the validation and rendering of the response. Call
+    after all routers were added.
+    """
+    if not getattr(settings, 'METRICS_ENABLED', False):
+        return
+    for _, router in api._routers:
+        for path_view in router.path_operations.values():
+            for operation in path_view.operations:
+                _instrument_operation(operation, api.get_openapi_operation_id(operation))
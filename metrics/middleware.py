@@ -0,0 +1,44 @@
+from time import perf_counter
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .collector import RequestMetrics, current
+
+
+class MetricsMiddleware:
+    """
+    Records wall time, database queries, serialization time and response
+    size of API operations, they are exported at `/api/metrics` and sent
+    back in the `Server-Timing` header. Requests which are not handled by
+    an operation are not recorded. Not loaded at all unless
+    `METRICS_ENABLED` is set.
+    """
+    async_capable = True
+    sync_capable = False
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        markcoroutinefunction(self)
+
+    async def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        start = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        total = perf_counter() - start
+
+        if metrics.operation is not None:
+            if response.streaming:
+                size = response.get('Content-Length')
+                size = int(size) if size is not None else None
+            else:
+                size = len(response.content)
+            metrics.observe(request.method, response.status_code, total, size)
+            response['Server-Timing'] = metrics.server_timing(total)
+        return response
@@ -0,0 +1,111 @@
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Observations counted into buckets, separately for every combination of
+    label values. Rendered in the Prometheus text format with cumulative
+    buckets, their sum and count.
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str],
+                 buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # Label values -> [count of each bucket and of +Inf, sum]
+        self._series: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def collect(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+
+        for key, values in sorted(series.items()):
+            pairs = list(zip(self.labels, key))
+            count = 0
+            for bound, observed in zip(self.buckets + ('+Inf',), values):
+                count += observed
+                le = bound if bound == '+Inf' else _number(float(bound))
+                yield f'{self.name}_bucket{_labels(pairs + [("le", le)])} {count}'
+            yield f'{self.name}_sum{_labels(pairs)} {_number(values[-1])}'
+            yield f'{self.name}_count{_labels(pairs)} {count}'
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Gauge:
+    """Value read when the metrics are collected"""
+    type = 'gauge'
+
+    def __init__(self, name: str, help: str, func: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.func = func
+
+    def collect(self):
+        yield f'{self.name} {_number(self.func())}'
+
+    def clear(self):
+        pass
+
+
+class Counter(Gauge):
+    """Monotonic total read when the metrics are collected"""
+    type = 'counter'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = Registry()
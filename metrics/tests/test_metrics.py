@@ -0,0 +1,65 @@
+from helpers import TestHelper
+
+from metrics.registry import registry, Histogram
+
+
+class TestMetrics(TestHelper):
+    def setUp(self):
+        registry.clear()
+
+    async def test_operations_are_measured(self):
+        album = await self.create_album('Piano Man')
+        head = self.make_auth_header(await self.create_staff_member())
+
+        response = await self.async_client.get(f'/api/albums/{album.pk}')
+        response2 = await self.async_client.get('/api/metrics', headers=head)
+        metrics = response2.content.decode()
+
+        # Validators, album and its (empty) list of tracks
+        timing = response['Server-Timing']
+        self.assertIn('desc="3 queries"', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertEqual(response2.status_code, 200)
+        self.assertEqual(response2['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn('hms_db_queries_bucket{operation="albums_api_get_album",le="3.0"} 1', metrics)
+        self.assertIn('hms_request_duration_seconds_count{operation="albums_api_get_album",'
+                      'method="GET",status="200"} 1', metrics)
+        self.assertIn(f'hms_response_size_bytes_sum{{operation="albums_api_get_album"}} '
+                      f'{len(response.content)}', metrics)
+        self.assertIn('hms_password_hasher_rejected_total 0', metrics)
+
+    async def test_nothing_is_recorded_when_disabled(self):
+        head = self.make_auth_header(await self.create_staff_member())
+        with self.settings(METRICS_ENABLED=False):
+            response = await self.async_client.get('/api/artists/')
+            response2 = await self.async_client.get('/api/metrics', headers=head)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(response2.status_code, 404)
+
+    async def test_metrics_are_not_public(self):
+        user = await self.create_user()
+
+        response = await self.async_client.get('/api/metrics')
+        response2 = await self.async_client.get(
+            '/api/metrics', headers=self.make_auth_header(user))
+        with self.settings(METRICS_ALLOWED_IPS=['127.0.0.0/8']):
+            response3 = await self.async_client.get('/api/metrics')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response2.status_code, 401)
+        self.assertEqual(response3.status_code, 200)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('latency', 'Latency', ['path'], [0.1, 1])
+        for value in [0.05, 0.1, 0.5, 3]:
+            histogram.observe(value, path='/a"b')
+
+        self.assertEqual(list(histogram.collect()), [
+            'latency_bucket{path="/a\\"b",le="0.1"} 2',
+            'latency_bucket{path="/a\\"b",le="1.0"} 3',
+            'latency_bucket{path="/a\\"b",le="+Inf"} 4',
+            'latency_sum{path="/a\\"b"} 3.65',
+            'latency_count{path="/a\\"b"} 4',
+        ])
@@ -0,0 +1,123 @@
+import base64
+import binascii
+import json
+from math import inf
+from typing import Any, List, Optional
+from django.db.models import Q, QuerySet
+from django.utils.translation import gettext_lazy as _
+from ninja import Schema, Field
+from ninja.conf import settings
+from ninja.errors import ValidationError
+from ninja.pagination import AsyncPaginationBase, LimitOffsetPagination
+
+
+MAX_LIMIT = settings.PAGINATION_MAX_LIMIT if settings.PAGINATION_MAX_LIMIT != inf else None
+
+
+def encode_cursor(value: Any, pk: int, reverse: bool = False) -> str:
+    data = json.dumps([value, pk, reverse], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, pk, reverse = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(pk, int) or isinstance(pk, bool) or not isinstance(reverse, bool):
+            raise ValueError()
+        # The value goes straight into the filter of the ordering field
+        if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+            raise ValueError()
+    except (ValueError, TypeError, binascii.Error):
+        raise ValidationError([{
+            "loc": ["query", "cursor"],
+            "msg": _("Invalid cursor")
+        }])
+    return value, pk, reverse
+
+
+class AsyncLimitOffsetPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination which slices the queryset in the database.
+    Views should return lazy querysets, so only the requested page is fetched.
+    """
+
+    async def apaginate_queryset(self, queryset: QuerySet, pagination: LimitOffsetPagination.Input, **params):
+        offset = pagination.offset
+        limit = min(pagination.limit, settings.PAGINATION_MAX_LIMIT)
+        if isinstance(queryset, QuerySet):
+            # Pages of unordered querysets are not stable
+            if not queryset.ordered:
+                queryset = queryset.order_by('pk')
+            items = [obj async for obj in queryset[offset:offset + limit]]
+        else:
+            items = queryset[offset:offset + limit]
+        return {
+            'items': items,
+            'count': await self._aitems_count(queryset),
+        }
+
+
+class CursorPagination(AsyncPaginationBase):
+    """
+    Keyset pagination ordered by `(ordering, id)`. Every page is fetched with
+    a single `WHERE ... LIMIT` query, so its cost does not depend on how deep
+    the client has scrolled. Ordering field must not be nullable.
+    """
+    class Input(Schema):
+        cursor: Optional[str] = Field(None)
+        limit: int = Field(settings.PAGINATION_PER_PAGE, ge=1, le=MAX_LIMIT)
+
+    class Output(Schema):
+        items: List[Any]
+        next: Optional[str] = Field(None)
+        previous: Optional[str] = Field(None)
+
+    def __init__(self, ordering: str = 'id', **kwargs: Any) -> None:
+        self.ordering = ordering
+        super().__init__(**kwargs)
+
+    def _page(self, queryset: QuerySet, pagination: Input):
+        field = self.ordering
+        if not pagination.cursor:
+            return queryset.order_by(field, 'pk'), False, False
+
+        value, pk, reverse = decode_cursor(pagination.cursor)
+        if reverse:
+            qs = queryset.filter(
+                Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+            ).order_by(f'-{field}', '-pk')
+        else:
+            qs = queryset.filter(
+                Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk})
+            ).order_by(field, 'pk')
+        return qs, reverse, True
+
+    def _cursor(self, obj: Any, reverse: bool) -> str:
+        return encode_cursor(getattr(obj, self.ordering), obj.pk, reverse)
+
+    def paginate_queryset(self, queryset: QuerySet, pagination: Input, **params):
+        qs, reverse, has_cursor = self._page(queryset, pagination)
+        items = list(qs[:pagination.limit + 1])
+        return self._result(items, pagination.limit, reverse, has_cursor)
+
+    async def apaginate_queryset(self, queryset: QuerySet, pagination: Input, **params):
+        qs, reverse, has_cursor = self._page(queryset, pagination)
+        items = [obj async for obj in qs[:pagination.limit + 1]]
+        return self._result(items, pagination.limit, reverse, has_cursor)
+
+    def _result(self, items: list, limit: int, reverse: bool, has_cursor: bool):
+        # One extra row tells whether there is anything past this page
+        has_more = len(items) > limit
+        items = items[:limit]
+        if reverse:
+            items.reverse()
+
+        next_cursor = prev_cursor = None
+        if items:
+            if reverse or has_more:
+                next_cursor = self._cursor(items[-1], False)
+            if (reverse and has_more) or (not reverse and has_cursor):
+                prev_cursor = self._cursor(items[0], True)
+
+        return {'items': items, 'next': next_cursor, 'previous': prev_cursor}
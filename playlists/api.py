@@ -0,0 +1,129 @@
+from django.db.models import Prefetch, Q
+from django.shortcuts import aget_object_or_404
+from django.utils.translation import gettext_lazy as _
+from ninja import Router, Query
+from ninja.errors import ValidationError
+from ninja.pagination import paginate
+from typing import List
+from asgiref.sync import sync_to_async
+
+from users.api import AsyncHttpBearer
+from artists.models import Artist
+from tracks.models import Track
+from helpers import make_errors
+from pagination import CursorPagination
+from schemas import ArtistSchema, TrackSchema, only_fields
+from .models import Playlist, PlaylistEntry
+from .schemas import (
+    PlaylistSchema, PlaylistSchemaIn, EntrySchema, EntriesIn, EntriesMove, MAX_BATCH
+)
+from . import ordering
+
+
+router = Router(tags=['Playlists'], auth=AsyncHttpBearer(stateless=True))
+
+
+def owned(request):
+    return Playlist.objects.filter(owner_id=request.auth.pk)
+
+
+def visible(request):
+    return Playlist.objects.filter(Q(owner_id=request.auth.pk) | Q(is_public=True))
+
+
+def entry_queryset():
+    """Entries with their tracks and artists, two queries for any number of them"""
+    artists = Artist.objects.only(*only_fields(ArtistSchema))
+    return PlaylistEntry.objects.select_related('track').only(
+        'added_at', 'position', 'track', *only_fields(TrackSchema, 'track__')
+    ).prefetch_related(Prefetch('track__artists', queryset=artists))
+
+
+async def ordered_entries(entries: List[PlaylistEntry]):
+    qs = entry_queryset().filter(pk__in=[e.pk for e in entries])
+    return [e async for e in qs.order_by('position', 'pk')]
+
+
+@router.post('', response={201: PlaylistSchema})
+async def create_playlist(request, data: PlaylistSchemaIn):
+    playlist = await Playlist.objects.acreate(owner_id=request.auth.pk, **data.dict())
+    return 201, playlist
+
+
+@router.get('', response=List[PlaylistSchema])
+@paginate
+async def get_playlists(request):
+    """Playlists of the user"""
+    return owned(request)
+
+
+@router.get('/{int:playlistID}', response=PlaylistSchema)
+async def get_playlist(request, playlistID: int):
+    return await aget_object_or_404(visible(request), pk=playlistID)
+
+
+@router.put('/{int:playlistID}', response=PlaylistSchema)
+async def update_playlist(request, playlistID: int, data: PlaylistSchemaIn):
+    playlist = await aget_object_or_404(owned(request), pk=playlistID)
+    for k, value in data.dict().items():
+        setattr(playlist, k, value)
+    await playlist.asave()
+    return playlist
+
+
+@router.delete('/{int:playlistID}', response={204: None})
+async def delete_playlist(request, playlistID: int):
+    playlist = await aget_object_or_404(owned(request), pk=playlistID)
+    await playlist.adelete()
+    return 204, None
+
+
+@router.get('/{int:playlistID}/entries', response=List[EntrySchema])
+@paginate(CursorPagination, ordering='position')
+async def get_entries(request, playlistID: int):
+    """Entries in their order, every page costs the same number of queries"""
+    playlist = await aget_object_or_404(visible(request).only('pk'), pk=playlistID)
+    return entry_queryset().filter(playlist=playlist)
+
+
+@router.post('/{int:playlistID}/entries', response={201: List[EntrySchema]})
+async def add_entries(request, playlistID: int, data: EntriesIn):
+    """Append the tracks or insert them before the entry, in the given order"""
+    playlist = await aget_object_or_404(owned(request), pk=playlistID)
+    found = {pk async for pk in Track.objects.filter(
+        pk__in=set(data.track_ids)).values_list('pk', flat=True)}
+    if len(found) != len(set(data.track_ids)):
+        raise ValidationError([make_errors('track_ids', _('Track does not exist'))])
+
+    try:
+        entries = await sync_to_async(ordering.insert)(playlist, data.track_ids, data.before)
+    except ordering.EntryNotFound:
+        raise ValidationError([make_errors('before', _('Entry does not exist'))])
+    return 201, await ordered_entries(entries)
+
+
+@router.post('/{int:playlistID}/entries/move', response=List[EntrySchema])
+async def move_entries(request, playlistID: int, data: EntriesMove):
+    """
+    Move the entries as a block in the given order, only the moved entries
+    get new positions
+    """
+    playlist = await aget_object_or_404(owned(request), pk=playlistID)
+    entry_ids = list(dict.fromkeys(data.entry_ids))
+    if data.before in entry_ids:
+        raise ValidationError([make_errors('before', _('Entry can not be moved before itself'))])
+
+    try:
+        entries = await sync_to_async(ordering.move)(playlist, entry_ids, data.before)
+    except ordering.EntryNotFound as e:
+        field = 'before' if e.args[0] == data.before else 'entry_ids'
+        raise ValidationError([make_errors(field, _('Entry does not exist'))])
+    return await ordered_entries(entries)
+
+
+@router.delete('/{int:playlistID}/entries', response={204: None})
+async def remove_entries(request, playlistID: int,
+                         entry_ids: List[int] = Query(..., max_length=MAX_BATCH)):
+    playlist = await aget_object_or_404(owned(request), pk=playlistID)
+    await sync_to_async(ordering.remove)(playlist, entry_ids)
+    return 204, None
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db import models
+
+from tracks.models import Track
+
+
+class Playlist(models.Model):
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                              related_name='playlists')
+    name = models.CharField(max_length=200)
+    is_public = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Also bumped when entries change
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class PlaylistEntry(models.Model):
+    playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE,
+                                 related_name='entries')
+    track = models.ForeignKey(Track, on_delete=models.CASCADE)
+    # Sparse sort key, see `playlists.ordering`. Ties are broken by id
+    position = models.BigIntegerField()
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['playlist', 'position', 'id'], name='playlistentry_order_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.playlist_id}: {self.track_id}'
@@ -0,0 +1,114 @@
+from typing import List, Optional
+from django.db import transaction
+from django.db.models import Max, Q
+
+from counters import touch
+from .models import Playlist, PlaylistEntry
+
+
+# Distance between positions of appended entries. Inserting between two
+# neighbours takes the middle of their gap, so 32 insertions into the same
+# spot fit before the playlist has to be renumbered
+STEP = 2 ** 32
+
+
+class EntryNotFound(Exception):
+    pass
+
+
+def spread(low: Optional[int], high: Optional[int], count: int) -> Optional[List[int]]:
+    """
+    `count` positions evenly spread between the neighbours, `None` when the
+    gap is too narrow. Missing `low` is the start of the playlist and
+    missing `high` its end.
+    """
+    if high is None:
+        start = low if low is not None else 0
+        return [start + STEP * i for i in range(1, count + 1)]
+    if low is None:
+        low = high - STEP * (count + 1)
+    gap = (high - low) // (count + 1)
+    if gap < 1:
+        return None
+    return [low + gap * i for i in range(1, count + 1)]
+
+
+def neighbours(playlist: Playlist, before: Optional[int], exclude=()):
+    """Positions of the entry `before` and the one preceding it"""
+    entries = playlist.entries.exclude(pk__in=exclude)
+    if before is None:
+        return entries.aggregate(low=Max('position'))['low'], None
+
+    target = entries.filter(pk=before).values_list('position', flat=True).first()
+    if target is None:
+        raise EntryNotFound(before)
+    low = entries.filter(
+        Q(position__lt=target) | Q(position=target, pk__lt=before)
+    ).aggregate(low=Max('position'))['low']
+    return low, target
+
+
+def rebalance(playlist: Playlist):
+    """Renumber all entries `STEP` apart, keeping their order"""
+    entries = list(playlist.entries.order_by('position', 'pk').only('pk', 'position'))
+    for i, entry in enumerate(entries, 1):
+        entry.position = STEP * i
+    PlaylistEntry.objects.bulk_update(entries, ['position'], batch_size=1000)
+
+
+def positions(playlist: Playlist, count: int, before: Optional[int], exclude=()) -> List[int]:
+    spaced = spread(*neighbours(playlist, before, exclude), count)
+    if spaced is None:
+        # Rare, only after many insertions into the same gap
+        rebalance(playlist)
+        spaced = spread(*neighbours(playlist, before, exclude), count)
+    return spaced
+
+
+def lock(playlist: Playlist):
+    # Changes of one playlist are serialized, where the database can lock rows
+    Playlist.objects.select_for_update().filter(pk=playlist.pk).first()
+
+
+@transaction.atomic
+def insert(playlist: Playlist, track_ids: List[int],
+           before: Optional[int] = None) -> List[PlaylistEntry]:
+    """Add the tracks in the given order, at the end or before the entry"""
+    lock(playlist)
+    entries = [
+        PlaylistEntry(playlist=playlist, track_id=track_id, position=position)
+        for track_id, position in zip(
+            track_ids, positions(playlist, len(track_ids), before))
+    ]
+    PlaylistEntry.objects.bulk_create(entries)
+    touch(Playlist, [playlist.pk])
+    return entries
+
+
+@transaction.atomic
+def move(playlist: Playlist, entry_ids: List[int],
+         before: Optional[int] = None) -> List[PlaylistEntry]:
+    """
+    Move the entries as a block in the given order, at the end or before
+    the entry. Only the moved rows are updated.
+    """
+    lock(playlist)
+    found = playlist.entries.in_bulk(entry_ids)
+    missing = [pk for pk in entry_ids if pk not in found]
+    if missing:
+        raise EntryNotFound(missing[0])
+
+    entries = [found[pk] for pk in entry_ids]
+    for entry, position in zip(entries, positions(playlist, len(entries), before, entry_ids)):
+        entry.position = position
+    PlaylistEntry.objects.bulk_update(entries, ['position'])
+    touch(Playlist, [playlist.pk])
+    return entries
+
+
+@transaction.atomic
+def remove(playlist: Playlist, entry_ids: List[int]) -> int:
+    deleted, _ = playlist.entries.filter(pk__in=entry_ids).delete()
+    if deleted:
+        touch(Playlist, [playlist.pk])
+    return deleted
@@ -0,0 +1,40 @@
+from typing import List, Optional
+from ninja import Schema, ModelSchema, Field
+
+from schemas import TrackArtists
+from .models import Playlist, PlaylistEntry
+
+
+# Entries changed by a single request
+MAX_BATCH = 1000
+
+
+class PlaylistSchema(ModelSchema):
+    class Meta:
+        model = Playlist
+        fields = ['id', 'name', 'is_public', 'created_at', 'updated_at']
+
+
+class PlaylistSchemaIn(Schema):
+    name: str = Field(..., max_length=200)
+    is_public: bool = Field(False)
+
+
+class EntrySchema(ModelSchema):
+    track: TrackArtists
+
+    class Meta:
+        model = PlaylistEntry
+        fields = ['id', 'added_at']
+
+
+class EntriesIn(Schema):
+    track_ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH)
+    # Entry the tracks are inserted before, they are appended when missing
+    before: Optional[int] = Field(None)
+
+
+class EntriesMove(Schema):
+    entry_ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH)
+    # Entry the block is moved before, to the end when missing
+    before: Optional[int] = Field(None)
@@ -0,0 +1,176 @@
+from datetime import timedelta
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from asgiref.sync import sync_to_async
+from ninja.testing import TestAsyncClient
+
+from helpers import TestHelper
+
+from artists.models import Artist
+from tracks.models import Track
+from playlists.api import router
+from playlists.models import Playlist
+from playlists import ordering
+
+
+class TestPlaylists(TestHelper):
+    def setUp(self):
+        self.client = TestAsyncClient(router)
+
+    async def create_tracks(self, count: int):
+        await Track.objects.abulk_create([
+            Track(title=f'Track {i}', file=f'song{i}.mp3', duration=timedelta(seconds=60))
+            for i in range(count)
+        ])
+        return [pk async for pk in Track.objects.order_by('pk').values_list('pk', flat=True)]
+
+    async def create_playlist(self, user, **kwargs):
+        return await Playlist.objects.acreate(owner=user, name='Favourites', **kwargs)
+
+    async def order(self, playlist):
+        return [pk async for pk in playlist.entries.order_by(
+            'position', 'pk').values_list('pk', flat=True)]
+
+    async def test_user_can_create_playlist(self):
+        user = await self.create_user()
+
+        response = await self.client.post(
+            '', json={'name': 'Road trip'},
+            headers=self.make_auth_header(user))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['name'], 'Road trip')
+        self.assertFalse(response.json()['is_public'])
+        self.assertEqual(await user.playlists.acount(), 1)
+
+    async def test_private_playlist_is_hidden_from_other_users(self):
+        owner = await self.create_user()
+        other = await self.create_user(username='jane')
+        playlist = await self.create_playlist(owner)
+        public = await self.create_playlist(owner, is_public=True)
+        headers = self.make_auth_header(other)
+
+        response = await self.client.get(
+            f'/{playlist.pk}/entries', headers=headers)
+        response2 = await self.client.get(
+            f'/{public.pk}/entries', headers=headers)
+        response3 = await self.client.post(
+            f'/{public.pk}/entries', json={'track_ids': [1]},
+            headers=headers)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response2.status_code, 200)
+        self.assertEqual(response3.status_code, 404)
+
+    async def test_tracks_are_appended_and_inserted_in_bulk(self):
+        user = await self.create_user()
+        playlist = await self.create_playlist(user)
+        t = await self.create_tracks(5)
+        url = f'/{playlist.pk}/entries'
+        headers = self.make_auth_header(user)
+
+        response = await self.client.post(
+            url, json={'track_ids': t[:3]}, headers=headers)
+        first = response.json()[0]['id']
+        response2 = await self.client.post(
+            url, json={'track_ids': t[3:], 'before': first}, headers=headers)
+        response3 = await self.client.post(
+            url, json={'track_ids': [t[0], 0]}, headers=headers)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([e['track']['id'] for e in response.json()], t[:3])
+        self.assertEqual(response2.status_code, 201)
+        entries = await self.client.get(url, headers=headers)
+        self.assertEqual([e['track']['id'] for e in entries.json()['items']],
+                         [t[3], t[4], t[0], t[1], t[2]])
+        self.assertEqual(response3.status_code, 422)
+        self.assertEqual(await playlist.entries.acount(), 5)
+
+    async def test_entries_are_moved_as_block(self):
+        user = await self.create_user()
+        playlist = await self.create_playlist(user)
+        t = await self.create_tracks(5)
+        entries = await sync_to_async(ordering.insert)(playlist, t)
+        e = [entry.pk for entry in entries]
+
+        response = await self.client.post(
+            f'/{playlist.pk}/entries/move',
+            json={'entry_ids': [e[4], e[3]], 'before': e[1]},
+            headers=self.make_auth_header(user))
+        response2 = await self.client.post(
+            f'/{playlist.pk}/entries/move',
+            json={'entry_ids': [e[0]]}, headers=self.make_auth_header(user))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([x['id'] for x in response.json()], [e[4], e[3]])
+        self.assertEqual(response2.status_code, 200)
+        self.assertEqual(await self.order(playlist), [e[4], e[3], e[1], e[2], e[0]])
+
+    async def test_moving_entry_updates_one_row(self):
+        user = await self.create_user()
+        playlist = await self.create_playlist(user)
+        entries = await sync_to_async(ordering.insert)(playlist, await self.create_tracks(100))
+        before = {pk: pos async for pk, pos in playlist.entries.values_list('pk', 'position')}
+
+        def move():
+            with CaptureQueriesContext(connection) as context:
+                ordering.move(playlist, [entries[90].pk], entries[10].pk)
+            return [q['sql'] for q in context.captured_queries]
+        queries = await sync_to_async(move)()
+
+        after = {pk: pos async for pk, pos in playlist.entries.values_list('pk', 'position')}
+        changed = [pk for pk in before if before[pk] != after[pk]]
+        self.assertEqual(changed, [entries[90].pk])
+        updates = [q for q in queries if q.startswith('UPDATE "playlists_playlistentry"')]
+        self.assertEqual(len(updates), 1)
+
+    async def test_playlist_is_renumbered_when_gap_runs_out(self):
+        user = await self.create_user()
+        playlist = await self.create_playlist(user)
+        t = await self.create_tracks(2)
+        first, last = await sync_to_async(ordering.insert)(playlist, t)
+
+        # Every insertion halves the gap before the last entry
+        inserted = []
+        for i in range(40):
+            entry, = await sync_to_async(ordering.insert)(playlist, [t[0]], last.pk)
+            inserted.append(entry.pk)
+
+        self.assertEqual(await self.order(playlist), [first.pk, *inserted, last.pk])
+        positions = [p async for p in playlist.entries.order_by(
+            'position').values_list('position', flat=True)]
+        self.assertEqual(len(set(positions)), 42)
+
+    async def test_entries_are_removed_in_bulk(self):
+        user = await self.create_user()
+        playlist = await self.create_playlist(user)
+        entries = await sync_to_async(ordering.insert)(playlist, await self.create_tracks(4))
+        ids = [entries[0].pk, entries[2].pk]
+
+        response = await self.client.delete(
+            f'/{playlist.pk}/entries?entry_ids={ids[0]}&entry_ids={ids[1]}',
+            headers=self.make_auth_header(user))
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(await self.order(playlist), [entries[1].pk, entries[3].pk])
+
+    async def test_entries_are_listed_in_constant_queries(self):
+        user = await self.create_user()
+        playlist = await self.create_playlist(user)
+        t = await self.create_tracks(50)
+        artists = await Artist.objects.abulk_create([Artist(name=f'Artist {i}') for i in range(20)])
+        for track in [x async for x in Track.objects.all()]:
+            await track.artists.aset(artists[:5])
+        await sync_to_async(ordering.insert)(playlist, t)
+        headers = self.make_auth_header(user)
+        await self.client.get('', headers=headers)
+
+        # Playlist, entries joined with tracks and their artists
+        async with self.assertMaxQueries(3):
+            response = await self.client.get(
+                f'/{playlist.pk}/entries?limit=50', headers=headers)
+
+        items = response.json()['items']
+        self.assertEqual(len(items), 50)
+        self.assertEqual(len(items[0]['track']['artists']), 5)
+        self.assertEqual([e['track']['id'] for e in items], t)
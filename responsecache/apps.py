@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class ResponseCacheConfig(AppConfig):
+    name = 'responsecache'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,114 @@
+import hashlib
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe, urlencode
+
+
+VERSION_KEY = 'catalogue-version'
+
+
+class ResponseCache:
+    """
+    Serialized bodies of public catalogue responses, keyed on the path and
+    normalized query parameters. Every key contains the catalogue version,
+    bumping it invalidates all cached responses at once. Any of Django's
+    cache backends can be used, workers share invalidations only when the
+    backend is shared too (Redis, Memcached, file).
+    """
+
+    def __init__(self, alias: str = 'default', ttl: int = 600):
+        self.alias = alias
+        self.ttl = ttl
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _new_version(self):
+        # Versions restart from the clock, so a version evicted from the
+        # cache never matches responses stored before
+        return time.time_ns()
+
+    async def aget_version(self) -> int:
+        version = await self.cache.aget(VERSION_KEY)
+        if version is None:
+            await self.cache.aadd(VERSION_KEY, self._new_version(), None)
+            version = await self.cache.aget(VERSION_KEY)
+        return version
+
+    def bump(self):
+        try:
+            self.cache.incr(VERSION_KEY)
+        except ValueError:
+            self.cache.set(VERSION_KEY, self._new_version(), None)
+
+    def invalidate(self):
+        """
+        Bump the version now and once more after the commit, so responses
+        cached by concurrent requests from not yet committed data are
+        dropped as well
+        """
+        self.bump()
+        transaction.on_commit(self.bump)
+
+    def key(self, request: HttpRequest, version: int):
+        params = sorted((k, sorted(v)) for k, v in request.GET.lists())
+        # Ninja's test client leaves the query string in `path`
+        path = request.path.partition('?')[0]
+        url = f'{path}?{urlencode(params, doseq=True)}'
+        return f'response:{version}:{hashlib.sha256(url.encode()).hexdigest()}'
+
+    def clear(self):
+        self.cache.clear()
+
+
+response_cache = ResponseCache(
+    alias=getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default'),
+    ttl=getattr(settings, 'RESPONSE_CACHE_TTL', 600),
+)
+
+
+def cache_response(run):
+    """
+    View decorator for async ninja operations, applied with
+    `decorate_view`. Successful GET responses are stored with their
+    validators and served without running the operation, conditional
+    requests are answered from the stored validators.
+    """
+    @wraps(run)
+    async def wrapper(request: HttpRequest, *args, **kwargs):
+        if request.method != 'GET' or not response_cache.enabled:
+            return await run(request, *args, **kwargs)
+
+        key = response_cache.key(request, await response_cache.aget_version())
+        cached = await response_cache.cache.aget(key)
+        if cached is not None:
+            content, content_type, etag, modified = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            if etag:
+                response['ETag'] = etag
+            if modified:
+                response['Last-Modified'] = modified
+            return get_conditional_response(
+                request, etag=etag, last_modified=parse_http_date_safe(modified),
+                response=response)
+
+        response = await run(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            await response_cache.cache.aset(key, (
+                response.content, response['Content-Type'],
+                response.get('ETag'), response.get('Last-Modified'),
+            ), response_cache.ttl)
+            response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
@@ -0,0 +1,57 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+from typing import Awaitable, Callable, Optional, Sequence
+from django.http import HttpRequest
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(state: Sequence) -> str:
+    return '"%s"' % hashlib.sha256(repr(tuple(state)).encode()).hexdigest()[:32]
+
+
+def last_modified(state: Sequence) -> Optional[datetime]:
+    times = [value for value in state if isinstance(value, datetime)]
+    return max(times) if times else None
+
+
+def conditional(validators: Callable[..., Awaitable[Optional[Sequence]]],
+                modified: bool = True):
+    """
+    View decorator for async ninja operations, applied with `decorate_view`.
+    `validators` receives the request with path parameters and returns the
+    timestamps and counts the representation depends on, or `None` when the
+    resource does not exist. They are turned into a strong ETag and
+    Last-Modified, conditional requests are answered with 304 before the
+    operation runs.
+
+    Deleting records does not move the latest timestamp, so lists are sent
+    with `modified` unset and validated by their ETag only.
+    """
+    def decorator(run):
+        @wraps(run)
+        async def wrapper(request: HttpRequest, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await run(request, *args, **kwargs)
+
+            state = await validators(request, **kwargs)
+            if state is None:
+                return await run(request, *args, **kwargs)
+
+            etag = make_etag(state)
+            latest = last_modified(state) if modified else None
+            timestamp = int(latest.timestamp()) if latest else None
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = await run(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from artists.models import Artist
+from albums.models import Album
+from tracks.models import Track
+from .cache import response_cache
+
+
+# Bulk writers do not send signals, they invalidate the cache themselves
+@receiver(post_save, sender=Artist)
+@receiver(post_save, sender=Album)
+@receiver(post_save, sender=Track)
+@receiver(post_delete, sender=Artist)
+@receiver(post_delete, sender=Album)
+@receiver(post_delete, sender=Track)
+@receiver(m2m_changed, sender=Track.artists.through)
+def invalidate_responses(sender, raw=False, action='post_', **kwargs):
+    if not raw and action.startswith('post_'):
+        response_cache.invalidate()
@@ -0,0 +1,52 @@
+from datetime import timedelta
+from ninja.testing import TestAsyncClient
+
+from helpers import TestHelper
+
+from artists.api import router as artists_router
+from albums.api import router as albums_router
+from artists.models import Artist
+from tracks.models import Track
+
+
+class TestResponseCache(TestHelper):
+    def setUp(self):
+        self.client = TestAsyncClient(artists_router)
+
+    async def test_repeated_reads_are_served_from_cache(self):
+        await self.create_artist()
+
+        response = await self.client.get('?name=bil&limit=10')
+        response2 = await self.client.get('?limit=10&name=bil')
+        response3 = await self.client.get('?name=joel')
+
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response2['X-Cache'], 'HIT')
+        self.assertEqual(response2.json(), response.json())
+        self.assertEqual(response3['X-Cache'], 'MISS')
+
+    async def test_changes_invalidate_cached_responses(self):
+        artist = await self.create_artist()
+        album = await self.create_album('Piano Man', artist)
+        client = TestAsyncClient(albums_router)
+        await self.client.get('')
+        await client.get(f'/{album.pk}')
+
+        await Artist.objects.acreate(name='Ray Charles')
+        response = await self.client.get('')
+        track = await Track.objects.acreate(
+            file='tracks/song.wav', title='Piano Man', album=album, duration=timedelta(minutes=1))
+        await track.artists.aadd(artist)
+        response2 = await client.get(f'/{album.pk}')
+
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(response2['X-Cache'], 'MISS')
+        self.assertEqual(response2.json()['tracks'][0]['artists'][0]['name'], 'Billy Joel')
+
+    async def test_only_successful_responses_are_cached(self):
+        response = await self.client.get('/42')
+        response2 = await self.client.get('/42')
+
+        self.assertEqual(response2.status_code, 404)
+        self.assertFalse(response2.has_header('X-Cache'))
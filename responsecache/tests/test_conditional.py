@@ -0,0 +1,112 @@
+from datetime import timedelta
+from django.utils import timezone
+from ninja.testing import TestAsyncClient
+
+from helpers import TestHelper
+
+from albums.api import router
+from albums.models import Album
+from artists.models import Artist
+from tracks.api import router as tracks_router
+from responsecache.cache import response_cache
+from tracks.models import Track
+
+
+# Ninja's test client does not normalize header names, so conditional
+# headers are passed in META
+class TestConditional(TestHelper):
+    def setUp(self):
+        self.client = TestAsyncClient(router)
+
+    async def test_album_is_not_sent_again_when_unchanged(self):
+        artist = await self.create_artist()
+        album = await self.create_album('Piano Man', artist)
+        url = f'/{album.pk}'
+
+        response = await self.client.get(url)
+        etag = response['ETag']
+        cached = await self.client.get(url, META={'HTTP_IF_NONE_MATCH': etag})
+        response_cache.clear()
+        uncached = await self.client.get(url, META={'HTTP_IF_NONE_MATCH': etag})
+        since = await self.client.get(
+            url, META={'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(etag.startswith('"'))
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], etag)
+        self.assertEqual(uncached.status_code, 304)
+        self.assertEqual(since.status_code, 304)
+
+    async def test_related_changes_produce_new_etag(self):
+        artist = await self.create_artist()
+        album = await self.create_album('Piano Man', artist)
+        url = f'/{album.pk}'
+        etags = [(await self.client.get(url))['ETag']]
+
+        track = await Track.objects.acreate(
+            file='tracks/song.wav', title='Piano Man', album=album,
+            duration=timedelta(seconds=200))
+        etags.append((await self.client.get(url))['ETag'])
+        await track.artists.aadd(artist)
+        etags.append((await self.client.get(url))['ETag'])
+        artist.name = 'William Joel'
+        await artist.asave()
+        etags.append((await self.client.get(url))['ETag'])
+        response = await self.client.get(url, META={'HTTP_IF_NONE_MATCH': etags[0]})
+
+        self.assertEqual(len(set(etags)), 4)
+        self.assertEqual(response.status_code, 200)
+
+    async def test_list_has_validators(self):
+        artist = await self.create_artist()
+        await self.create_album('Piano Man', artist)
+
+        response = await self.client.get('')
+        response2 = await self.client.get('', META={'HTTP_IF_NONE_MATCH': response['ETag']})
+        await self.create_album('Streetlife Serenade', artist)
+        response3 = await self.client.get('', META={'HTTP_IF_NONE_MATCH': response['ETag']})
+
+        self.assertEqual(response2.status_code, 304)
+        self.assertEqual(response3.status_code, 200)
+        self.assertEqual(response3.json()['count'], 2)
+
+    async def test_deleted_artist_changes_validators(self):
+        artist = await self.create_artist()
+        guest = await self.create_artist('Ray Charles')
+        album = await self.create_album('Piano Man', artist)
+        track = await Track.objects.acreate(
+            file='tracks/song.wav', title='Piano Man', album=album,
+            duration=timedelta(seconds=200))
+        await track.artists.aadd(artist, guest)
+        # Last-Modified has a resolution of seconds
+        past = timezone.now() - timedelta(days=1)
+        for model in [Artist, Album, Track]:
+            await model.objects.aupdate(updated_at=past)
+        tracks = TestAsyncClient(tracks_router)
+        response = await tracks.get(f'/{track.pk}')
+        album_etag = (await self.client.get(f'/{album.pk}'))['ETag']
+
+        await guest.adelete()
+        since = await tracks.get(f'/{track.pk}', META={
+            'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']})
+        album_response = await self.client.get(f'/{album.pk}', META={
+            'HTTP_IF_NONE_MATCH': album_etag})
+
+        self.assertEqual(since.status_code, 200)
+        self.assertEqual(len(since.json()['artists']), 1)
+        self.assertEqual(album_response.status_code, 200)
+
+    async def test_list_is_validated_by_etag_only(self):
+        await self.create_album('Piano Man', await self.create_artist())
+
+        response = await self.client.get('')
+
+        self.assertTrue(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    async def test_missing_album_has_no_validators(self):
+        response = await self.client.get('/42')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
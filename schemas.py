@@ -1,10 +1,12 @@
 from ninja import Schema, ModelSchema, FilterSchema, Field
-from typing import Optional, Any, Annotated, List
+from datetime import timedelta
+from typing import Optional, Any, Annotated, List, Dict
 from pydantic.functional_validators import AfterValidator
 
 from artists.models import Artist
 from albums.models import Album
 from tracks.models import Track
+from thumbnails.derivatives import thumbnail_urls
 
 
 def invert_bool(v: Any) -> bool:
@@ -14,20 +16,45 @@ def invert_bool(v: Any) -> bool:
 InvertedBool = Annotated[bool, AfterValidator(invert_bool)]
 
 
+def only_fields(schema, prefix: str = '') -> List[str]:
+    """
+    Columns of the model rendered by the schema, to be passed to
+    `QuerySet.only()`. Relations have to be joined or prefetched by the caller.
+    """
+    columns = {
+        f.name for f in schema.Meta.model._meta.concrete_fields if not f.is_relation
+    }
+    return [prefix + name for name in schema.model_fields if name in columns]
+
+
 # BASIC SCHEMAS (they do not contain any fields from other related models)
 class ArtistSchema(ModelSchema):
+    image_thumbnails: Optional[Dict[str, str]] = Field(None)
+
     class Meta:
         model = Artist
         fields = ['id', 'name', 'image']
 
+    @staticmethod
+    def resolve_image_thumbnails(obj):
+        return thumbnail_urls(obj.image, obj.image_thumbnails)
+
 
 class AlbumSchema(ModelSchema):
+    cover_thumbnails: Optional[Dict[str, str]] = Field(None)
+
     class Meta:
         model = Album
         fields = ['id', 'name', 'cover', 'genre', 'year']
 
+    @staticmethod
+    def resolve_cover_thumbnails(obj):
+        return thumbnail_urls(obj.cover, obj.cover_thumbnails)
+
 
 class TrackSchema(ModelSchema):
+    cover_thumbnails: Optional[Dict[str, str]] = Field(None)
+
     class Meta:
         model = Track
         fields = [
@@ -35,6 +62,10 @@ class TrackSchema(ModelSchema):
             'number', 'year', 'cover', 'file'
         ]
 
+    @staticmethod
+    def resolve_cover_thumbnails(obj):
+        return thumbnail_urls(obj.cover, obj.cover_thumbnails)
+
 # COLLECTION SCHEMAS
 class ArtistAlbumCount(ArtistSchema):
     album_count: Optional[int] = Field(0)
@@ -61,6 +92,10 @@ class AlbumFull(AlbumArtist):
     tracks: List[TrackArtists] = Field([], alias='track_set')
 
 
+class TrackFull(TrackArtists):
+    album: Optional[AlbumArtist] = Field(None)
+
+
 # FILTER SCHEMAS
 class ArtistFilter(FilterSchema):
     name: Optional[str] = Field(None, q='name__icontains')
@@ -76,9 +111,49 @@ class AlbumFilter(FilterSchema):
     has_image: Optional[InvertedBool] = Field(None, q="cover__isnull")
 
 
+class TrackFilter(FilterSchema):
+    title: Optional[str] = Field(None, q='title__icontains')
+    genre: Optional[str] = Field(None, q='genre__icontains')
+    year: Optional[int] = Field(None)
+    album_id: Optional[int] = Field(None, q='album__id')
+    artist_id: Optional[int] = Field(None, q='artists__id')
+
+
 # INPUT SCHEMAS
 class AlbumSchemaIn(Schema):
     name: str
     genre: Optional[str] = Field(None)
     year: Optional[int] = Field(None)
     artist_id: int
+
+
+class TrackSchemaIn(Schema):
+    # Missing values are read from tags of the uploaded file
+    title: Optional[str] = Field(None, max_length=200)
+    duration: Optional[timedelta] = Field(None)
+    genre: Optional[str] = Field(None)
+    number: Optional[int] = Field(None, ge=1)
+    year: Optional[int] = Field(None)
+    album_id: Optional[int] = Field(None)
+    artist_ids: List[int] = Field([])
+
+
+# BATCH SCHEMAS
+# Images are referenced by names of files uploaded with the batch,
+# records with `id` are updated instead of created
+class ArtistBatchIn(Schema):
+    id: Optional[int] = Field(None)
+    name: str = Field(..., max_length=200)
+    image: Optional[str] = Field(None)
+
+
+class AlbumBatchIn(AlbumSchemaIn):
+    id: Optional[int] = Field(None)
+    cover: Optional[str] = Field(None)
+
+
+class BatchResult(Schema):
+    index: int
+    status: int
+    id: Optional[int] = Field(None)
+    errors: List[Dict[str, Any]] = Field([])
@@ -0,0 +1,18 @@
+from ninja import Router, Query
+from typing import List, Literal
+from asgiref.sync import sync_to_async
+
+from .backends import get_backend
+from .schemas import SearchResult
+
+
+router = Router(tags=['Search'])
+
+Kind = Literal['artist', 'album', 'track']
+
+
+@router.get('', response=List[SearchResult])
+async def search(request, q: str, kind: List[Kind] = Query(None),
+                 limit: int = Query(20, ge=1, le=100)):
+    """Artists, albums and tracks matching the query, best matches first"""
+    return await sync_to_async(get_backend().search)(q, kinds=kind, limit=limit)
@@ -0,0 +1,148 @@
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, When, Value, IntegerField, F
+from django.utils.module_loading import import_string
+
+from artists.models import Artist
+from albums.models import Album
+from tracks.models import Track
+
+
+# Searchable models, their text field and code stored in the index
+KINDS = {
+    'artist': (Artist, 'name', 0),
+    'album': (Album, 'name', 1),
+    'track': (Track, 'title', 2),
+}
+MODEL_KINDS = {model: kind for kind, (model, _, _) in KINDS.items()}
+
+
+class SearchBackend:
+    """Inverted index of artist names, album names and track titles"""
+
+    def index(self, kind: str, rows: Iterable[Tuple[int, str]]):
+        """Add or replace the `(pk, text)` rows of the kind"""
+
+    def remove(self, kind: str, pks: Iterable[int]):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, q: str, kinds: Optional[List[str]] = None,
+               limit: int = 20) -> List[Dict]:
+        """Best matches first, as dicts with `kind`, `id` and `name`"""
+        raise NotImplementedError
+
+    def index_objects(self, objects: Iterable):
+        rows = {}
+        for obj in objects:
+            kind = MODEL_KINDS.get(type(obj))
+            if kind is not None:
+                rows.setdefault(kind, []).append((obj.pk, getattr(obj, KINDS[kind][1])))
+        for kind, items in rows.items():
+            self.index(kind, items)
+
+
+class FTS5Backend(SearchBackend):
+    """
+    SQLite FTS5 table in the main database, so the index is updated in the
+    same transaction as the records. Ranked with bm25, the last word of the
+    query matches prefixes. Rowids encode the primary key and the kind.
+    """
+    table = 'search_index'
+
+    def rowid(self, kind: str, pk: int) -> int:
+        return pk * len(KINDS) + KINDS[kind][2]
+
+    def index(self, kind, rows):
+        rows = [(self.rowid(kind, pk), text) for pk, text in rows]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s',
+                               [(rowid,) for rowid, _ in rows])
+            cursor.executemany(f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)', rows)
+
+    def remove(self, kind, pks):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s',
+                               [(self.rowid(kind, pk),) for pk in pks])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            for model, field, code in KINDS.values():
+                column = model._meta.get_field(field).column
+                cursor.execute(
+                    f'INSERT INTO {self.table} (rowid, text) '
+                    f'SELECT id * {len(KINDS)} + {code}, "{column}" FROM "{model._meta.db_table}"')
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+
+    def match_expression(self, q: str) -> Optional[str]:
+        # Every word is quoted, so FTS5 operators in the query are ignored
+        terms = ['"{}"'.format(term.replace('"', '""')) for term in q.split()]
+        if not terms:
+            return None
+        return ' '.join(terms) + '*'
+
+    def search(self, q, kinds=None, limit=20):
+        expression = self.match_expression(q)
+        if expression is None:
+            return []
+
+        sql = f'SELECT rowid, text FROM {self.table} WHERE {self.table} MATCH %s'
+        params = [expression]
+        if kinds:
+            codes = [KINDS[kind][2] for kind in kinds]
+            sql += f' AND rowid %% {len(KINDS)} IN ({", ".join(["%s"] * len(codes))})'
+            params.extend(codes)
+        sql += ' ORDER BY rank LIMIT %s'
+        params.append(limit)
+
+        names = {code: kind for kind, (_, _, code) in KINDS.items()}
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [
+                {'kind': names[rowid % len(KINDS)], 'id': rowid // len(KINDS), 'name': text}
+                for rowid, text in cursor.fetchall()
+            ]
+
+
+class DatabaseBackend(SearchBackend):
+    """
+    Portable fallback without an index of its own. Queries model tables
+    with `icontains`, which trigram indexes serve on PostgreSQL. Exact
+    matches rank first, then prefixes, then the shortest names.
+    """
+
+    def search(self, q, kinds=None, limit=20):
+        q = q.strip()
+        if not q:
+            return []
+
+        results = []
+        for kind in kinds or KINDS:
+            model, field, _ = KINDS[kind]
+            qs = model.objects.filter(**{f'{field}__icontains': q}).annotate(
+                rank=Case(
+                    When(**{f'{field}__iexact': q}, then=Value(0)),
+                    When(**{f'{field}__istartswith': q}, then=Value(1)),
+                    default=Value(2), output_field=IntegerField(),
+                ),
+                text=F(field),
+            ).order_by('rank', 'pk').values_list('pk', 'text', 'rank')[:limit]
+            results.extend((rank, len(text), kind, pk, text) for pk, text, rank in qs)
+
+        results.sort()
+        return [
+            {'kind': kind, 'id': pk, 'name': text}
+            for _, _, kind, pk, text in results[:limit]
+        ]
+
+
+@lru_cache
+def get_backend() -> SearchBackend:
+    return import_string(settings.SEARCH_BACKEND)()
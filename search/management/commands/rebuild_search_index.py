@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from search.backends import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search index from artists, albums and tracks'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            get_backend().rebuild()
+        self.stdout.write('Search index rebuilt')
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+KINDS = [('artists', 'Artist', 'name'), ('albums', 'Album', 'name'), ('tracks', 'Track', 'title')]
+
+
+def create_index(apps, schema_editor):
+    # Other databases use a backend without its own index
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "text, tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+    for code, (app_label, model_name, field) in enumerate(KINDS):
+        model = apps.get_model(app_label, model_name)
+        column = model._meta.get_field(field).column
+        schema_editor.execute(
+            f'INSERT INTO search_index (rowid, text) SELECT id * {len(KINDS)} + {code}, '
+            f'"{column}" FROM "{model._meta.db_table}"')
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('artists', '0002_trigram_indexes'),
+        ('albums', '0002_indexes'),
+        ('tracks', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,7 @@
+from ninja import Schema
+
+
+class SearchResult(Schema):
+    kind: str
+    id: int
+    name: str
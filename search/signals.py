@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .backends import KINDS, MODEL_KINDS, get_backend
+
+
+# bulk_create() does not send signals, bulk writers index records themselves
+@receiver(post_save)
+def index_record(sender, instance, raw=False, update_fields=None, **kwargs):
+    kind = MODEL_KINDS.get(sender)
+    if kind is None or raw:
+        return
+    field = KINDS[kind][1]
+    if update_fields is not None and field not in update_fields:
+        return
+    get_backend().index(kind, [(instance.pk, getattr(instance, field))])
+
+
+@receiver(post_delete)
+def remove_record(sender, instance, **kwargs):
+    kind = MODEL_KINDS.get(sender)
+    if kind is not None:
+        get_backend().remove(kind, [instance.pk])
@@ -0,0 +1,72 @@
+from datetime import timedelta
+from django.test import override_settings
+from ninja.testing import TestAsyncClient
+
+from helpers import TestHelper
+
+from search.api import router
+from search.backends import get_backend
+from tracks.models import Track
+
+
+class TestRouter(TestHelper):
+    def setUp(self):
+        self.client = TestAsyncClient(router)
+
+    async def create_catalogue(self):
+        artist = await self.create_artist()
+        album = await self.create_album('Piano Man', artist)
+        track = await Track.objects.acreate(
+            file='tracks/song.wav', title='Piano Man', album=album,
+            duration=timedelta(seconds=200))
+        await Track.objects.acreate(
+            file='tracks/song.wav', title='The Ballad of Billy the Kid',
+            duration=timedelta(seconds=200))
+        return artist, album, track
+
+    async def test_guest_can_search_whole_catalogue(self):
+        artist, album, track = await self.create_catalogue()
+
+        response = await self.client.get('?q=piano')
+        response2 = await self.client.get('?q=bil')
+        response3 = await self.client.get('?q=piano&kind=track')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted((r['kind'], r['id']) for r in response.json()),
+            [('album', album.pk), ('track', track.pk)])
+        self.assertEqual(response2.json()[0], {'kind': 'artist', 'id': artist.pk, 'name': 'Billy Joel'})
+        self.assertEqual(len(response2.json()), 2)
+        self.assertEqual([r['kind'] for r in response3.json()], ['track'])
+
+    async def test_index_follows_changes_of_records(self):
+        artist, album, track = await self.create_catalogue()
+        track.title = 'Captain Jack'
+        await track.asave()
+        await album.adelete()
+
+        response = await self.client.get('?q=piano')
+        response2 = await self.client.get('?q="captain jack')
+
+        self.assertEqual(response.json(), [])
+        self.assertEqual(response2.json()[0]['id'], track.pk)
+
+    async def test_operators_in_query_are_ignored(self):
+        await self.create_catalogue()
+
+        response = await self.client.get('?q=piano OR NEAR(')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+    @override_settings(SEARCH_BACKEND='search.backends.DatabaseBackend')
+    async def test_database_backend_ranks_exact_matches_first(self):
+        get_backend.cache_clear()
+        self.addCleanup(get_backend.cache_clear)
+        artist, album, track = await self.create_catalogue()
+
+        response = await self.client.get('?q=Piano Man')
+
+        self.assertEqual(
+            [(r['kind'], r['id']) for r in response.json()],
+            [('album', album.pk), ('track', track.pk)])
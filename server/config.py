@@ -0,0 +1,78 @@
+import os
+from importlib.util import find_spec
+from typing import List, Optional
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+APPLICATIONS = {
+    'asgi': 'main.asgi:application',
+    # Served only for comparison by `manage.py loadtest`, views are async
+    'wsgi': 'main.wsgi:application',
+}
+# Names of the interfaces in uvicorn
+INTERFACES = {'asgi': 'asgi3', 'wsgi': 'wsgi'}
+
+
+def cpu_count() -> int:
+    """Cores the process may run on, which can be fewer than the machine has"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def default_workers() -> int:
+    # Views never block the event loop, so one process keeps a core busy
+    return getattr(settings, 'SERVER_WORKERS', None) or cpu_count()
+
+
+def process_local_caches() -> List[str]:
+    """
+    Caches of invalidated data which every worker keeps to itself. Changes
+    made through one worker are seen by the others only after the cached
+    entries expire.
+    """
+    local = []
+    alias = getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')
+    if getattr(settings, 'RESPONSE_CACHE_TTL', 600) > 0 and isinstance(caches[alias], LocMemCache):
+        local.append('responses')
+    alias = getattr(settings, 'TOKEN_CACHE_ALIAS', None)
+    if getattr(settings, 'TOKEN_CACHE_TTL', 300) > 0 and (
+            alias is None or isinstance(caches[alias], LocMemCache)):
+        local.append('tokens')
+    return local
+
+
+def event_loop() -> str:
+    return 'uvloop' if find_spec('uvloop') else 'asyncio'
+
+
+def http_parser() -> str:
+    return 'httptools' if find_spec('httptools') else 'h11'
+
+
+def uvicorn_options(host: str = '127.0.0.1', port: int = 8000, workers: Optional[int] = None,
+                    reload: bool = False, **overrides) -> dict:
+    """Arguments of `uvicorn.run()` for serving the project"""
+    options = {
+        'host': host,
+        'port': port,
+        # Reloading watches the files from a single process
+        'workers': 1 if reload else workers or default_workers(),
+        'reload': reload,
+        'loop': event_loop(),
+        'http': http_parser(),
+        # Django does not handle lifespan events
+        'lifespan': 'off',
+        'backlog': getattr(settings, 'SERVER_BACKLOG', 2048),
+        'timeout_keep_alive': getattr(settings, 'SERVER_KEEP_ALIVE', 5),
+        'timeout_graceful_shutdown': getattr(settings, 'SERVER_GRACEFUL_TIMEOUT', None),
+        'limit_concurrency': getattr(settings, 'SERVER_LIMIT_CONCURRENCY', None),
+        'limit_max_requests': getattr(settings, 'SERVER_MAX_REQUESTS', None),
+        'proxy_headers': True,
+        'forwarded_allow_ips': getattr(settings, 'SERVER_FORWARDED_ALLOW_IPS', None),
+        'server_header': False,
+    }
+    options.update({k: v for k, v in overrides.items() if v is not None})
+    return options
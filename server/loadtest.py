@@ -0,0 +1,98 @@
+import asyncio
+import math
+import time
+from typing import List, NamedTuple, Tuple
+
+
+class LoadResult(NamedTuple):
+    requests: int
+    errors: int
+    duration: float
+    # Seconds, sorted
+    latencies: List[float]
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.duration if self.duration else 0.0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        index = min(len(self.latencies) - 1, math.ceil(p / 100 * len(self.latencies)) - 1)
+        return self.latencies[max(index, 0)]
+
+
+def build_request(host: str, path: str) -> bytes:
+    return (f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'
+            f'Accept: application/json\r\n\r\n').encode('latin1')
+
+
+async def read_response(reader: asyncio.StreamReader) -> Tuple[int, bool]:
+    """Status of the response and whether the connection can be reused"""
+    status_line = await reader.readuntil(b'\r\n')
+    version, status = status_line.split(b' ', 2)[:2]
+    headers = {}
+    while (line := await reader.readuntil(b'\r\n')) != b'\r\n':
+        name, _, value = line.partition(b':')
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if headers.get(b'transfer-encoding') == b'chunked':
+        while size := int((await reader.readuntil(b'\r\n')).split(b';')[0], 16):
+            await reader.readexactly(size + 2)
+        # Trailers are not sent by the servers, only the final line
+        await reader.readuntil(b'\r\n')
+    elif b'content-length' in headers:
+        await reader.readexactly(int(headers[b'content-length']))
+    else:
+        await reader.read()
+        return int(status), False
+
+    reuse = headers.get(b'connection') != b'close' and version == b'HTTP/1.1'
+    return int(status), reuse
+
+
+async def client(host: str, port: int, requests: List[bytes], deadline: float,
+                 latencies: List[float], errors: List[int]):
+    """One keep-alive connection sending the requests in turns until the deadline"""
+    reader = writer = None
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(requests[i % len(requests)])
+            status, reuse = await read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors.append(0)
+            status, reuse = None, False
+            # Do not spin while the server is unreachable
+            await asyncio.sleep(0.01)
+        else:
+            latencies.append(time.perf_counter() - start)
+            if status >= 500:
+                errors.append(status)
+        if not reuse and writer is not None:
+            writer.close()
+            writer = None
+        i += 1
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(host: str, port: int, paths: List[str], connections: int = 64,
+                   duration: float = 10.0) -> LoadResult:
+    """
+    Keep `connections` requests in flight for `duration` seconds. The client
+    runs on a single event loop, so throughput is capped by its own core.
+    """
+    requests = [build_request(host, path) for path in paths]
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(host, port, requests[i % len(requests):] + requests[:i % len(requests)],
+               start + duration, latencies, errors)
+        for i in range(connections)
+    ])
+    elapsed = time.perf_counter() - start
+    return LoadResult(len(latencies), len(errors), elapsed, sorted(latencies))
@@ -0,0 +1,85 @@
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from server.config import APPLICATIONS
+from server.loadtest import run_load
+
+
+class Command(BaseCommand):
+    help = ('Compare throughput of the API served through ASGI and WSGI. Each '
+            'interface is started with `manage.py serve` on a free port, warmed '
+            'up and loaded with concurrent keep-alive connections.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Requested in turns, can be repeated. Public catalogue by default')
+        parser.add_argument('--connections', type=int, default=64)
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds')
+        parser.add_argument('--warmup', type=float, default=2.0, help='Seconds')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Worker processes of the servers, one keeps the client from '
+                 'being the bottleneck')
+        parser.add_argument(
+            '--interface', action='append', dest='interfaces', choices=list(APPLICATIONS))
+        parser.add_argument(
+            '--url', help='Load a running server at host:port instead')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/api/artists/', '/api/albums/', '/api/tracks/']
+        load = (options['connections'], options['duration'], options['warmup'])
+
+        if options['url']:
+            host, _, port = options['url'].rpartition(':')
+            self.report(options['url'], self.load(host, int(port), paths, *load))
+            return
+
+        for interface in options['interfaces'] or list(APPLICATIONS):
+            port = self.free_port()
+            server = subprocess.Popen(
+                [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'serve',
+                 '--port', str(port), '--workers', str(options['workers']),
+                 '--interface', interface],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                self.wait_for(port, server)
+                self.report(interface.upper(), self.load('127.0.0.1', port, paths, *load))
+            finally:
+                server.terminate()
+                server.wait()
+
+    def load(self, host: str, port: int, paths, connections: int, duration: float,
+             warmup: float):
+        if warmup:
+            asyncio.run(run_load(host, port, paths, connections, warmup))
+        return asyncio.run(run_load(host, port, paths, connections, duration))
+
+    def report(self, label: str, result):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(f'  {result.throughput:10.1f} requests/s')
+        self.stdout.write(f'  {result.percentile(50) * 1000:10.2f} ms p50')
+        self.stdout.write(f'  {result.percentile(99) * 1000:10.2f} ms p99')
+        self.stdout.write(f'  {result.errors:10d} errors')
+
+    def free_port(self) -> int:
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def wait_for(self, port: int, server: subprocess.Popen, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('Server exited, run `manage.py serve` to see why')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError(f'Server did not start within {timeout:.0f} seconds')
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from server.config import APPLICATIONS, INTERFACES, process_local_caches, uvicorn_options
+
+
+class Command(BaseCommand):
+    help = ('Serve the API with uvicorn worker processes. SIGHUP restarts the '
+            'workers one at a time, SIGTTIN and SIGTTOU add or remove a worker '
+            'and workers which die are replaced.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8000)
+        parser.add_argument('--uds', help='Bind to a UNIX domain socket instead')
+        parser.add_argument(
+            '--workers', type=int,
+            help='Worker processes, one per available core by default')
+        parser.add_argument(
+            '--reload', action='store_true',
+            help='Restart a single worker when the code changes, for development')
+        parser.add_argument(
+            '--keep-alive', type=int, dest='timeout_keep_alive',
+            help='Seconds idle connections are kept open, longer than the '
+                 'idle timeout of the proxy in front')
+        parser.add_argument(
+            '--graceful-timeout', type=int, dest='timeout_graceful_shutdown',
+            help='Seconds a stopping worker waits for requests in progress')
+        parser.add_argument(
+            '--max-requests', type=int, dest='limit_max_requests',
+            help='Requests a worker serves before it is replaced')
+        parser.add_argument(
+            '--limit-concurrency', type=int,
+            help='Connections and tasks of a worker above which 503 is returned')
+        parser.add_argument('--access-log', action='store_true')
+        parser.add_argument(
+            '--interface', choices=list(APPLICATIONS), default='asgi',
+            help='WSGI runs the async views in a thread pool, see `loadtest`')
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError('uvicorn is not installed')
+
+        overrides = {key: options[key] for key in [
+            'uds', 'timeout_keep_alive', 'timeout_graceful_shutdown',
+            'limit_max_requests', 'limit_concurrency']}
+        config = uvicorn_options(
+            options['host'], options['port'], options['workers'], options['reload'],
+            access_log=options['access_log'], interface=INTERFACES[options['interface']], **overrides)
+        if config['reload']:
+            config['reload_dirs'] = [str(settings.BASE_DIR)]
+
+        local = process_local_caches()
+        if config['workers'] > 1 and local:
+            self.stderr.write(self.style.WARNING(
+                f"Caches of {' and '.join(local)} are kept by every worker, so changes "
+                f"reach the other workers only when the entries expire. Point "
+                f"RESPONSE_CACHE_ALIAS and TOKEN_CACHE_ALIAS to a shared cache or run "
+                f"a single worker. Each worker also reports its own metrics."))
+
+        self.stdout.write(
+            f"Serving {options['interface'].upper()} with {config['workers']} workers "
+            f"({config['loop']}, {config['http']})")
+        uvicorn.run(APPLICATIONS[options['interface']], **config)
@@ -0,0 +1,70 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import middleware as auth
+from django.contrib.messages import middleware as messages
+from django.contrib.sessions import middleware as sessions
+from django.middleware import clickjacking, common, csrf, security
+
+
+class EventLoopMixin:
+    """
+    Runs the hooks of a stock middleware on the event loop. `MiddlewareMixin`
+    sends every hook to a thread under ASGI, two thread switches for each
+    middleware in the stack cost more than the hooks themselves. Hooks which
+    may query the database still run in a thread, see `in_thread()`.
+    """
+
+    def in_thread(self, request, response=None) -> bool:
+        return False
+
+    async def run_hook(self, hook, request, *args):
+        if self.in_thread(request, *args):
+            return await sync_to_async(hook)(request, *args)
+        return hook(request, *args)
+
+    async def __acall__(self, request):
+        response = None
+        if hasattr(self, 'process_request'):
+            response = await self.run_hook(self.process_request, request)
+        response = response or await self.get_response(request)
+        if hasattr(self, 'process_response'):
+            response = await self.run_hook(self.process_response, request, response)
+        return response
+
+
+class SecurityMiddleware(EventLoopMixin, security.SecurityMiddleware):
+    pass
+
+
+class CommonMiddleware(EventLoopMixin, common.CommonMiddleware):
+    pass
+
+
+class XFrameOptionsMiddleware(EventLoopMixin, clickjacking.XFrameOptionsMiddleware):
+    pass
+
+
+class SessionMiddleware(EventLoopMixin, sessions.SessionMiddleware):
+    def in_thread(self, request, response=None):
+        # Session is loaded lazily, it is saved only after it was used
+        session = getattr(request, 'session', None)
+        return response is not None and session is not None and (
+            session.accessed or settings.SESSION_SAVE_EVERY_REQUEST)
+
+
+class AuthenticationMiddleware(EventLoopMixin, auth.AuthenticationMiddleware):
+    # `request.user` is lazy, nothing is loaded here
+    pass
+
+
+class MessageMiddleware(EventLoopMixin, messages.MessageMiddleware):
+    def in_thread(self, request, response=None):
+        # Messages are stored only when some were read or added
+        storage = getattr(request, '_messages', None)
+        return response is not None and storage is not None and (
+            storage.used or storage.added_new)
+
+
+class CsrfViewMiddleware(EventLoopMixin, csrf.CsrfViewMiddleware):
+    def in_thread(self, request, response=None):
+        return settings.CSRF_USE_SESSIONS
@@ -0,0 +1,86 @@
+import asyncio
+import io
+import tempfile
+from unittest import mock
+from django.conf import settings
+from django.core.management import call_command
+
+from helpers import TestHelper
+
+from server.config import cpu_count, event_loop, process_local_caches, uvicorn_options
+from server.loadtest import run_load
+
+
+class TestServer(TestHelper):
+    def test_workers_are_derived_from_cores(self):
+        options = uvicorn_options()
+        with self.settings(SERVER_WORKERS=3, SERVER_KEEP_ALIVE=120):
+            options2 = uvicorn_options(timeout_keep_alive=None, limit_max_requests=1000)
+        options3 = uvicorn_options(workers=4, reload=True)
+
+        self.assertEqual(options['workers'], cpu_count())
+        self.assertEqual(options['loop'], event_loop())
+        self.assertEqual(options['lifespan'], 'off')
+        self.assertEqual(options2['workers'], 3)
+        self.assertEqual(options2['timeout_keep_alive'], 120)
+        self.assertEqual(options2['limit_max_requests'], 1000)
+        self.assertEqual(options3['workers'], 1)
+
+    def test_process_local_caches_are_reported(self):
+        with tempfile.TemporaryDirectory() as td:
+            shared = {**settings.CACHES, 'shared': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': td,
+            }}
+            with self.settings(CACHES=shared, RESPONSE_CACHE_ALIAS='shared',
+                               TOKEN_CACHE_ALIAS='shared'):
+                local = process_local_caches()
+
+        err, err2 = io.StringIO(), io.StringIO()
+        with mock.patch('uvicorn.run'):
+            call_command('serve', workers=2, stdout=io.StringIO(), stderr=err)
+            call_command('serve', workers=1, stdout=io.StringIO(), stderr=err2)
+
+        self.assertEqual(process_local_caches(), ['responses', 'tokens'])
+        self.assertEqual(local, [])
+        self.assertIn('Caches of responses and tokens are kept by every worker', err.getvalue())
+        self.assertEqual(err2.getvalue(), '')
+
+    async def test_load_is_kept_on_reused_connections(self):
+        connections = []
+
+        async def handle(reader, writer):
+            connections.append(writer)
+            chunked = len(connections) % 2 == 0
+            try:
+                while await reader.readuntil(b'\r\n\r\n'):
+                    # Both ways of framing the body are read
+                    if chunked:
+                        writer.write(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+                                     b'2\r\n{}\r\n0\r\n\r\n')
+                    else:
+                        writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}')
+                    await writer.drain()
+            except asyncio.IncompleteReadError:
+                writer.close()
+
+        server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            result = await run_load('127.0.0.1', port, ['/a', '/b'], connections=4, duration=0.3)
+
+        self.assertGreater(result.requests, 10)
+        self.assertEqual(result.errors, 0)
+        self.assertEqual(len(connections), 4)
+        self.assertLessEqual(result.percentile(50), result.percentile(99))
+
+    async def test_admin_session_is_saved_through_middleware(self):
+        await self.create_user(username='admin', staff=True, superuser=True)
+
+        response = await self.async_client.get('/api/artists/')
+        response2 = await self.async_client.post(
+            '/admin/login/', {'username': 'admin', 'password': 'test1234'})
+
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertEqual(response2.status_code, 302)
+        self.assertIn(settings.SESSION_COOKIE_NAME, response2.cookies)
@@ -0,0 +1,141 @@
+import io
+import logging
+from typing import Dict, List, Optional
+from PIL import Image, ImageOps, features
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+
+from responsecache.cache import response_cache
+
+
+logger = logging.getLogger("django")
+
+# Longest edge of generated thumbnails in pixels
+THUMBNAIL_SIZES = getattr(settings, 'THUMBNAIL_SIZES', [64, 256, 1024])
+THUMBNAIL_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+THUMBNAIL_QUALITY = getattr(settings, 'THUMBNAIL_QUALITY', 80)
+
+
+def thumbnail_name(name: str, size: int) -> str:
+    ext = 'webp' if THUMBNAIL_FORMAT == 'WEBP' else 'jpg'
+    return f'thumbnails/{size}/{name}.{ext}'
+
+
+def thumbnail_storage():
+    return storages['thumbnails']
+
+
+def sizes_field(file: FieldFile) -> str:
+    """
+    Models record sizes of generated thumbnails in `<field>_thumbnails`,
+    so URLs are advertised only for the thumbnails which exist
+    """
+    return f'{file.field.name}_thumbnails'
+
+
+def thumbnail_urls(file: Optional[FieldFile],
+                   sizes: Optional[List[int]]) -> Optional[Dict[str, str]]:
+    """URLs of generated thumbnails of the image, keyed by their size"""
+    if not file or not sizes:
+        return None
+    storage = thumbnail_storage()
+    return {
+        str(size): storage.url(thumbnail_name(file.name, size))
+        for size in THUMBNAIL_SIZES if size in sizes
+    }
+
+
+def _prepare(img: Image.Image) -> Image.Image:
+    img = ImageOps.exif_transpose(img)
+    has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+    if THUMBNAIL_FORMAT == 'WEBP' and has_alpha:
+        return img.convert('RGBA')
+    return img.convert('RGB')
+
+
+def generate_thumbnails(file: FieldFile) -> bool:
+    """
+    Store downscaled copies of the image for every configured size.
+    Sizes are produced from the largest to the smallest, each one from
+    the previous copy, so the original is decoded only once.
+    """
+    if not file:
+        return False
+
+    storage = thumbnail_storage()
+    names = {size: thumbnail_name(file.name, size) for size in THUMBNAIL_SIZES}
+    # Shared files have their thumbnails already
+    if all(storage.exists(name) for name in names.values()):
+        return True
+
+    try:
+        with file.storage.open(file.name, 'rb') as fp, Image.open(fp) as original:
+            # JPEG can be decoded at reduced scale straight away
+            largest = max(THUMBNAIL_SIZES)
+            original.draft('RGB', (largest, largest))
+            img = _prepare(original)
+
+            for size in sorted(THUMBNAIL_SIZES, reverse=True):
+                img.thumbnail((size, size))
+                buffer = io.BytesIO()
+                img.save(buffer, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+
+                name = names[size]
+                if storage.exists(name):
+                    storage.delete(name)
+                storage.save(name, ContentFile(buffer.getvalue()))
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.warning(f"Could not create thumbnails of '{file.name}': {e}")
+        return False
+    return True
+
+
+def record_thumbnails(file: FieldFile, generated: bool, invalidate: bool = True):
+    """
+    Store which thumbnails of the image exist in its record. Callers
+    recording many images pass `invalidate=False` and invalidate cached
+    responses once.
+    """
+    instance, sizes = file.instance, sorted(THUMBNAIL_SIZES) if generated else []
+    setattr(instance, sizes_field(file), sizes)
+    if instance.pk is None:
+        return
+
+    changes = {sizes_field(file): sizes}
+    # Only catalogue records are rendered by cached responses
+    catalogue = hasattr(instance, 'updated_at')
+    if catalogue:
+        # Changes validators of cached representations
+        changes['updated_at'] = timezone.now()
+    type(instance).objects.filter(pk=instance.pk).update(**changes)
+    if catalogue and invalidate:
+        response_cache.invalidate()
+
+
+def delete_thumbnails(file: FieldFile):
+    """Delete thumbnails, unless the image is still used by other records"""
+    if not file:
+        return
+    # The record is saved by the caller
+    setattr(file.instance, sizes_field(file), [])
+    references = getattr(file.storage, 'references', None)
+    if references and references(file.name) > 1:
+        return
+
+    storage = thumbnail_storage()
+    for size in THUMBNAIL_SIZES:
+        storage.delete(thumbnail_name(file.name, size))
+
+
+async def agenerate_thumbnails(file: FieldFile) -> bool:
+    generated = await sync_to_async(generate_thumbnails, thread_sensitive=False)(file)
+    await sync_to_async(record_thumbnails)(file, generated)
+    return generated
+
+
+async def adelete_thumbnails(file: FieldFile):
+    await sync_to_async(delete_thumbnails)(file)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from artists.models import Artist
+from albums.models import Album
+from tracks.models import Track
+from users.models import User
+from responsecache.cache import response_cache
+from thumbnails.derivatives import generate_thumbnails, record_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnails of already uploaded images'
+
+    def handle(self, *args, **options):
+        sources = [
+            (Artist, 'image'), (Album, 'cover'),
+            (Track, 'cover'), (User, 'avatar'),
+        ]
+        for model, field in sources:
+            created = 0
+            qs = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+            for obj in qs.only('pk', field).iterator():
+                file = getattr(obj, field)
+                generated = generate_thumbnails(file)
+                record_thumbnails(file, generated, invalidate=False)
+                if generated:
+                    created += 1
+            self.stdout.write(f'{model.__name__}: {created} images processed')
+        # Once for all the records, not for every image
+        response_cache.invalidate()
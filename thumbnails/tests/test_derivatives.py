@@ -0,0 +1,81 @@
+import io
+import tempfile
+from unittest import mock
+from PIL import Image
+from django.core.management import call_command
+
+from helpers import TestHelper
+from artists.models import Artist
+from users.models import User
+from thumbnails.derivatives import (
+    generate_thumbnails, agenerate_thumbnails, delete_thumbnails, record_thumbnails,
+    thumbnail_name, thumbnail_urls, thumbnail_storage
+)
+
+
+class TestThumbnails(TestHelper):
+    def test_thumbnails_are_generated_for_every_size(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            image = self.image_file('cover.jpg', size=(2000, 1000), fmt='JPEG')
+            artist = Artist.objects.create(name='ABBA', image=image)
+
+            self.assertTrue(generate_thumbnails(artist.image))
+            for size in [64, 256, 1024]:
+                name = thumbnail_name(artist.image.name, size)
+                with thumbnail_storage().open(name) as f, Image.open(f) as img:
+                    self.assertEqual(img.size, (size, size // 2))
+
+            delete_thumbnails(artist.image)
+            self.assertFalse(self.fileExists(td, thumbnail_name(artist.image.name, 64)))
+
+    def test_images_are_not_upscaled(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            artist = Artist.objects.create(name='ABBA', image=self.image_file(size=(100, 100)))
+
+            generate_thumbnails(artist.image)
+            name = thumbnail_name(artist.image.name, 1024)
+            with thumbnail_storage().open(name) as f, Image.open(f) as img:
+                self.assertEqual(img.size, (100, 100))
+
+    def test_invalid_image_is_skipped(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            artist = Artist.objects.create(
+                name='ABBA', image=self.content_file(b'junk', 'junk.jpg'))
+
+            generated = generate_thumbnails(artist.image)
+            record_thumbnails(artist.image, generated)
+            artist.refresh_from_db()
+
+            self.assertFalse(generated)
+            self.assertEqual(artist.image_thumbnails, [])
+            self.assertIsNone(thumbnail_urls(artist.image, artist.image_thumbnails))
+            self.assertIsNone(thumbnail_urls(Artist(name='Queen').image, []))
+
+    def test_responses_are_invalidated_once_per_backfill(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            for name in ['ABBA', 'Queen']:
+                Artist.objects.create(name=name, image=self.image_file(f'{name}.png'))
+            user = User.objects.create(username='john', email='john@example.com',
+                                       avatar=self.image_file('avatar.png'))
+
+            with mock.patch('responsecache.cache.response_cache.invalidate') as invalidate:
+                record_thumbnails(user.avatar, generate_thumbnails(user.avatar))
+                avatar_calls = invalidate.call_count
+                call_command('generate_thumbnails', stdout=io.StringIO())
+
+            self.assertEqual(avatar_calls, 0)
+            self.assertEqual(invalidate.call_count, 1)
+            self.assertEqual(Artist.objects.filter(image_thumbnails=[64, 256, 1024]).count(), 2)
+
+    async def test_only_generated_thumbnails_are_advertised(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            artist = await Artist.objects.acreate(name='ABBA', image=self.image_file())
+
+            response = await self.async_client.get(f'/api/artists/{artist.pk}')
+            await agenerate_thumbnails(artist.image)
+            response2 = await self.async_client.get(f'/api/artists/{artist.pk}')
+            await artist.arefresh_from_db()
+
+            self.assertIsNone(response.json()['image_thumbnails'])
+            self.assertEqual(artist.image_thumbnails, [64, 256, 1024])
+            self.assertEqual(list(response2.json()['image_thumbnails']), ['64', '256', '1024'])
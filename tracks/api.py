@@ -1,16 +1,289 @@
+import mimetypes
+import os
+import re
+from uuid import UUID
+from django.db.models import Count, Max, Prefetch
 from ninja import Router, Form, Query, File
 from ninja.pagination import paginate
+from ninja.decorators import decorate_view
 from ninja.files import UploadedFile
 from ninja.errors import ValidationError
 from django.db import IntegrityError
 from django.utils.translation import gettext_lazy as _
 from django.shortcuts import aget_object_or_404
-from typing import List, Optional
+from django.utils.cache import patch_vary_headers
+from django.http import FileResponse, Http404, HttpResponseRedirect
+from typing import List, Literal, Optional
 from asgiref.sync import sync_to_async
 
 from users.api import AsyncHttpBearer
-from helpers import make_errors, image_is_valid
+from artists.models import Artist
+from albums.models import Album
+from helpers import make_errors, aimage_is_valid, aaudio_is_valid
+from pagination import CursorPagination
+from responsecache.cache import cache_response
+from responsecache.conditional import conditional
+from schemas import (
+    TrackArtists, TrackFilter, TrackFull, TrackSchemaIn,
+    AlbumSchema, ArtistSchema, TrackSchema, only_fields
+)
+from thumbnails.derivatives import agenerate_thumbnails, adelete_thumbnails
+from transcoding.models import Rendition, Package, package_storage
+from transcoding.negotiation import select_rendition
+from transcoding.queue import enqueue
+from transcoding.transcoders import DASH_MANIFEST, HLS_PLAYLIST
+from waveforms.peaks import (
+    WAVEFORM_LEVELS, CONTENT_TYPE as PEAKS_CONTENT_TYPE, adelete_peaks, peaks_name, peaks_storage
+)
+from .models import Track
+from .streaming import ranged_file_response
+from .metadata import ingest_metadata
 
 
-staff_auth = AsyncHttpBearer(is_staff=True)
-router = Router(tags=['Albums'], auth=staff_auth)
+staff_auth = AsyncHttpBearer(is_staff=True, stateless=True)
+router = Router(tags=['Tracks'], auth=staff_auth)
+
+PACKAGE_CONTENT_TYPES = {
+    '.mpd': 'application/dash+xml',
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.m4s': 'audio/mp4',
+    '.mp4': 'audio/mp4',
+}
+PACKAGE_FILENAME = re.compile(r'[\w-][\w.-]*')
+
+
+# Validators of the representations, see `responsecache.conditional`
+async def tracks_state(request, **kwargs):
+    tracks = await Track.objects.aaggregate(Max('updated_at'), Count('pk'))
+    artists = await Artist.objects.aaggregate(Max('updated_at'))
+    return (*tracks.values(), *artists.values())
+
+
+async def track_state(request, trackID: int):
+    state = await Track.objects.filter(pk=trackID).aaggregate(
+        Max('updated_at'), Max('album__updated_at'),
+        Max('album__artist__updated_at'), Max('artists__updated_at'))
+    return None if state['updated_at__max'] is None else tuple(state.values())
+
+
+def track_queryset():
+    """`TrackFull` is loaded with two queries, track joined with its album and artists"""
+    artists = Artist.objects.only(*only_fields(ArtistSchema))
+    return Track.objects.select_related('album', 'album__artist').only(
+        'album', 'album__artist', *only_fields(TrackSchema),
+        *only_fields(AlbumSchema, 'album__'), *only_fields(ArtistSchema, 'album__artist__')
+    ).prefetch_related(Prefetch('artists', queryset=artists))
+
+
+async def validate_track(data: TrackSchemaIn, file: Optional[UploadedFile],
+                         cover: Optional[UploadedFile]):
+    errors = []
+    if file and not await aaudio_is_valid(file):
+        errors.append(make_errors('file', _('File is not an audio file')))
+
+    if cover and not await aimage_is_valid(cover):
+        errors.append(make_errors('cover', _('File is not an image')))
+
+    if data.album_id is not None:
+        if not await Album.objects.filter(pk=data.album_id).aexists():
+            errors.append(make_errors('album_id', _('Album does not exist')))
+
+    # All artists are checked with a single query
+    artist_ids = set(data.artist_ids)
+    if artist_ids:
+        found = await Artist.objects.filter(pk__in=artist_ids).acount()
+        if found != len(artist_ids):
+            errors.append(make_errors('artist_ids', _('Artist does not exist')))
+
+    if errors:
+        raise ValidationError(errors)
+
+
+@router.post('', response={201: TrackFull})
+async def create_track(request, data: Form[TrackSchemaIn], file: UploadedFile = File(...),
+                       cover: UploadedFile = File(None)):
+    await validate_track(data, file, cover)
+    attrs = data.dict(exclude_unset=True)
+    artist_ids = attrs.pop('artist_ids', [])
+
+    attrs, artist_ids = await ingest_metadata(file, attrs, artist_ids)
+    if attrs.get('duration') is None:
+        raise ValidationError([
+            make_errors('duration', _('Duration could not be read from the file'))
+        ])
+
+    # Temporary upload is moved into storage, it is never read into memory
+    track = Track(file=file, cover=cover, **attrs)
+    await track.asave()
+    if artist_ids:
+        await track.artists.aset(artist_ids)
+    if track.cover:
+        await agenerate_thumbnails(track.cover)
+    await sync_to_async(enqueue)([track.pk])
+
+    return 201, await track_queryset().aget(pk=track.pk)
+
+
+@router.get('', response=List[TrackArtists], auth=None)
+@decorate_view(conditional(tracks_state, modified=False), cache_response)
+@paginate
+async def get_tracks(request, filters: Query[TrackFilter]):
+    qs = Track.objects.prefetch_related('artists')
+    return filters.filter(qs)
+
+
+@router.get('/cursor', response=List[TrackArtists], auth=None)
+@decorate_view(conditional(tracks_state, modified=False), cache_response)
+@paginate(CursorPagination, ordering='title')
+async def get_tracks_cursor(request, filters: Query[TrackFilter]):
+    qs = Track.objects.prefetch_related('artists')
+    return filters.filter(qs)
+
+
+@router.get('/{int:trackID}', response=TrackFull, auth=None)
+@decorate_view(conditional(track_state), cache_response)
+async def get_track(request, trackID: int):
+    return await aget_object_or_404(track_queryset(), pk=trackID)
+
+
+@router.put('/{int:trackID}', response=TrackFull)
+async def update_track(request, trackID: int, data: Form[TrackSchemaIn],
+                       file: UploadedFile = File(None), cover: UploadedFile = File(None)):
+    track = await aget_object_or_404(Track, pk=trackID)
+    await validate_track(data, file, cover)
+    attrs = data.dict(exclude_unset=True)
+    artist_ids = attrs.pop('artist_ids', None)
+
+    if file:
+        # Metadata of the old file does not describe the new one
+        attrs, tagged_ids = await ingest_metadata(file, attrs, artist_ids or [])
+        if attrs.get('duration') is None:
+            raise ValidationError([
+                make_errors('duration', _('Duration could not be read from the file'))
+            ])
+        if tagged_ids:
+            artist_ids = tagged_ids
+
+    for k, value in attrs.items():
+        setattr(track, k, value)
+
+    # Replace files
+    if file:
+        await adelete_peaks(track.file)
+        await sync_to_async(track.file.delete)(save=False)
+        await sync_to_async(track.file.save)(file.name, file, save=False)
+    if cover:
+        if track.cover:
+            await adelete_thumbnails(track.cover)
+            await sync_to_async(track.cover.delete)(save=False)
+        await sync_to_async(track.cover.save)(cover.name, cover, save=False)
+
+    await track.asave()
+    if artist_ids is not None:
+        await track.artists.aset(artist_ids)
+    if cover:
+        await agenerate_thumbnails(track.cover)
+    if file:
+        await sync_to_async(enqueue)([track.pk])
+
+    return await track_queryset().aget(pk=track.pk)
+
+
+@router.delete('/{int:trackID}', response={204: None})
+async def delete_track(request, trackID: int):
+    track = await aget_object_or_404(Track, pk=trackID)
+
+    if track.cover:
+        await adelete_thumbnails(track.cover)
+        await sync_to_async(track.cover.delete)(save=False)
+    await adelete_peaks(track.file)
+    await sync_to_async(track.file.delete)(save=False)
+
+    await track.adelete()
+    return 204, None
+
+
+@router.get('/{int:trackID}/stream', auth=None)
+async def stream_track(request, trackID: int,
+                       format: Optional[Literal['original', 'opus', 'aac', 'mp3']] = None,
+                       bitrate: int = Query(None, ge=1)):
+    """
+    Uploaded file or one of its renditions, picked by `format` and the
+    highest `bitrate` (kbps) allowed, or by the `Accept` header
+    """
+    track = await aget_object_or_404(Track, pk=trackID)
+    original_type, _ = mimetypes.guess_type(track.file.name)
+    renditions = [r async for r in Rendition.objects.filter(track=track)]
+    rendition = select_rendition(renditions, original_type,
+                                 request.headers.get('Accept'), format, bitrate)
+
+    if rendition is None:
+        response = await ranged_file_response(request, track.file)
+    else:
+        response = await ranged_file_response(
+            request, rendition.file, rendition.content_type)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+@router.get('/{int:trackID}/peaks', auth=None)
+async def get_peaks(request, trackID: int, samples_per_pixel: int = None):
+    """
+    Waveform peaks in audiowaveform's binary format, the finest zoom level
+    unless `samples_per_pixel` asks for another one
+    """
+    if samples_per_pixel is None:
+        samples_per_pixel = WAVEFORM_LEVELS[0]
+    elif samples_per_pixel not in WAVEFORM_LEVELS:
+        raise ValidationError([make_errors(
+            'samples_per_pixel', _('Available levels are %s') % WAVEFORM_LEVELS)])
+
+    track = await aget_object_or_404(Track.objects.only('file'), pk=trackID)
+    storage, name = peaks_storage(), peaks_name(track.file.name, samples_per_pixel)
+    try:
+        fp = await sync_to_async(storage.open, thread_sensitive=False)(name, 'rb')
+    except FileNotFoundError:
+        raise Http404(_('Peaks of the track are not computed yet'))
+    # The open file is handed to the server, which can send it with sendfile()
+    return FileResponse(fp, content_type=PEAKS_CONTENT_TYPE)
+
+
+async def package_redirect(trackID: int, entry: str):
+    package = await Package.objects.filter(track_id=trackID).only('key').afirst()
+    if package is None:
+        raise Http404(_('Track is not packaged'))
+    # Relative to the track, so segments resolve within the package
+    response = HttpResponseRedirect(f'packages/{package.key}/{entry}')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@router.get('/{int:trackID}/manifest.mpd', auth=None)
+async def get_dash_manifest(request, trackID: int):
+    """DASH manifest of long tracks split into segments"""
+    return await package_redirect(trackID, DASH_MANIFEST)
+
+
+@router.get('/{int:trackID}/master.m3u8', auth=None)
+async def get_hls_playlist(request, trackID: int):
+    """HLS master playlist of long tracks split into segments"""
+    return await package_redirect(trackID, HLS_PLAYLIST)
+
+
+@router.get('/{int:trackID}/packages/{uuid:key}/{name}', auth=None)
+async def get_package_file(request, trackID: int, key: UUID, name: str):
+    """Manifests, playlists and segments, cacheable forever"""
+    content_type = PACKAGE_CONTENT_TYPES.get(os.path.splitext(name)[1])
+    if content_type is None or not PACKAGE_FILENAME.fullmatch(name):
+        raise Http404()
+    package = await aget_object_or_404(
+        Package.objects.only('key'), track_id=trackID, key=key)
+
+    try:
+        fp = await sync_to_async(package_storage().open, thread_sensitive=False)(
+            f'{package.prefix}/{name}', 'rb')
+    except FileNotFoundError:
+        raise Http404()
+    response = FileResponse(fp, content_type=content_type)
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
@@ -0,0 +1,130 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from artists.models import Artist
+from albums.models import Album
+from tracks.models import Track
+
+
+GENRES = ['Rock', 'Pop', 'Jazz', 'Blues', 'Soul', 'Funk', 'Metal', 'Folk',
+          'Country', 'Reggae', 'Punk', 'Disco', 'Techno', 'House', 'Ambient']
+WORDS = ['Blue', 'Night', 'Piano', 'Man', 'River', 'Stone', 'Fire', 'Dream',
+         'Road', 'Heart', 'Light', 'City', 'Rain', 'Sun', 'Love', 'Ghost']
+
+
+class Command(BaseCommand):
+    help = ('Seed the catalogue and compare query plans of the filters with '
+            'and without indexes. Everything is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--artists', type=int, default=2000)
+        parser.add_argument('--albums', type=int, default=5, help='Albums per artist')
+        parser.add_argument('--tracks', type=int, default=10, help='Tracks per album')
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, artists, albums, tracks, repeat, **options):
+        # Databases which commit DDL implicitly would lose the indexes for good
+        if not connection.features.can_rollback_ddl:
+            raise CommandError(
+                f'{connection.vendor} can not roll back dropped indexes, '
+                f'benchmark on SQLite or PostgreSQL')
+
+        with transaction.atomic():
+            self.seed(artists, albums, tracks)
+            self.analyze()
+            indexed = self.run_queries(repeat)
+            self.drop_indexes()
+            self.analyze()
+            plain = self.run_queries(repeat)
+            transaction.set_rollback(True)
+
+        for label, (plan, duration) in indexed.items():
+            plain_plan, plain_duration = plain[label]
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(f'  without indexes {plain_duration * 1000:8.2f} ms')
+            self.stdout.write(self.indent(plain_plan))
+            self.stdout.write(f'  with indexes    {duration * 1000:8.2f} ms')
+            self.stdout.write(self.indent(plan))
+
+    def indent(self, plan: str):
+        return '\n'.join(f'    {line}' for line in plan.splitlines())
+
+    def seed(self, artists: int, albums: int, tracks: int):
+        rng = random.Random(42)
+
+        def name():
+            return ' '.join(rng.sample(WORDS, 3))
+
+        Artist.objects.bulk_create(
+            [Artist(name=f'{name()} {i}') for i in range(artists)], batch_size=1000)
+        artist_ids = Artist.objects.values_list('pk', flat=True)
+        Album.objects.bulk_create([
+            Album(artist_id=artist_id, name=f'{name()} {i}',
+                  year=rng.randint(1950, 2024), genre=rng.choice(GENRES))
+            for artist_id in artist_ids for i in range(albums)
+        ], batch_size=1000)
+
+        batch = []
+        for album_id, year, genre in Album.objects.values_list('pk', 'year', 'genre').iterator():
+            batch.extend(
+                Track(file='tracks/seed.wav', title=name(), album_id=album_id,
+                      number=number, year=year, genre=genre,
+                      duration=timedelta(seconds=rng.randint(90, 600)))
+                for number in range(1, tracks + 1)
+            )
+            if len(batch) >= 5000:
+                Track.objects.bulk_create(batch)
+                batch = []
+        Track.objects.bulk_create(batch)
+
+    def analyze(self):
+        if connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def queries(self):
+        artist_id = Artist.objects.values_list('pk', flat=True).last()
+        album_id = Album.objects.values_list('pk', flat=True).last()
+        return {
+            'Album year': Album.objects.filter(year=1973),
+            'Album genre': Album.objects.filter(genre='Jazz'),
+            'Albums of artist by year': Album.objects.filter(
+                artist_id=artist_id).order_by('year'),
+            'Album name icontains': Album.objects.filter(name__icontains='river sto'),
+            'Artist name icontains': Artist.objects.filter(name__icontains='piano m'),
+            'Track year': Track.objects.filter(year=1973),
+            'Tracks of album': Track.objects.filter(album_id=album_id).order_by('number'),
+            'Track title icontains': Track.objects.filter(title__icontains='ghost ro'),
+        }
+
+    def run_queries(self, repeat: int):
+        results = {}
+        for label, qs in self.queries().items():
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(qs.all())
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = (qs.explain(), best)
+        return results
+
+    def drop_indexes(self):
+        # Used outside of its context manager, so DDL stays in the transaction
+        editor = connection.schema_editor()
+        names = [(model._meta.db_table, index.name)
+                 for model in (Album, Track) for index in model._meta.indexes]
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT tablename, indexname FROM pg_indexes WHERE indexname LIKE '%%_trgm'")
+                names.extend(cursor.fetchall())
+
+        for table, name in names:
+            editor.execute(editor.sql_delete_index % {
+                'table': editor.quote_name(table), 'name': editor.quote_name(name)})
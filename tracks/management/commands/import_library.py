@@ -0,0 +1,276 @@
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+import django
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from artists.models import Artist
+from albums.models import Album, update_album_counts
+from blobs.models import Blob
+from tracks.models import Track, update_track_counts
+from tracks.metadata import read_metadata, title_from_filename
+from search.backends import get_backend
+from counters import touch
+from responsecache.cache import response_cache
+from transcoding.queue import enqueue
+
+
+AUDIO_EXTENSIONS = {
+    '.mp3', '.flac', '.ogg', '.oga', '.opus', '.m4a', '.mp4',
+    '.aac', '.wav', '.aif', '.aiff', '.wma', '.ape', '.wv',
+}
+
+
+def scan(root: str):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in AUDIO_EXTENSIONS:
+                yield os.path.join(dirpath, filename)
+
+
+def parse(path: str, digest: bool = False):
+    """Runs in worker processes, must not touch the database"""
+    meta = read_metadata(path)
+    sha256 = None
+    if meta is not None and digest:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(partial(f.read, 1024 * 1024), b''):
+                hasher.update(chunk)
+        sha256 = hasher.hexdigest()
+    return path, meta, sha256
+
+
+class MovableFile(File):
+    """Lets storage move the file into place instead of copying it"""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class Command(BaseCommand):
+    help = 'Import audio files from the directory tree into the catalogue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of processes parsing the files')
+        parser.add_argument('--move', action='store_true',
+                            help='Move files into storage instead of copying them')
+
+    def handle(self, directory, batch_size, workers, move, **options):
+        if not os.path.isdir(directory):
+            raise CommandError(f"'{directory}' is not a directory")
+
+        self.move = move
+        self.imported = self.skipped = self.existing = 0
+        self.digests = set()
+        # Names are resolved in memory, so batches do not query them one by one
+        self.artists = dict(Artist.objects.values_list('name', 'id'))
+        self.albums = {
+            (artist_id, name): pk for pk, artist_id, name
+            in Album.objects.values_list('id', 'artist_id', 'name')
+        }
+
+        # Content addressed storage can reuse digests computed by workers
+        task = partial(parse, digest=hasattr(default_storage, 'digest'))
+        start = time.monotonic()
+        paths = scan(directory)
+        if workers > 1:
+            with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+                results = self.parse_chunks(
+                    pool, task, paths, batch_size, max(1, batch_size // (workers * 4)))
+                self.process(results, batch_size)
+        else:
+            self.process(map(task, paths), batch_size)
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} tracks, skipped {self.skipped} files, '
+            f'{self.existing} already imported in {elapsed:.1f}s'))
+
+    def parse_chunks(self, pool, task, paths, size: int, chunksize: int):
+        """
+        Results of parsing the paths, in their order. Paths are submitted in chunks,
+        the next one is parsed while results of the previous are stored, so
+        at most two chunks are held in memory.
+        """
+        previous = None
+        for chunk in iter(lambda: list(islice(paths, size)), []):
+            current = pool.map(task, chunk, chunksize=chunksize)
+            if previous is not None:
+                yield from previous
+            previous = current
+        if previous is not None:
+            yield from previous
+
+    def process(self, results, batch_size: int):
+        batch = []
+        for path, meta, sha256 in results:
+            if meta is None or meta.duration is None:
+                self.skipped += 1
+                self.stderr.write(f'Skipped {path}: no audio metadata')
+                continue
+            batch.append((path, meta, sha256))
+            if len(batch) >= batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+
+    def resolve_artists(self, batch):
+        names = set()
+        for _, meta, _ in batch:
+            names.update(meta.artists)
+            if meta.album_artist:
+                names.add(meta.album_artist)
+        missing = names - self.artists.keys()
+        if missing:
+            Artist.objects.bulk_create(
+                [Artist(name=name) for name in missing], ignore_conflicts=True)
+            rows = list(Artist.objects.filter(name__in=missing).values_list('id', 'name'))
+            self.artists.update((name, pk) for pk, name in rows)
+            get_backend().index('artist', rows)
+
+    def resolve_albums(self, batch):
+        missing = {}
+        for _, meta, _ in batch:
+            key = self.album_key(meta)
+            if key and key not in self.albums:
+                missing[key] = Album(artist_id=key[0], name=key[1],
+                                     year=meta.year, genre=meta.genre)
+        if missing:
+            Album.objects.bulk_create(missing.values(), ignore_conflicts=True)
+            qs = Album.objects.filter(
+                artist_id__in={k[0] for k in missing},
+                name__in={k[1] for k in missing}
+            ).values_list('id', 'artist_id', 'name')
+            rows = []
+            for pk, artist_id, name in qs:
+                if (artist_id, name) in missing:
+                    self.albums[(artist_id, name)] = pk
+                    rows.append((pk, name))
+            get_backend().index('album', rows)
+            update_album_counts({key[0] for key in missing})
+            touch(Artist, {key[0] for key in missing})
+
+    def album_key(self, meta):
+        owner = meta.album_artist or (meta.artists[0] if meta.artists else None)
+        if not meta.album or not owner:
+            return None
+        return self.artists[owner], meta.album
+
+    def store(self, path: str, sha256):
+        field = Track._meta.get_field('file')
+        name = field.generate_filename(None, os.path.basename(path))
+        with open(path, 'rb') as f:
+            content = MovableFile(f) if self.move else File(f)
+            if sha256:
+                content.sha256 = sha256
+            return default_storage.save(name, content, max_length=field.max_length)
+
+    def already_imported(self, batch):
+        """
+        Paths of the batch whose tracks exist, found by digests of their
+        content or, without content addressing, by the paths tracks were
+        imported from. Sources found by digest are returned in the second
+        set, their content is surely stored.
+        """
+        if hasattr(default_storage, 'digest'):
+            blobs = dict(Blob.objects.filter(
+                digest__in={sha256 for _, _, sha256 in batch}).values_list('digest', 'name'))
+            used = set(Track.objects.filter(file__in=blobs.values()).values_list('file', flat=True))
+            found = set()
+            for path, _, sha256 in batch:
+                # Copies within the library are imported once as well
+                if blobs.get(sha256) in used or sha256 in self.digests:
+                    found.add(path)
+                self.digests.add(sha256)
+            return found, found
+
+        sources = {os.path.abspath(path): path for path, _, _ in batch}
+        found = Track.objects.filter(source__in=sources).values_list('source', flat=True)
+        return {sources[source] for source in found}, set()
+
+    def discard(self, stored):
+        """Undo storing files of a batch which was rolled back"""
+        # Blobs which existed before the batch still have their rows
+        kept = set(Blob.objects.filter(name__in=[name for _, name in stored]).values_list(
+            'name', flat=True))
+        for path, name in stored:
+            if name in kept:
+                continue
+            if self.move:
+                file_move_safe(default_storage.path(name), path)
+            else:
+                default_storage.delete(name)
+            kept.add(name)
+
+    def flush(self, batch):
+        found, duplicates = self.already_imported(batch)
+        if self.move:
+            for path in duplicates:
+                os.remove(path)
+        self.existing += len(found)
+        batch = [item for item in batch if item[0] not in found]
+        if not batch:
+            return
+
+        self.resolve_artists(batch)
+        self.resolve_albums(batch)
+
+        stored = []
+        Through = Track.artists.through
+        try:
+            with transaction.atomic():
+                tracks, artist_ids = [], []
+                for path, meta, sha256 in batch:
+                    name = self.store(path, sha256)
+                    stored.append((path, name))
+                    key = self.album_key(meta)
+                    tracks.append(Track(
+                        file=name,
+                        source=os.path.abspath(path),
+                        title=meta.title or title_from_filename(path),
+                        duration=meta.duration,
+                        genre=meta.genre,
+                        number=meta.number or 1,
+                        year=meta.year or 1,
+                        album_id=self.albums.get(key) if key else None,
+                    ))
+                    names = meta.artists or ([meta.album_artist] if meta.album_artist else [])
+                    artist_ids.append({self.artists[name] for name in names})
+
+                Track.objects.bulk_create(tracks)
+                Through.objects.bulk_create([
+                    Through(track_id=track.pk, artist_id=artist_id)
+                    for track, ids in zip(tracks, artist_ids) for artist_id in ids
+                ])
+                album_ids = {track.album_id for track in tracks}
+                update_track_counts(album_ids)
+                touch(Album, album_ids)
+                get_backend().index_objects(tracks)
+                response_cache.invalidate()
+                enqueue(track.pk for track in tracks)
+        except BaseException:
+            self.discard(stored)
+            raise
+
+        if self.move:
+            # Content which was stored already is not moved by the storage
+            for path, _ in stored:
+                if os.path.exists(path):
+                    os.remove(path)
+
+        self.imported += len(tracks)
+        self.stdout.write(f'{self.imported} tracks imported')
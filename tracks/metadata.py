@@ -0,0 +1,174 @@
+import os
+import re
+from datetime import timedelta
+from typing import List, Optional
+import mutagen
+from mutagen.id3 import ID3
+from mutagen.mp4 import MP4Tags
+from asgiref.sync import sync_to_async
+from django.core.files.uploadedfile import UploadedFile
+
+from artists.models import Artist
+from albums.models import Album
+from search.backends import get_backend
+from responsecache.cache import response_cache
+
+
+# Frame and atom names of the tags we are interested in
+ID3_FRAMES = {
+    'title': 'TIT2', 'artist': 'TPE1', 'albumartist': 'TPE2',
+    'album': 'TALB', 'genre': 'TCON', 'tracknumber': 'TRCK', 'date': 'TDRC',
+}
+MP4_ATOMS = {
+    'title': '\xa9nam', 'artist': '\xa9ART', 'albumartist': 'aART',
+    'album': '\xa9alb', 'genre': '\xa9gen', 'tracknumber': 'trkn', 'date': '\xa9day',
+}
+
+
+class AudioMetadata:
+    """Track attributes read from container headers and tags"""
+
+    def __init__(self, title=None, artists=None, album_artist=None, album=None,
+                 genre=None, number=None, year=None, duration=None):
+        self.title: Optional[str] = title
+        self.artists: List[str] = artists or []
+        self.album_artist: Optional[str] = album_artist
+        self.album: Optional[str] = album
+        self.genre: Optional[str] = genre
+        self.number: Optional[int] = number
+        self.year: Optional[int] = year
+        self.duration: Optional[timedelta] = duration
+
+
+def _values(tags, key: str) -> List[str]:
+    if tags is None:
+        return []
+
+    if isinstance(tags, ID3):
+        values = []
+        for frame in tags.getall(ID3_FRAMES[key]):
+            if key == 'genre':
+                values.extend(frame.genres)
+            else:
+                values.extend(str(text) for text in frame.text)
+    elif isinstance(tags, MP4Tags):
+        values = tags.get(MP4_ATOMS[key], [])
+        if key == 'tracknumber':
+            # Stored as (number, total) pairs
+            values = [str(v[0]) for v in values]
+    else:
+        # Vorbis comments (FLAC, Ogg, Opus) and APEv2 tags
+        values = tags.get(key) or tags.get(key.upper()) or []
+        values = [str(v) for v in values]
+
+    return [v.strip() for v in values if v and str(v).strip()]
+
+
+def _first(tags, key: str) -> Optional[str]:
+    values = _values(tags, key)
+    return values[0] if values else None
+
+
+def _number(value: Optional[str]) -> Optional[int]:
+    match = re.match(r'\s*(\d+)', value or '')
+    return int(match.group(1)) if match else None
+
+
+def read_metadata(file) -> Optional[AudioMetadata]:
+    """
+    Read tags and duration of the audio file. Mutagen parses only container
+    headers (ID3, Vorbis comments, MP4 atoms, FLAC STREAMINFO) and seeks to
+    the tail when needed, audio data is never decoded. Returns `None` when
+    the format is not recognized.
+    """
+    if isinstance(file, UploadedFile) and hasattr(file, 'temporary_file_path'):
+        file = file.temporary_file_path()
+    elif hasattr(file, 'seek'):
+        file.seek(0)
+
+    try:
+        audio = mutagen.File(file)
+    except mutagen.MutagenError:
+        return None
+    finally:
+        if hasattr(file, 'seek'):
+            file.seek(0)
+    if audio is None:
+        return None
+
+    tags = audio.tags
+    length = getattr(audio.info, 'length', None)
+    year = _number(_first(tags, 'date'))
+    number = _number(_first(tags, 'tracknumber'))
+    title = _first(tags, 'title')
+    genre = _first(tags, 'genre')
+
+    return AudioMetadata(
+        title=title[:200] if title else None,
+        artists=[name[:200] for name in _values(tags, 'artist')],
+        album_artist=(_first(tags, 'albumartist') or '')[:200] or None,
+        album=(_first(tags, 'album') or '')[:200] or None,
+        genre=genre[:50] if genre else None,
+        number=number if number and number >= 1 else None,
+        year=year,
+        duration=timedelta(seconds=length) if length else None,
+    )
+
+
+async def aread_metadata(file) -> Optional[AudioMetadata]:
+    return await sync_to_async(read_metadata, thread_sensitive=False)(file)
+
+
+def title_from_filename(name: str) -> str:
+    return os.path.splitext(os.path.basename(name))[0][:200]
+
+
+async def resolve_artists(names: List[str]) -> List[Artist]:
+    """Find artists by their names, missing ones are created"""
+    names = list(dict.fromkeys(names))
+    found = {a.name: a async for a in Artist.objects.filter(name__in=names)}
+    missing = [Artist(name=name) for name in names if name not in found]
+    if missing:
+        await Artist.objects.abulk_create(missing, ignore_conflicts=True)
+        created = [a async for a in Artist.objects.filter(
+            name__in=[m.name for m in missing])]
+        found.update({a.name: a for a in created})
+        # Bulk inserts are not indexed by signals
+        await sync_to_async(get_backend().index_objects)(created)
+        await sync_to_async(response_cache.invalidate)()
+    return [found[name] for name in names if name in found]
+
+
+async def resolve_album(name: str, artist: Artist, meta: AudioMetadata) -> Album:
+    album, _ = await Album.objects.aget_or_create(
+        artist=artist, name=name,
+        defaults={'year': meta.year, 'genre': meta.genre}
+    )
+    return album
+
+
+async def ingest_metadata(file, attrs: dict, artist_ids: List[int]):
+    """
+    Complete track attributes which were not provided by the client with
+    metadata of the file, artists and album from tags are linked or created.
+    Tracks without duration are rejected, so nothing is created for them.
+    """
+    meta = await aread_metadata(file) or AudioMetadata()
+    for field in ['title', 'genre', 'number', 'year', 'duration']:
+        value = getattr(meta, field)
+        if attrs.get(field) is None and value is not None:
+            attrs[field] = value
+    if not attrs.get('title'):
+        attrs['title'] = title_from_filename(file.name)
+    if attrs.get('duration') is None:
+        return attrs, artist_ids
+
+    if not artist_ids and meta.artists:
+        artist_ids = [a.pk for a in await resolve_artists(meta.artists)]
+
+    owner = meta.album_artist or (meta.artists[0] if meta.artists else None)
+    if attrs.get('album_id') is None and meta.album and owner:
+        artist, = await resolve_artists([owner])
+        attrs['album_id'] = (await resolve_album(meta.album, artist, meta)).pk
+
+    return attrs, artist_ids
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:05
+
+from django.db import migrations, models
+
+from indexes import TrigramIndex
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('albums', '0002_indexes'),
+        ('artists', '0001_initial'),
+        ('tracks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['year'], name='track_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['genre'], name='track_genre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['album', 'number'], name='track_album_number_idx'),
+        ),
+        # PostgreSQL only, used by icontains filters
+        TrigramIndex(model_name='track', field='title', name='track_title_trgm'),
+        TrigramIndex(model_name='track', field='genre', name='track_genre_trgm'),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0004_track_cover_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='source',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=1024),
+        ),
+    ]
@@ -1,9 +1,12 @@
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction, router
+from django.db.models.signals import pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
 
 from artists.models import Artist
 from albums.models import Album
+from counters import increment, recount, touch
 
 
 class Track(models.Model):
@@ -21,6 +24,86 @@ class Track(models.Model):
                               on_delete=models.SET_NULL)
     # For singles only
     cover = models.ImageField(upload_to='tracks', null=True, blank=True)
+    # Sizes of generated thumbnails, see `thumbnails.derivatives`
+    cover_thumbnails = models.JSONField(default=list, blank=True, editable=False)
+    # Also bumped when related records change
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Absolute path of the file the track was imported from, see
+    # `import_library`
+    source = models.CharField(max_length=1024, blank=True, default='',
+                              editable=False, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['year'], name='track_year_idx'),
+            models.Index(fields=['genre'], name='track_genre_idx'),
+            # Tracks of the album in their order
+            models.Index(fields=['album', 'number'], name='track_album_number_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        track = super().from_db(db, field_names, values)
+        # Album the track is moved from when saved
+        track._loaded_album_id = track.__dict__.get('album_id')
+        return track
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        previous = getattr(self, '_loaded_album_id', None)
+        update_fields = kwargs.get('update_fields')
+        moved = previous != self.album_id and (
+            update_fields is None or 'album' in update_fields)
+        using = kwargs.get('using') or router.db_for_write(Track, instance=self)
+
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            if adding:
+                increment(Album, 'track_count', self.album_id)
+            elif moved:
+                increment(Album, 'track_count', previous, -1)
+                increment(Album, 'track_count', self.album_id)
+            touch(Album, [self.album_id, previous if moved else None])
+        self._loaded_album_id = self.album_id
+
+
+@receiver(post_delete, sender=Track)
+def decrement_track_count(sender, instance, **kwargs):
+    increment(Album, 'track_count', instance.album_id, -1)
+    touch(Album, [instance.album_id])
+
+
+def update_track_counts(album_ids=None):
+    """Recount tracks of the albums, of all albums when no ids are given"""
+    return recount(Album, 'track_count', Track, 'album', album_ids)
+
+
+@receiver(m2m_changed, sender=Track.artists.through)
+def touch_tracks_of_artists(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # Tracks were added to or removed from the artist
+        track_ids = pk_set or set()
+    else:
+        track_ids = {instance.pk}
+    touch(Track, track_ids)
+    touch(Album, Track.objects.filter(pk__in=track_ids).values_list('album_id', flat=True))
+
+
+@receiver(pre_delete, sender=Artist)
+def touch_tracks_of_deleted_artist(sender, instance, **kwargs):
+    # Cascade removes the links without sending m2m_changed
+    track_ids = set(Track.artists.through.objects.filter(
+        artist_id=instance.pk).values_list('track_id', flat=True))
+    touch(Track, track_ids)
+    touch(Album, Track.objects.filter(pk__in=track_ids).values_list('album_id', flat=True))
+
+
+@receiver(pre_delete, sender=Album)
+def touch_tracks_of_deleted_album(sender, instance, **kwargs):
+    # Tracks are detached by SET_NULL, which bypasses save()
+    touch(Track, Track.objects.filter(album_id=instance.pk).values_list('pk', flat=True))
@@ -0,0 +1,140 @@
+import mimetypes
+from typing import Optional, Tuple
+from asgiref.sync import sync_to_async
+from django.db.models.fields.files import FieldFile
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+
+# Size of a single chunk sent to the client, memory used by one connection
+# does not depend on the size of the file
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse value of `Range` header and return inclusive (start, end) byte
+    positions. `None` means that whole file should be sent, which is also
+    the case for malformed and multipart ranges.
+    """
+    if not header:
+        return None
+
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+
+    first, sep, last = spec.strip().partition('-')
+    if not sep:
+        return None
+
+    try:
+        if not first:
+            # Suffix range, e.g. `bytes=-500`
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def make_etag(size: int, mtime: float) -> str:
+    return f'"{int(mtime):x}-{size:x}"'
+
+
+def if_range_matches(header: Optional[str], etag: str, mtime: float) -> bool:
+    """Check whether representation did not change since client cached it"""
+    if not header:
+        return True
+
+    header = header.strip()
+    if header.startswith('"'):
+        return header == etag
+    if header.startswith('W/'):
+        # Weak validators can not be used with If-Range
+        return False
+
+    timestamp = parse_http_date_safe(header)
+    return timestamp is not None and timestamp == int(mtime)
+
+
+async def file_iterator(file: FieldFile, start: int, length: int,
+                        chunk_size: int = CHUNK_SIZE):
+    """Yield `length` bytes of the file starting at `start` offset"""
+    # Disk access happens in worker threads, so it does not stall the loop
+    fp = await sync_to_async(file.storage.open, thread_sensitive=False)(
+        file.name, 'rb')
+    try:
+        await sync_to_async(fp.seek, thread_sensitive=False)(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await sync_to_async(fp.read, thread_sensitive=False)(
+                min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await sync_to_async(fp.close, thread_sensitive=False)()
+
+
+def _stat(file: FieldFile):
+    storage = file.storage
+    return storage.size(file.name), storage.get_modified_time(file.name)
+
+
+async def ranged_file_response(request: HttpRequest, file: FieldFile,
+                               content_type: Optional[str] = None):
+    """Stream the file honoring `Range` and `If-Range` request headers"""
+    size, modified = await sync_to_async(_stat, thread_sensitive=False)(file)
+    mtime = modified.timestamp()
+    etag = make_etag(size, mtime)
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': http_date(mtime),
+    }
+
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    except RangeNotSatisfiable:
+        headers['Content-Range'] = f'bytes */{size}'
+        return HttpResponse(status=416, headers=headers)
+
+    if byte_range and not if_range_matches(
+            request.headers.get('If-Range'), etag, mtime):
+        byte_range = None
+
+    if byte_range:
+        start, end = byte_range
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        start, end = 0, size - 1
+        status = 200
+
+    length = end - start + 1
+    headers['Content-Length'] = str(length)
+    if content_type is None:
+        content_type, _ = mimetypes.guess_type(file.name)
+
+    return StreamingHttpResponse(
+        file_iterator(file, start, length),
+        status=status,
+        content_type=content_type or 'application/octet-stream',
+        headers=headers,
+    )
@@ -0,0 +1,146 @@
+import io
+import os
+import tempfile
+from unittest import mock
+from django.core.management import CommandError, call_command
+from django.db import connection
+from mutagen.wave import WAVE
+from mutagen.id3 import TIT2, TPE1, TPE2, TALB, TRCK
+
+from helpers import TestHelper, plain_storage
+
+from tracks.models import Track
+from albums.models import Album
+from artists.models import Artist
+from blobs.models import Blob
+from search.backends import get_backend
+
+
+class TestImportLibrary(TestHelper):
+    def write_track(self, directory, name, **frames):
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(self.audio_file(seconds=2).read())
+        audio = WAVE(path)
+        audio.add_tags()
+        for frame in frames.values():
+            audio.tags.add(frame)
+        audio.save()
+        return path
+
+    def test_library_is_imported_in_batches(self):
+        Artist.objects.create(name='Billy Joel')
+        with tempfile.TemporaryDirectory() as library, tempfile.TemporaryDirectory() as td, \
+                self.settings(MEDIA_ROOT=td):
+            for number, title in enumerate(['Travelin\' Prayer', 'Piano Man'], 1):
+                self.write_track(
+                    library, f'Billy Joel/Piano Man/{number}.wav',
+                    title=TIT2(text=title), artist=TPE1(text=['Billy Joel', 'Ray Charles']),
+                    album_artist=TPE2(text='Billy Joel'), album=TALB(text='Piano Man'),
+                    number=TRCK(text=str(number)))
+            self.write_track(library, 'loose/untitled.wav')
+            with open(os.path.join(library, 'cover.jpg'), 'wb') as f:
+                f.write(self.image_file().read())
+            with open(os.path.join(library, 'broken.mp3'), 'wb') as f:
+                f.write(b'not audio')
+
+            out, err = io.StringIO(), io.StringIO()
+            call_command('import_library', library, batch_size=2, workers=2,
+                         stdout=out, stderr=err)
+
+            tracks = Track.objects.order_by('title')
+            self.assertEqual(tracks.count(), 3)
+            self.assertEqual(Artist.objects.count(), 2)
+            self.assertEqual(Album.objects.get().artist.name, 'Billy Joel')
+            self.assertEqual(tracks[0].title, 'Piano Man')
+            self.assertEqual(tracks[0].number, 2)
+            self.assertEqual(tracks[0].artists.count(), 2)
+            self.assertEqual(tracks[2].title, 'untitled')
+            self.assertIsNone(tracks[2].album)
+            self.assertTrue(self.fileExists(td, tracks[0].file.name))
+            self.assertIn('broken.mp3', err.getvalue())
+            self.assertIn('Imported 3 tracks, skipped 1 files', out.getvalue())
+            self.assertEqual(
+                {r['kind'] for r in get_backend().search('piano man')}, {'album', 'track'})
+
+    def test_files_can_be_moved_into_storage(self):
+        with tempfile.TemporaryDirectory() as library, tempfile.TemporaryDirectory() as td, \
+                self.settings(MEDIA_ROOT=td):
+            path = self.write_track(library, 'song.wav', title=TIT2(text='Piano Man'))
+
+            call_command('import_library', library, workers=1, move=True,
+                         stdout=io.StringIO())
+
+            track = Track.objects.get()
+            self.assertFalse(os.path.exists(path))
+            self.assertTrue(self.fileExists(td, track.file.name))
+
+    def test_imported_files_are_skipped(self):
+        with tempfile.TemporaryDirectory() as library, tempfile.TemporaryDirectory() as td, \
+                self.settings(MEDIA_ROOT=td):
+            self.write_track(library, 'song.wav', title=TIT2(text='Piano Man'))
+            call_command('import_library', library, workers=1, stdout=io.StringIO())
+            copy = self.write_track(library, 'copy/song.wav', title=TIT2(text='Piano Man'))
+
+            out = io.StringIO()
+            call_command('import_library', library, workers=1, move=True, stdout=out)
+
+            self.assertEqual(Track.objects.count(), 1)
+            self.assertEqual(Blob.objects.get().references, 1)
+            self.assertIn('Imported 0 tracks, skipped 0 files, 2 already imported', out.getvalue())
+            # Content of moved duplicates is stored already
+            self.assertFalse(os.path.exists(copy))
+
+    @plain_storage
+    def test_imported_sources_are_skipped_without_content_addressing(self):
+        with tempfile.TemporaryDirectory() as library, tempfile.TemporaryDirectory() as td, \
+                self.settings(MEDIA_ROOT=td):
+            # Same names and sizes, the second one is renamed in storage
+            for album in ['Piano Man', 'Glass Houses']:
+                self.write_track(library, f'{album}/01.wav', title=TIT2(text='Intro'))
+            call_command('import_library', library, workers=1, stdout=io.StringIO())
+
+            out = io.StringIO()
+            call_command('import_library', library, workers=1, stdout=out)
+
+            self.assertEqual(Track.objects.count(), 2)
+            self.assertIn('Imported 0 tracks, skipped 0 files, 2 already imported', out.getvalue())
+
+    def test_stored_files_are_discarded_with_failed_batch(self):
+        with tempfile.TemporaryDirectory() as library, tempfile.TemporaryDirectory() as td, \
+                self.settings(MEDIA_ROOT=td):
+            path = self.write_track(library, 'song.wav', title=TIT2(text='Piano Man'))
+
+            with mock.patch('tracks.management.commands.import_library.enqueue',
+                            side_effect=RuntimeError), self.assertRaises(RuntimeError):
+                call_command('import_library', library, workers=1, move=True,
+                             stdout=io.StringIO())
+
+            self.assertFalse(Track.objects.exists())
+            self.assertFalse(Blob.objects.exists())
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual([files for _, _, files in os.walk(td) if files], [])
+
+
+class TestBenchmarkIndexes(TestHelper):
+    def test_plans_are_compared_and_data_rolled_back(self):
+        out = io.StringIO()
+
+        call_command('benchmark_indexes', artists=20, albums=2, tracks=3,
+                     repeat=1, stdout=out)
+
+        self.assertIn('Tracks of album', out.getvalue())
+        self.assertIn('track_album_number_idx', out.getvalue())
+        self.assertFalse(Track.objects.exists())
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Track._meta.db_table)
+        self.assertIn('track_album_number_idx', constraints)
+
+    def test_databases_without_transactional_ddl_are_refused(self):
+        with mock.patch.object(connection.features, 'can_rollback_ddl', False), \
+                self.assertRaises(CommandError):
+            call_command('benchmark_indexes', artists=1, stdout=io.StringIO())
+
+        self.assertFalse(Artist.objects.exists())
@@ -0,0 +1,286 @@
+import os
+import tempfile
+from datetime import timedelta
+from mutagen.wave import WAVE
+from mutagen.id3 import TIT2, TPE1, TPE2, TALB, TRCK, TDRC
+from ninja.testing import TestAsyncClient
+
+from helpers import TestHelper, plain_storage
+
+from tracks.api import router
+from tracks.models import Track
+from albums.models import Album
+from artists.models import Artist
+from transcoding.models import Rendition
+
+
+class TestStream(TestHelper):
+    DATA = bytes(range(256)) * 1024
+
+    async def create_track(self):
+        return await Track.objects.acreate(
+            file=self.content_file(self.DATA, 'song.flac'), title='Piano Man',
+            duration=timedelta(seconds=200)
+        )
+
+    async def read(self, response):
+        return b"".join([chunk async for chunk in response.streaming_content])
+
+    async def test_guest_can_stream_whole_track(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            track = await self.create_track()
+
+            response = await self.async_client.get(
+                f'/api/tracks/{track.pk}/stream')
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Accept-Ranges'], 'bytes')
+            self.assertEqual(response['Content-Length'], str(len(self.DATA)))
+            self.assertEqual(await self.read(response), self.DATA)
+
+    async def test_guest_can_request_byte_range(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            track = await self.create_track()
+            url = f'/api/tracks/{track.pk}/stream'
+
+            response = await self.async_client.get(
+                url, headers={'Range': 'bytes=1000-1999'})
+            response2 = await self.async_client.get(
+                url, headers={'Range': 'bytes=-100'})
+
+            size = len(self.DATA)
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{size}')
+            self.assertEqual(await self.read(response), self.DATA[1000:2000])
+            self.assertEqual(response2.status_code, 206)
+            self.assertEqual(await self.read(response2), self.DATA[-100:])
+
+    async def test_range_is_ignored_when_file_has_changed(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            track = await self.create_track()
+            headers = {'Range': 'bytes=0-9', 'If-Range': '"outdated"'}
+
+            response = await self.async_client.get(
+                f'/api/tracks/{track.pk}/stream', headers=headers)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(await self.read(response), self.DATA)
+
+    async def test_unsatisfiable_range_is_rejected(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            track = await self.create_track()
+
+            response = await self.async_client.get(
+                f'/api/tracks/{track.pk}/stream',
+                headers={'Range': f'bytes={len(self.DATA)}-'})
+
+            self.assertEqual(response.status_code, 416)
+            self.assertEqual(response['Content-Range'],
+                             f'bytes */{len(self.DATA)}')
+
+    async def test_rendition_is_streamed_when_requested(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            track = await self.create_track()
+            await Rendition.objects.acreate(
+                track=track, codec='opus', bitrate=64,
+                file=self.content_file(b'opus', 'song.64k.opus'))
+            url = f'/api/tracks/{track.pk}/stream'
+
+            response = await self.async_client.get(url, {'format': 'opus'})
+            response2 = await self.async_client.get(url, headers={'Accept': 'audio/ogg'})
+            response3 = await self.async_client.get(url, headers={'Accept': 'audio/mpeg'})
+
+            self.assertEqual(response['Content-Type'], 'audio/ogg')
+            self.assertEqual(response['Vary'], 'Accept')
+            self.assertEqual(await self.read(response), b'opus')
+            self.assertEqual(await self.read(response2), b'opus')
+            self.assertEqual(await self.read(response3), self.DATA)
+
+
+@plain_storage
+class TestRouter(TestHelper):
+    def setUp(self):
+        self.client = TestAsyncClient(router)
+
+    async def test_staff_member_can_add_track(self):
+        member = await self.create_staff_member()
+        normie = await self.create_user(username='jack')
+        artist = await self.create_artist()
+        album = await self.create_album('Piano Man', artist)
+        data = {
+            'title': 'Piano Man', 'duration': 'PT5M38S', 'number': 2,
+            'album_id': album.pk, 'artist_ids': [artist.pk],
+        }
+
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td, FILE_UPLOAD_TEMP_DIR=td):
+            file = self.temp_file(self.audio_file('piano.wav'), 'audio/wav', write=True)
+            res = await self.client.post(
+                '', self.form_data(data), FILES={'file': file},
+                headers=self.make_auth_header(member))
+            res2 = await self.client.post(
+                '', self.form_data(data), FILES={'file': file},
+                headers=self.make_auth_header(normie))
+            json = res.json()
+
+            self.assertEqual(res.status_code, 201)
+            self.assertEqual(res2.status_code, 401)
+            self.assertEqual(json['duration'], 'P0DT00H05M38S')
+            self.assertEqual(json['album']['name'], 'Piano Man')
+            self.assertEqual(json['artists'][0]['name'], 'Billy Joel')
+            self.assertTrue(self.fileExists(td, 'tracks/piano.wav'))
+
+    async def test_track_attributes_are_read_from_tags(self):
+        member = await self.create_staff_member()
+        await self.create_artist()
+
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td, FILE_UPLOAD_TEMP_DIR=td):
+            file = self.temp_file(self.audio_file('piano.wav', seconds=2), 'audio/wav', write=True)
+            file.flush()
+            tags = WAVE(file.temporary_file_path())
+            tags.add_tags()
+            for frame in [TIT2(text='Piano Man'), TPE1(text=['Billy Joel', 'Ray Charles']),
+                          TPE2(text='Billy Joel'), TALB(text='Piano Man'),
+                          TRCK(text='2/10'), TDRC(text='1973-11-09')]:
+                tags.tags.add(frame)
+            tags.save()
+            file.size = os.path.getsize(file.temporary_file_path())
+
+            res = await self.client.post(
+                '', FILES={'file': file}, headers=self.make_auth_header(member))
+            json = res.json()
+
+            self.assertEqual(res.status_code, 201)
+            self.assertEqual(json['title'], 'Piano Man')
+            self.assertEqual(json['duration'], 'P0DT00H00M02S')
+            self.assertEqual(json['number'], 2)
+            self.assertEqual(json['year'], 1973)
+            self.assertEqual(json['album']['name'], 'Piano Man')
+            self.assertEqual(json['album']['artist']['id'], 1)
+            self.assertEqual([a['name'] for a in json['artists']], ['Billy Joel', 'Ray Charles'])
+
+    async def test_nothing_is_created_from_tags_of_track_without_duration(self):
+        member = await self.create_staff_member()
+
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td, FILE_UPLOAD_TEMP_DIR=td):
+            file = self.temp_file(self.audio_file('piano.wav', seconds=0), 'audio/wav', write=True)
+            file.flush()
+            tags = WAVE(file.temporary_file_path())
+            tags.add_tags()
+            tags.tags.add(TPE1(text='Billy Joel'))
+            tags.tags.add(TALB(text='Piano Man'))
+            tags.save()
+            file.size = os.path.getsize(file.temporary_file_path())
+
+            res = await self.client.post(
+                '', FILES={'file': file}, headers=self.make_auth_header(member))
+
+            self.assertEqual(res.status_code, 422)
+            self.assertFalse(await Artist.objects.aexists())
+            self.assertFalse(await Album.objects.aexists())
+
+    async def test_track_must_be_audio_file_by_existing_artists(self):
+        member = await self.create_staff_member()
+        data = {'title': 'Piano Man', 'duration': 'PT5M38S', 'artist_ids': [42]}
+
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td, FILE_UPLOAD_TEMP_DIR=td):
+            file = self.temp_file(self.image_file('piano.wav'), 'audio/wav', write=True)
+            res = await self.client.post(
+                '', self.form_data(data), FILES={'file': file},
+                headers=self.make_auth_header(member))
+            errors = res.json()['detail']
+
+            self.assertEqual(res.status_code, 422)
+            self.assertEqual(len(errors), 2)
+            self.assertFalse(self.fileExists(td, 'tracks/piano.wav'))
+
+    async def test_guest_can_list_tracks(self):
+        artist = await self.create_artist()
+        album = await self.create_album('Piano Man', artist)
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            for number, title in enumerate(['Travelin\' Prayer', 'Piano Man'], 1):
+                track = await Track.objects.acreate(
+                    file=self.audio_file(), title=title, number=number,
+                    duration=timedelta(seconds=200), album=album)
+                await track.artists.aadd(artist)
+
+            response = await self.client.get(f'?album_id={album.pk}')
+            json = response.json()
+
+            self.assertEqual(json['count'], 2)
+            self.assertEqual(json['items'][1]['title'], 'Piano Man')
+            self.assertEqual(json['items'][1]['artists'][0]['name'], 'Billy Joel')
+
+    async def test_track_details_are_loaded_with_constant_number_of_queries(self):
+        album = await self.create_album('Piano Man')
+        track = await Track.objects.acreate(
+            file='tracks/piano.wav', title='Piano Man',
+            duration=timedelta(seconds=200), album=album)
+        for name in ['Billy Joel', 'Ray Charles', 'Elton John']:
+            artist, _ = await Artist.objects.aget_or_create(name=name)
+            await track.artists.aadd(artist)
+
+        # One query for the validators, two to load the track and its artists
+        async with self.assertMaxQueries(3):
+            response = await self.client.get(f'/{track.pk}')
+        json = response.json()
+
+        self.assertEqual(json['album']['artist']['name'], 'Billy Joel')
+        self.assertEqual(len(json['artists']), 3)
+
+    async def test_staff_member_can_update_track(self):
+        member = await self.create_staff_member()
+        artist = await self.create_artist()
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td, FILE_UPLOAD_TEMP_DIR=td):
+            track = await Track.objects.acreate(
+                file=self.audio_file('old.wav'), title='Pianoman',
+                duration=timedelta(seconds=200))
+            file = self.temp_file(self.audio_file('new.wav'), 'audio/wav', write=True)
+            data = {'title': 'Piano Man', 'duration': '00:05:38', 'artist_ids': [artist.pk]}
+
+            res = await self.client.put(
+                f'/{track.pk}', self.form_data(data), FILES={'file': file},
+                headers=self.make_auth_header(member))
+            json = res.json()
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(json['title'], 'Piano Man')
+            self.assertEqual(json['duration'], 'P0DT00H05M38S')
+            self.assertEqual(len(json['artists']), 1)
+            self.assertFalse(self.fileExists(td, 'tracks/old.wav'))
+            self.assertTrue(self.fileExists(td, 'tracks/new.wav'))
+
+    async def test_metadata_is_read_from_replaced_file(self):
+        member = await self.create_staff_member()
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td, FILE_UPLOAD_TEMP_DIR=td):
+            track = await Track.objects.acreate(
+                file=self.audio_file('old.wav'), title='Pianoman',
+                duration=timedelta(seconds=200))
+            file = self.temp_file(self.audio_file('new.wav', seconds=3), 'audio/wav', write=True)
+            silent = self.temp_file(self.audio_file('silent.wav', seconds=0), 'audio/wav', write=True)
+
+            res = await self.client.put(
+                f'/{track.pk}', self.form_data({'title': 'Piano Man'}), FILES={'file': file},
+                headers=self.make_auth_header(member))
+            res2 = await self.client.put(
+                f'/{track.pk}', {}, FILES={'file': silent}, headers=self.make_auth_header(member))
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.json()['title'], 'Piano Man')
+            self.assertEqual(res.json()['duration'], 'P0DT00H00M03S')
+            self.assertEqual(res2.status_code, 422)
+            self.assertTrue(self.fileExists(td, 'tracks/new.wav'))
+
+    async def test_staff_member_can_delete_track(self):
+        member = await self.create_staff_member()
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            track = await Track.objects.acreate(
+                file=self.audio_file(), title='Piano Man',
+                duration=timedelta(seconds=200))
+            url = f'/{track.pk}'
+
+            response = await self.client.delete(url, headers=self.make_auth_header(member))
+            response2 = await self.client.delete(url, headers=self.make_auth_header(member))
+
+            self.assertEqual(response.status_code, 204)
+            self.assertEqual(response2.status_code, 404)
+            self.assertFalse(self.fileExists(td, 'tracks/song.wav'))
@@ -0,0 +1,72 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from transcoding.queue import claim, requeue_stale, run
+
+
+class Command(BaseCommand):
+    help = 'Run workers producing renditions of uploaded tracks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int,
+            default=getattr(settings, 'TRANSCODING_WORKERS', os.cpu_count() or 1),
+            help='Jobs run at the same time, each one runs its own encoder process')
+        parser.add_argument(
+            '--poll', type=float, default=2.0,
+            help='Seconds to wait before checking an empty queue again')
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once there are no jobs due')
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        self.done = 0
+        self.lock = threading.Lock()
+        workers, poll, burst = options['workers'], options['poll'], options['burst']
+        requeue_stale()
+
+        try:
+            if workers == 1:
+                self.work(poll, burst)
+            else:
+                # Encoders are separate processes, threads only wait for them
+                with ThreadPoolExecutor(workers, thread_name_prefix='transcoder') as pool:
+                    futures = [pool.submit(self.work, poll, burst, True)
+                               for _ in range(workers)]
+                    try:
+                        for future in futures:
+                            future.result()
+                    except BaseException:
+                        # Leaving the block waits for the threads, which
+                        # finish their jobs and stop
+                        self.stopping.set()
+                        raise
+        except KeyboardInterrupt:
+            self.stopping.set()
+        self.stdout.write(f'{self.done} jobs processed')
+
+    def work(self, poll: float, burst: bool, thread: bool = False):
+        try:
+            while not self.stopping.is_set():
+                if not connection.in_atomic_block:
+                    close_old_connections()
+                job = claim()
+                if job is None:
+                    if burst:
+                        return
+                    requeue_stale()
+                    self.stopping.wait(poll)
+                    continue
+
+                run(job)
+                with self.lock:
+                    self.done += 1
+                self.stdout.write(f'Track {job.track_id}: {job.status}')
+        finally:
+            if thread:
+                connection.close()
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('tracks', '0003_track_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Rendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codec', models.CharField(choices=[('opus', 'Opus'), ('aac', 'AAC'), ('mp3', 'MP3')], max_length=10)),
+                ('bitrate', models.PositiveIntegerField(help_text='Kilobits per second')),
+                ('file', models.FileField(upload_to='renditions')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='tracks.track')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('track', 'codec', 'bitrate'), name='unique_track_rendition')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TranscodeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transcode_jobs', to='tracks.track')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='transcodejob_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:27
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracks', '0003_track_updated_at'),
+        ('transcoding', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Package',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('segment_duration', models.PositiveIntegerField(help_text='Seconds')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('track', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='package', to='tracks.track')),
+            ],
+        ),
+    ]
@@ -0,0 +1,106 @@
+import uuid
+from django.core.files.storage import storages
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django.db import models
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from tracks.models import Track
+
+
+# Media types of the renditions, as sent in `Accept` and `Content-Type`
+CONTENT_TYPES = {
+    'opus': 'audio/ogg',
+    'aac': 'audio/mp4',
+    'mp3': 'audio/mpeg',
+}
+
+
+class TranscodeJob(models.Model):
+    """Renditions of the track to be produced by `run_transcoder` workers"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, _('Pending')), (RUNNING, _('Running')),
+        (DONE, _('Done')), (FAILED, _('Failed')),
+    ]
+
+    track = models.ForeignKey(Track, on_delete=models.CASCADE,
+                              related_name='transcode_jobs')
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # Failed attempts are retried later
+    available_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='transcodejob_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.track_id} ({self.status})'
+
+
+class Rendition(models.Model):
+    CODECS = [('opus', 'Opus'), ('aac', 'AAC'), ('mp3', 'MP3')]
+
+    track = models.ForeignKey(Track, on_delete=models.CASCADE,
+                              related_name='renditions')
+    codec = models.CharField(max_length=10, choices=CODECS)
+    bitrate = models.PositiveIntegerField(help_text=_('Kilobits per second'))
+    file = models.FileField(upload_to='renditions')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['track', 'codec', 'bitrate'],
+                                    name='unique_track_rendition'),
+        ]
+
+    def __str__(self):
+        return f'{self.track_id} {self.codec} {self.bitrate}k'
+
+    @property
+    def content_type(self):
+        return CONTENT_TYPES[self.codec]
+
+
+class Package(models.Model):
+    """Segments of a long track with DASH manifest and HLS playlists"""
+    track = models.OneToOneField(Track, on_delete=models.CASCADE,
+                                 related_name='package')
+    # Files of the package never change, new packages get new keys
+    key = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    segment_duration = models.PositiveIntegerField(help_text=_('Seconds'))
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.track_id} ({self.key})'
+
+    @property
+    def prefix(self):
+        return f'packages/{self.key}'
+
+
+def package_storage():
+    return storages['packages']
+
+
+@receiver(post_delete, sender=Rendition)
+def delete_rendition_file(sender, instance, **kwargs):
+    if instance.file:
+        instance.file.delete(save=False)
+
+
+@receiver(post_delete, sender=Package)
+def delete_package_files(sender, instance, **kwargs):
+    storage = package_storage()
+    if storage.exists(instance.prefix):
+        for name in storage.listdir(instance.prefix)[1]:
+            storage.delete(f'{instance.prefix}/{name}')
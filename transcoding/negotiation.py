@@ -0,0 +1,68 @@
+from typing import Dict, List, Optional
+
+from .models import Rendition
+
+
+def parse_accept(header: Optional[str]) -> Dict[str, float]:
+    """Media ranges of `Accept` header with their quality values"""
+    ranges = {}
+    for part in (header or '*/*').split(','):
+        media, *params = [p.strip() for p in part.split(';')]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media:
+            ranges[media.lower()] = q
+    return ranges
+
+
+def quality(ranges: Dict[str, float], content_type: Optional[str]) -> float:
+    """Quality of the media type, the most specific matching range counts"""
+    if not content_type:
+        return ranges.get('*/*', 0.0)
+    content_type = content_type.lower()
+    main = content_type.partition('/')[0]
+    for key in (content_type, f'{main}/*', '*/*'):
+        if key in ranges:
+            return ranges[key]
+    return 0.0
+
+
+def by_bitrate(renditions: List[Rendition], bitrate: Optional[int]) -> Rendition:
+    """The best rendition within the bitrate, the smallest one if none fits"""
+    if bitrate is None:
+        return max(renditions, key=lambda r: r.bitrate)
+    fitting = [r for r in renditions if r.bitrate <= bitrate]
+    if fitting:
+        return max(fitting, key=lambda r: r.bitrate)
+    return min(renditions, key=lambda r: r.bitrate)
+
+
+def select_rendition(renditions: List[Rendition], original_type: Optional[str],
+                     accept: Optional[str] = None, codec: Optional[str] = None,
+                     bitrate: Optional[int] = None) -> Optional[Rendition]:
+    """
+    Rendition to be streamed, `None` stands for the uploaded file. Codec
+    requested in the query wins over `Accept`, the original is preferred
+    when the client accepts it at least as much as any rendition and does
+    not limit the bitrate.
+    """
+    if codec == 'original':
+        return None
+    if codec is not None:
+        candidates = [r for r in renditions if r.codec == codec]
+        return by_bitrate(candidates, bitrate) if candidates else None
+
+    ranges = parse_accept(accept)
+    ranked = [(quality(ranges, r.content_type), r) for r in renditions]
+    best = max((q for q, _ in ranked), default=0.0)
+    if best <= 0:
+        return None
+    if bitrate is None and quality(ranges, original_type) >= best:
+        return None
+    return by_bitrate([r for q, r in ranked if q == best], bitrate)
@@ -0,0 +1,191 @@
+import logging
+import os
+import tempfile
+from datetime import timedelta
+from typing import Callable, Iterable, Optional
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from tracks.models import Track
+from waveforms.peaks import generate_peaks
+from .models import TranscodeJob, Rendition, Package, package_storage
+from .transcoders import ENCODERS, get_transcoder, get_packager, local_path
+
+
+logger = logging.getLogger("django")
+
+# Codec and bitrate (kbps) of the renditions produced for every track
+RENDITIONS = getattr(settings, 'TRANSCODING_RENDITIONS', [
+    ('opus', 64), ('opus', 128), ('aac', 128), ('aac', 256), ('mp3', 320),
+])
+MAX_ATTEMPTS = getattr(settings, 'TRANSCODING_MAX_ATTEMPTS', 3)
+# Seconds before the first retry, doubled after every failed attempt
+RETRY_DELAY = getattr(settings, 'TRANSCODING_RETRY_DELAY', 60)
+# Running jobs which did not report progress for this many seconds belong
+# to workers which died, by default twice the longest step may take
+STALE_AFTER = getattr(settings, 'TRANSCODING_TIMEOUT', None)
+# Tracks at least this long (seconds) are split into segments, `None`
+# turns packaging off
+PACKAGING_MIN_DURATION = getattr(settings, 'PACKAGING_MIN_DURATION', 1200)
+PACKAGING_SEGMENT_DURATION = getattr(settings, 'PACKAGING_SEGMENT_DURATION', 10)
+PACKAGING_BITRATES = getattr(settings, 'PACKAGING_BITRATES', [64, 128])
+
+
+def enqueue(track_ids: Iterable[int]):
+    """
+    Schedule renditions, packages and waveform peaks of the tracks.
+    Existing renditions and packages are outdated, the track files have
+    just been uploaded or replaced.
+    """
+    track_ids = list(track_ids)
+    if not track_ids:
+        return
+    with transaction.atomic():
+        Rendition.objects.filter(track_id__in=track_ids).delete()
+        Package.objects.filter(track_id__in=track_ids).delete()
+        TranscodeJob.objects.filter(
+            track_id__in=track_ids, status=TranscodeJob.PENDING).delete()
+        TranscodeJob.objects.bulk_create(
+            [TranscodeJob(track_id=pk) for pk in track_ids])
+
+
+def claim() -> Optional[TranscodeJob]:
+    """
+    Take the oldest job which is due. The update is conditional on the job
+    still being pending, so concurrent workers never run the same job and
+    no row locks are needed (SQLite has none).
+    """
+    while True:
+        now = timezone.now()
+        pk = TranscodeJob.objects.filter(
+            status=TranscodeJob.PENDING, available_at__lte=now
+        ).order_by('available_at', 'pk').values_list('pk', flat=True).first()
+        if pk is None:
+            return None
+
+        claimed = TranscodeJob.objects.filter(pk=pk, status=TranscodeJob.PENDING).update(
+            status=TranscodeJob.RUNNING, started_at=now, attempts=F('attempts') + 1)
+        if not claimed:
+            continue
+        # The job is gone when its track was deleted in the meantime
+        job = TranscodeJob.objects.select_related('track').filter(pk=pk).first()
+        if job is not None:
+            return job
+
+
+def stale_after() -> float:
+    """
+    Seconds after which a running job is abandoned. Jobs report progress
+    after every encoder run, so the longest run has to fit in.
+    """
+    if STALE_AFTER is not None:
+        return STALE_AFTER
+    timeouts = [getattr(get_transcoder(), 'timeout', None), getattr(get_packager(), 'timeout', None)]
+    return 2 * max([t for t in timeouts if t] or [3600])
+
+
+def heartbeat(job: TranscodeJob):
+    """Show that the worker running the job is alive"""
+    TranscodeJob.objects.filter(pk=job.pk, status=TranscodeJob.RUNNING).update(
+        started_at=timezone.now())
+
+
+def requeue_stale() -> int:
+    """Jobs left running by crashed workers are picked up again"""
+    now = timezone.now()
+    return TranscodeJob.objects.filter(
+        status=TranscodeJob.RUNNING, started_at__lt=now - timedelta(seconds=stale_after())
+    ).update(status=TranscodeJob.PENDING, available_at=now)
+
+
+def transcode_track(track: Track, progress: Optional[Callable[[], None]] = None):
+    """
+    Encode and store all renditions of the track, replacing old ones.
+    `progress` is called after every rendition.
+    """
+    transcoder = get_transcoder()
+    base = os.path.splitext(os.path.basename(track.file.name))[0]
+    renditions, stored = [], False
+    try:
+        with local_path(track.file) as source, tempfile.TemporaryDirectory() as td:
+            for codec, bitrate in RENDITIONS:
+                ext = ENCODERS[codec].extension
+                target = os.path.join(td, f'{codec}-{bitrate}.{ext}')
+                transcoder.transcode(source, target, codec, bitrate)
+
+                rendition = Rendition(track=track, codec=codec, bitrate=bitrate)
+                with open(target, 'rb') as fp:
+                    rendition.file.save(f'{base}.{bitrate}k.{ext}', File(fp), save=False)
+                renditions.append(rendition)
+                if progress is not None:
+                    progress()
+
+        with transaction.atomic():
+            # The file could be replaced or the track deleted meanwhile
+            if Track.objects.select_for_update().filter(
+                    pk=track.pk, file=track.file.name).exists():
+                Rendition.objects.filter(track=track).delete()
+                Rendition.objects.bulk_create(renditions)
+                stored = True
+    finally:
+        if not stored:
+            for rendition in renditions:
+                rendition.file.delete(save=False)
+
+
+def package_track(track: Track):
+    """Split a long track into segments for DASH and HLS players"""
+    if PACKAGING_MIN_DURATION is None or \
+            track.duration.total_seconds() < PACKAGING_MIN_DURATION:
+        return
+
+    packager, storage = get_packager(), package_storage()
+    package = Package(track=track, segment_duration=PACKAGING_SEGMENT_DURATION)
+    names, stored = [], False
+    try:
+        with local_path(track.file) as source, tempfile.TemporaryDirectory() as td:
+            packager.package(source, td, PACKAGING_SEGMENT_DURATION, PACKAGING_BITRATES)
+            for filename in sorted(os.listdir(td)):
+                with open(os.path.join(td, filename), 'rb') as fp:
+                    names.append(storage.save(f'{package.prefix}/{filename}', File(fp)))
+
+        with transaction.atomic():
+            # The file could be replaced or the track deleted meanwhile
+            if Track.objects.select_for_update().filter(
+                    pk=track.pk, file=track.file.name).exists():
+                Package.objects.filter(track=track).delete()
+                package.save()
+                stored = True
+    finally:
+        if not stored:
+            for name in names:
+                storage.delete(name)
+
+
+def run(job: TranscodeJob):
+    """Run the claimed job, failed attempts are retried with a backoff"""
+    try:
+        # Peaks are cheap, players get them before the renditions
+        generate_peaks(job.track.file)
+        heartbeat(job)
+        transcode_track(job.track, lambda: heartbeat(job))
+        package_track(job.track)
+    except Exception as e:
+        logger.warning(f"Transcoding of track {job.track_id} failed "
+                       f"(attempt {job.attempts}): {e}")
+        job.error = str(e)
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = TranscodeJob.FAILED
+        else:
+            job.status = TranscodeJob.PENDING
+            job.available_at = timezone.now() + timedelta(
+                seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+    else:
+        job.status = TranscodeJob.DONE
+        job.error = ''
+    # The job is gone when its track was deleted while it ran
+    TranscodeJob.objects.filter(pk=job.pk).update(
+        status=job.status, error=job.error, available_at=job.available_at)
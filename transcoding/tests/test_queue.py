@@ -0,0 +1,271 @@
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from helpers import TestHelper
+
+from tracks.models import Track
+from transcoding.models import TranscodeJob, Rendition, Package, package_storage
+from transcoding.negotiation import select_rendition
+from transcoding.queue import (
+    RENDITIONS, MAX_ATTEMPTS, enqueue, claim, run, requeue_stale, stale_after
+)
+from waveforms.peaks import WAVEFORM_LEVELS, peaks_name, peaks_storage
+
+
+class CopyTranscoder:
+    def transcode(self, source, target, codec, bitrate):
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            dst.write(f'{codec}-{bitrate}:'.encode() + src.read())
+
+
+class FakePackager:
+    def package(self, source, directory, segment_duration, bitrates):
+        files = {'manifest.mpd': b'<MPD/>', 'master.m3u8': b'#EXTM3U',
+                 'init-stream0.m4s': b'init', 'chunk-stream0-00001.m4s': b'chunk'}
+        for name, content in files.items():
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.write(content)
+
+
+class StallingTranscoder(CopyTranscoder):
+    """Leaves the job to look abandoned unless the worker reports progress"""
+
+    def transcode(self, source, target, codec, bitrate):
+        TranscodeJob.objects.update(started_at=timezone.now() - timedelta(days=1))
+        super().transcode(source, target, codec, bitrate)
+
+
+class FailingTranscoder:
+    def transcode(self, source, target, codec, bitrate):
+        raise RuntimeError('Unsupported sample format')
+
+
+class TestQueue(TestHelper):
+    def create_track(self, name='song.wav'):
+        track = Track.objects.create(
+            file=self.audio_file(name), title='Piano Man', duration=timedelta(seconds=1))
+        enqueue([track.pk])
+        return track
+
+    def transcode(self):
+        call_command('run_transcoder', '--workers', '1', '--burst', stdout=StringIO())
+
+    def test_renditions_are_created_by_workers(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(
+                MEDIA_ROOT=td, TRANSCODER='transcoding.tests.test_queue.CopyTranscoder'):
+            track = self.create_track()
+
+            self.transcode()
+
+            job = TranscodeJob.objects.get(track=track)
+            renditions = {(r.codec, r.bitrate): r for r in track.renditions.all()}
+            self.assertEqual(job.status, TranscodeJob.DONE)
+            self.assertEqual(job.attempts, 1)
+            self.assertEqual(set(renditions), set(RENDITIONS))
+            with renditions[('opus', 64)].file.open('rb') as f:
+                self.assertTrue(f.read().startswith(b'opus-64:RIFF'))
+            self.assertTrue(peaks_storage().exists(
+                peaks_name(track.file.name, WAVEFORM_LEVELS[0])))
+
+    def test_replaced_file_outdates_renditions(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(
+                MEDIA_ROOT=td, TRANSCODER='transcoding.tests.test_queue.CopyTranscoder'):
+            track = self.create_track()
+            self.transcode()
+
+            enqueue([track.pk])
+
+            self.assertFalse(track.renditions.exists())
+            self.assertEqual(TranscodeJob.objects.filter(
+                track=track, status=TranscodeJob.PENDING).count(), 1)
+
+    def test_failed_jobs_are_retried_later(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(
+                MEDIA_ROOT=td, TRANSCODER='transcoding.tests.test_queue.FailingTranscoder'):
+            track = self.create_track()
+
+            self.transcode()
+            job = TranscodeJob.objects.get(track=track)
+            self.assertEqual(job.status, TranscodeJob.PENDING)
+            self.assertGreater(job.available_at, timezone.now())
+            self.assertIn('Unsupported sample format', job.error)
+
+            # Retries are not due yet
+            self.assertIsNone(claim())
+            for _ in range(MAX_ATTEMPTS - 1):
+                TranscodeJob.objects.filter(pk=job.pk).update(available_at=timezone.now())
+                run(claim())
+
+            job.refresh_from_db()
+            self.assertEqual(job.status, TranscodeJob.FAILED)
+            self.assertEqual(job.attempts, MAX_ATTEMPTS)
+            self.assertFalse(Rendition.objects.exists())
+
+    def test_job_is_claimed_once(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            self.create_track()
+
+            job = claim()
+
+            self.assertEqual(job.status, TranscodeJob.RUNNING)
+            self.assertIsNone(claim())
+
+    def test_stale_timeout_fits_longest_step(self):
+        self.assertEqual(stale_after(), 7200)
+        with self.settings(TRANSCODER_OPTIONS={'timeout': 5000}):
+            self.assertEqual(stale_after(), 10000)
+
+    def test_running_jobs_report_progress(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(
+                MEDIA_ROOT=td, TRANSCODER='transcoding.tests.test_queue.StallingTranscoder'):
+            self.create_track()
+            job, requeued = claim(), []
+
+            with mock.patch('transcoding.queue.package_track',
+                            lambda track: requeued.append(requeue_stale())):
+                run(job)
+
+            job.refresh_from_db()
+            self.assertEqual(requeued, [0])
+            self.assertEqual(job.status, TranscodeJob.DONE)
+
+    def test_interrupted_workers_stop(self):
+        result = Future.result
+        interrupted = []
+
+        def interrupt(future, *args, **kwargs):
+            if not interrupted:
+                interrupted.append(True)
+                raise KeyboardInterrupt
+            return result(future, *args, **kwargs)
+
+        out = StringIO()
+        command = 'transcoding.management.commands.run_transcoder'
+        with mock.patch(f'{command}.claim', return_value=None), \
+                mock.patch(f'{command}.requeue_stale'), \
+                mock.patch.object(Future, 'result', interrupt):
+            thread = threading.Thread(target=call_command, args=(
+                'run_transcoder', '--workers', '2', '--poll', '0.01'), kwargs={'stdout': out})
+            thread.start()
+            thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertIn('0 jobs processed', out.getvalue())
+
+    def test_job_deleted_while_claimed_is_skipped(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            first, second = self.create_track('a.wav'), self.create_track('b.wav')
+            update, deleted = QuerySet.update, []
+
+            def update_and_delete(qs, **kwargs):
+                count = update(qs, **kwargs)
+                if qs.model is TranscodeJob and not deleted:
+                    deleted.append(first.pk)
+                    first.delete()
+                return count
+
+            with mock.patch.object(QuerySet, 'update', update_and_delete):
+                job = claim()
+
+            self.assertEqual(job.track, second)
+            self.assertFalse(Track.objects.filter(pk=deleted[0]).exists())
+
+    @skipUnless(shutil.which('ffmpeg'), 'ffmpeg is not installed')
+    def test_ffmpeg_encodes_renditions(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            track = self.create_track()
+
+            self.transcode()
+
+            self.assertEqual(track.renditions.count(), len(RENDITIONS))
+
+
+class TestPackaging(TestHelper):
+    def create_track(self, hours: float):
+        track = Track.objects.create(
+            file=self.audio_file(), title='Mix', duration=timedelta(hours=hours))
+        enqueue([track.pk])
+        return track
+
+    def test_long_tracks_are_packaged(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(
+                MEDIA_ROOT=td, TRANSCODER='transcoding.tests.test_queue.CopyTranscoder',
+                PACKAGER='transcoding.tests.test_queue.FakePackager'):
+            track = self.create_track(hours=3)
+            short = self.create_track(hours=0.05)
+
+            call_command('run_transcoder', '--workers', '1', '--burst', stdout=StringIO())
+
+            package = Package.objects.get(track=track)
+            self.assertFalse(Package.objects.filter(track=short).exists())
+            self.assertEqual(len(package_storage().listdir(package.prefix)[1]), 4)
+
+            enqueue([track.pk])
+            self.assertFalse(Package.objects.exists())
+            self.assertFalse(package_storage().exists(f'{package.prefix}/manifest.mpd'))
+
+    async def test_guest_can_fetch_segments(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            track = await Track.objects.acreate(
+                file=self.audio_file(), title='Mix', duration=timedelta(hours=3))
+            package = await Package.objects.acreate(track=track, segment_duration=10)
+            for name in ['manifest.mpd', 'chunk-stream0-00001.m4s']:
+                package_storage().save(f'{package.prefix}/{name}', ContentFile(name.encode()))
+            base = f'/api/tracks/{track.pk}'
+
+            response = await self.async_client.get(f'{base}/manifest.mpd')
+            response2 = await self.async_client.get(
+                f'{base}/{response["Location"]}'.replace('manifest.mpd', 'chunk-stream0-00001.m4s'))
+            response3 = await self.async_client.get(f'{base}/master.m3u8')
+            response4 = await self.async_client.get(f'{base}/packages/{package.key}/..')
+            response5 = await self.async_client.get(
+                f'/api/tracks/{track.pk + 1}/packages/{package.key}/manifest.mpd')
+
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(response['Location'], f'packages/{package.key}/manifest.mpd')
+            self.assertEqual(response2.status_code, 200)
+            self.assertEqual(response2['Content-Type'], 'audio/mp4')
+            self.assertIn('immutable', response2['Cache-Control'])
+            self.assertEqual(response2.getvalue(), b'chunk-stream0-00001.m4s')
+            self.assertEqual(response3.status_code, 302)
+            self.assertEqual(response4.status_code, 404)
+            self.assertEqual(response5.status_code, 404)
+
+
+class TestNegotiation(TestHelper):
+    def renditions(self):
+        return [Rendition(codec=codec, bitrate=bitrate) for codec, bitrate in [
+            ('opus', 64), ('opus', 128), ('aac', 256), ('mp3', 320)]]
+
+    def select(self, accept=None, codec=None, bitrate=None):
+        rendition = select_rendition(self.renditions(), 'audio/flac', accept, codec, bitrate)
+        return rendition and (rendition.codec, rendition.bitrate)
+
+    def test_original_is_streamed_without_preferences(self):
+        self.assertIsNone(self.select())
+        self.assertIsNone(self.select('audio/*'))
+        self.assertIsNone(self.select('audio/flac, audio/ogg'))
+        self.assertIsNone(self.select(codec='original', bitrate=64))
+
+    def test_rendition_is_picked_by_query(self):
+        self.assertEqual(self.select(codec='opus'), ('opus', 128))
+        self.assertEqual(self.select(codec='opus', bitrate=100), ('opus', 64))
+        self.assertEqual(self.select(codec='mp3', bitrate=32), ('mp3', 320))
+        self.assertEqual(self.select(bitrate=200), ('opus', 128))
+
+    def test_rendition_is_picked_by_accept(self):
+        self.assertEqual(self.select('audio/mpeg'), ('mp3', 320))
+        self.assertEqual(self.select('audio/ogg, audio/flac;q=0.5'), ('opus', 128))
+        self.assertEqual(self.select('audio/mp4;q=0.9, audio/mpeg;q=0.5', bitrate=96), ('aac', 256))
+        self.assertIsNone(self.select('audio/flac, audio/mpeg;q=0.5'))
+        self.assertIsNone(self.select('video/*'))
@@ -0,0 +1,116 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from typing import List, NamedTuple
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
+from django.utils.module_loading import import_string
+
+
+class Encoder(NamedTuple):
+    name: str
+    extension: str
+    options: tuple = ()
+
+
+# ffmpeg encoders of the codecs, AAC goes into MP4 with the index up front
+# so players can start before the whole file is downloaded
+ENCODERS = {
+    'opus': Encoder('libopus', 'opus'),
+    'aac': Encoder('aac', 'm4a', ('-movflags', '+faststart')),
+    'mp3': Encoder('libmp3lame', 'mp3'),
+}
+
+
+# Entry points of packaged tracks, written by the packager
+DASH_MANIFEST = 'manifest.mpd'
+HLS_PLAYLIST = 'master.m3u8'
+
+
+class TranscodingError(Exception):
+    pass
+
+
+class FFmpegTranscoder:
+    """Encodes renditions with the `ffmpeg` binary"""
+
+    def __init__(self, binary: str = 'ffmpeg', timeout: int = 600):
+        self.binary = binary
+        self.timeout = timeout
+
+    def transcode(self, source: str, target: str, codec: str, bitrate: int):
+        encoder = ENCODERS[codec]
+        command = [
+            self.binary, '-nostdin', '-v', 'error', '-y', '-i', source,
+            # Cover art and other streams are left out
+            '-map', '0:a:0', '-vn', '-c:a', encoder.name, '-b:a', f'{bitrate}k',
+            *encoder.options, target,
+        ]
+        self.run(command)
+
+    def run(self, command: List[str]):
+        try:
+            subprocess.run(command, check=True, capture_output=True, timeout=self.timeout)
+        except FileNotFoundError:
+            raise TranscodingError(f'{self.binary} is not installed')
+        except subprocess.TimeoutExpired:
+            raise TranscodingError(f'Transcoding timed out after {self.timeout}s')
+        except subprocess.CalledProcessError as e:
+            raise TranscodingError(e.stderr.decode(errors='replace').strip())
+
+
+class FFmpegPackager(FFmpegTranscoder):
+    """
+    Splits audio into CMAF segments encoded with AAC at every bitrate, the
+    DASH manifest and HLS playlists refer to the same segments
+    """
+
+    def __init__(self, binary: str = 'ffmpeg', timeout: int = 3600):
+        super().__init__(binary, timeout)
+
+    def package(self, source: str, directory: str, segment_duration: int,
+                bitrates: List[int]):
+        command = [self.binary, '-nostdin', '-v', 'error', '-y', '-i', source]
+        for _ in bitrates:
+            command += ['-map', '0:a:0']
+        command += ['-vn', '-c:a', 'aac']
+        for i, bitrate in enumerate(bitrates):
+            command += [f'-b:a:{i}', f'{bitrate}k']
+        command += [
+            '-f', 'dash', '-seg_duration', str(segment_duration),
+            '-use_template', '1', '-use_timeline', '0',
+            '-adaptation_sets', 'id=0,streams=a',
+            '-hls_playlist', '1', os.path.join(directory, DASH_MANIFEST),
+        ]
+        self.run(command)
+
+
+def get_transcoder():
+    path = getattr(settings, 'TRANSCODER', 'transcoding.transcoders.FFmpegTranscoder')
+    return import_string(path)(**getattr(settings, 'TRANSCODER_OPTIONS', {}))
+
+
+def get_packager():
+    path = getattr(settings, 'PACKAGER', 'transcoding.transcoders.FFmpegPackager')
+    return import_string(path)(**getattr(settings, 'PACKAGER_OPTIONS', {}))
+
+
+@contextmanager
+def local_path(file: FieldFile):
+    """Path of the file on the local disk, remote files are downloaded"""
+    try:
+        path = file.storage.path(file.name)
+    except NotImplementedError:
+        path = None
+    if path is not None:
+        yield path
+        return
+
+    ext = os.path.splitext(file.name)[1]
+    with tempfile.NamedTemporaryFile(suffix=ext) as tmp, \
+            file.storage.open(file.name, 'rb') as fp:
+        shutil.copyfileobj(fp, tmp)
+        tmp.flush()
+        yield tmp.name
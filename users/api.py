@@ -1,8 +1,10 @@
 import logging
+import jwt
 from ninja import Router, Form, Query, File
 from ninja.errors import ValidationError
 from ninja.security import HttpBearer
 from ninja.files import UploadedFile
+from ninja.pagination import paginate
 from django.db.models import Q
 from django.conf import settings
 from django.http import HttpRequest
@@ -17,16 +19,51 @@ from .schemas import (
     RoleSchema, LoginSchemaIn
 )
 from .models import User
-from helpers import make_errors, image_is_valid
+from .cache import token_cache, RECORD_FIELDS
+from .hashing import aset_password, acheck_password
+from helpers import make_errors, aimage_is_valid
+from thumbnails.derivatives import agenerate_thumbnails, adelete_thumbnails
 
 router = Router(tags=['users'])
 logger = logging.getLogger("django")
 
 
+class TokenUser:
+    """
+    User built from verified token claims or a cached record, it is never
+    saved. Endpoints changing the account load the `User` by `pk`.
+    """
+
+    is_authenticated = True
+
+    def __init__(self, claims: dict):
+        self.pk = self.id = claims['uid']
+        self.username = claims.get('username')
+        self.email = claims.get('email')
+        self.is_staff = bool(claims.get('staff'))
+        self.is_superuser = bool(claims.get('superuser'))
+        self.token_version = claims['ver']
+
+    @classmethod
+    def from_record(cls, record: dict):
+        return cls({'uid': record['id'], 'ver': record['token_version'],
+                    'staff': record['is_staff'], 'superuser': record['is_superuser']})
+
+    def __str__(self):
+        return self.username
+
+
 class AsyncHttpBearer(HttpBearer):
-    def __init__(self, is_staff=None, is_superuser=None) -> None:
+    """
+    With `stateless` set, signed token claims are trusted instead of loading
+    the user from the database and `request.auth` is a `TokenUser`. Only
+    the token version is checked, which is served from the token cache.
+    """
+
+    def __init__(self, is_staff=None, is_superuser=None, stateless=False) -> None:
         self.staff = is_staff
         self.super = is_superuser
+        self.stateless = stateless
         return super().__init__()
 
     async def __call__(self, request: HttpRequest) -> Optional[Any]:
@@ -43,11 +80,47 @@ class AsyncHttpBearer(HttpBearer):
         token = " ".join(parts[1:])
         return await self.authenticate(request, token)
 
-    async def authenticate(self, request: HttpRequest, token: str):
+    def decode_claims(self, token: str) -> Optional[dict]:
         try:
-            user = await User.objects.aget(token=token)
-        except User.DoesNotExist:
-            pass
+            claims = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+        except jwt.InvalidTokenError:
+            return None
+        if claims.get('uid') is None or claims.get('ver') is None:
+            return None
+        return claims
+
+    async def current_version(self, user_id: int) -> Optional[int]:
+        current = await token_cache.aget_version(user_id)
+        if current is None:
+            current = await User.objects.filter(pk=user_id).values_list(
+                'token_version', flat=True).afirst()
+            if current is not None:
+                await token_cache.aset_version(user_id, current)
+        return current
+
+    async def verify_claims(self, claims: dict) -> Optional[TokenUser]:
+        if await self.current_version(claims['uid']) != claims['ver']:
+            return None
+        return TokenUser(claims)
+
+    async def authenticate(self, request: HttpRequest, token: str):
+        claims = self.decode_claims(token) if self.stateless else None
+        if claims is not None:
+            # Revoked tokens are not looked up again by their value
+            user = await self.verify_claims(claims)
+        else:
+            record = await token_cache.aget(token)
+            if record is None:
+                record = await User.objects.filter(token=token).values(
+                    *RECORD_FIELDS).afirst()
+                if record is None:
+                    return None
+                await token_cache.aset(token, record)
+            user = TokenUser.from_record(record)
+            if await self.current_version(user.pk) != user.token_version:
+                return None
+        if user is None:
+            return None
 
         # If either of options has been specified we can return the user
         if self.staff == self.super and self.staff is None:
@@ -70,8 +143,6 @@ async def create_account(request, data: Form[RegistrationSchema]):
         if k not in ['password1', 'password2']:
             setattr(user, k, value)
 
-    user.set_password(data.password1)
-
     errors = []
 
     # Check if email address is not already taken
@@ -87,17 +158,19 @@ async def create_account(request, data: Form[RegistrationSchema]):
     if errors:
         raise ValidationError(errors)
 
+    await aset_password(user, data.password1)
     await user.asave()
     return 201, user
 
 
-@router.get('', response=List[UserSchema], auth=AsyncHttpBearer(is_superuser=True))
+@router.get('', response=List[UserSchema], auth=AsyncHttpBearer(is_superuser=True, stateless=True))
+@paginate
 async def get_users(request, filters: Query[UserFilter]):
     qs = User.objects.all()
-    return await sync_to_async(list)(filters.filter(qs))
+    return filters.filter(qs)
 
 
-@router.get('/{int:user_id}', response=UserSchema, auth=AsyncHttpBearer(is_superuser=True))
+@router.get('/{int:user_id}', response=UserSchema, auth=AsyncHttpBearer(is_superuser=True, stateless=True))
 async def get_user(request, user_id: int):
     return await aget_object_or_404(User, pk=user_id)
 
@@ -106,7 +179,7 @@ async def get_user(request, user_id: int):
 async def update_user(request, data: Form[UserUpdateSchema], avatar:
                       UploadedFile = File(None)):
     data = data.dict(exclude_unset=True)
-    user = request.auth
+    user = await aget_object_or_404(User, pk=request.auth.pk)
 
     # Set attributes
     for k, value in data.items():
@@ -114,37 +187,43 @@ async def update_user(request, data: Form[UserUpdateSchema], avatar:
 
     if avatar:
         # Check if provided image is valid
-        if not image_is_valid(avatar):
+        if not await aimage_is_valid(avatar):
             raise ValidationError([
                 make_errors("avatar", _("File is not a valid image"))
             ])
         if user.avatar:
+            await adelete_thumbnails(user.avatar)
             await sync_to_async(user.avatar.delete)(save=False)
         await sync_to_async(user.avatar.save)(avatar.name, avatar, save=False)
 
     await user.asave()
+    if avatar:
+        await agenerate_thumbnails(user.avatar)
     return user
 
 
 @router.delete('', auth=AsyncHttpBearer(), response={204: None})
 async def delete_account(request):
-    user = request.auth
+    user = await aget_object_or_404(User, pk=request.auth.pk)
 
     # Delete user's avatar
     if (user.avatar):
+        await adelete_thumbnails(user.avatar)
         await sync_to_async(user.avatar.delete)(save=False)
 
+    user_id = user.pk
     await user.adelete()
+    await token_cache.ainvalidate(user.token, user_id)
     return 204, None
 
 
 @router.post('/password-change', auth=AsyncHttpBearer(), response=LoginSchemaOut)
 async def change_password(request, data: Form[PasswordChangeSchema]):
-    user = request.auth
+    user = await aget_object_or_404(User, pk=request.auth.pk)
     errors = []
 
     # Check if `old_password` matches current
-    if not user.check_password(data.old_password):
+    if not await acheck_password(user, data.old_password):
         errors.append(
             make_errors('old_password', _('Old password is invalid'))
         )
@@ -156,8 +235,11 @@ async def change_password(request, data: Form[PasswordChangeSchema]):
                     'New password can not be the same'))
             )
         else:
-            user.set_password(data.password1)
+            old_token = user.token
+            await aset_password(user, data.password1)
+            user._revoke_token()
             await user.asave()
+            await token_cache.ainvalidate(old_token, user.pk)
             return user
 
     if errors:
@@ -170,7 +252,11 @@ async def update_role(request, user_id: int, data: Form[RoleSchema]):
     user = await aget_object_or_404(User, pk=user_id)
     user.is_superuser = data.is_superuser
     user.is_staff = data.is_staff
+    # Issued tokens carry the old role
+    old_token = user.token
+    user._revoke_token()
     await user.asave()
+    await token_cache.ainvalidate(old_token, user.pk)
     return 200, user
 
 
@@ -181,7 +267,7 @@ async def login(request, data: Form[LoginSchemaIn]):
         user = await User.objects.aget(
             Q(username=data.username) | Q(email=data.username))
 
-        if user.check_password(data.password):
+        if await acheck_password(user, data.password):
             return user
 
         errors.append(
@@ -199,7 +285,9 @@ async def login(request, data: Form[LoginSchemaIn]):
 
 @router.patch('/generate-token', auth=AsyncHttpBearer(), response=LoginSchemaOut)
 async def generate_token(request):
-    user = request.auth
-    user._generate_token()
+    user = await aget_object_or_404(User, pk=request.auth.pk)
+    old_token = user.token
+    user._revoke_token()
     await user.asave()
+    await token_cache.ainvalidate(old_token, user.pk)
     return user
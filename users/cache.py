@@ -0,0 +1,111 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from django.conf import settings
+from django.core.cache import caches
+
+
+# Fields of the cached records
+RECORD_FIELDS = ['id', 'token_version', 'is_staff', 'is_superuser']
+
+
+class TokenCache:
+    """
+    Maps authentication tokens to the few user fields authorization needs
+    and user IDs to their token versions, so authenticated requests do not
+    have to query the users table. By default records live in a bounded
+    in-process LRU, when `alias` is given Django's cache framework is used
+    instead, which lets several workers share invalidations.
+
+    Every cached token is checked against the token version of its owner.
+    Versions bumped by another worker are noticed after `version_ttl`
+    seconds, unless the cache is shared.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300,
+                 alias: Optional[str] = None, version_ttl: float = 5):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.alias = alias
+        self.version_ttl = ttl if alias else min(ttl, version_ttl)
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    def _key(self, token: str):
+        return 'auth-token:' + hashlib.sha256(token.encode()).hexdigest()
+
+    def _get(self, key: str):
+        with self._lock:
+            entry = self._records.get(key)
+            if entry is None:
+                return None
+            expires, record = entry
+            if expires < time.monotonic():
+                del self._records[key]
+                return None
+            self._records.move_to_end(key)
+            return record
+
+    def _set(self, key: str, record, ttl: float):
+        with self._lock:
+            self._records[key] = (time.monotonic() + ttl, record)
+            self._records.move_to_end(key)
+            while len(self._records) > self.max_size:
+                self._records.popitem(last=False)
+
+    async def _aget(self, key: str):
+        if not self.enabled:
+            return None
+        if self.alias:
+            return await caches[self.alias].aget(key)
+        return self._get(key)
+
+    async def _aset(self, key: str, value, ttl: Optional[float] = None):
+        if not self.enabled:
+            return
+        ttl = ttl or self.ttl
+        if self.alias:
+            await caches[self.alias].aset(key, value, ttl)
+        else:
+            self._set(key, value, ttl)
+
+    async def aget(self, token: str) -> Optional[dict]:
+        return await self._aget(self._key(token))
+
+    async def aset(self, token: str, record: dict):
+        # Password hashes and profiles never leave the database
+        await self._aset(self._key(token), {field: record[field] for field in RECORD_FIELDS})
+
+    async def aget_version(self, user_id: int) -> Optional[int]:
+        return await self._aget(f'auth-version:{user_id}')
+
+    async def aset_version(self, user_id: int, version: int):
+        await self._aset(f'auth-version:{user_id}', version, self.version_ttl)
+
+    async def ainvalidate(self, token: str, user_id: Optional[int] = None):
+        keys = [self._key(token)]
+        if user_id is not None:
+            keys.append(f'auth-version:{user_id}')
+        if self.alias:
+            await caches[self.alias].adelete_many(keys)
+        with self._lock:
+            for key in keys:
+                self._records.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+token_cache = TokenCache(
+    max_size=getattr(settings, 'TOKEN_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'TOKEN_CACHE_TTL', 300),
+    alias=getattr(settings, 'TOKEN_CACHE_ALIAS', None),
+    version_ttl=getattr(settings, 'TOKEN_VERSION_TTL', 5),
+)
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    check_password, make_password, get_hasher, identify_hasher
+)
+from django.utils.translation import gettext_lazy as _
+from ninja.errors import HttpError
+
+
+class HasherPool:
+    """
+    Runs password hashing in a small dedicated thread pool, so PBKDF2 does
+    not block the event loop and a burst of logins can use at most
+    `max_workers` cores. Calls above `max_pending` are rejected.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.max_workers, thread_name_prefix='password-hasher')
+        return self._executor
+
+    def _call(self, func, *args):
+        with self._lock:
+            self.running += 1
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HttpError(503, _('Server is busy, try again later'))
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, partial(self._call, func, *args))
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'pending': self.pending,
+                'running': self.running,
+                'queued': self.pending - self.running,
+                'peak_pending': self.peak_pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+            }
+
+
+hasher_pool = HasherPool(
+    max_workers=getattr(settings, 'PASSWORD_HASHING_WORKERS',
+                        min(4, os.cpu_count() or 1)),
+    max_pending=getattr(settings, 'PASSWORD_HASHING_MAX_PENDING', 256),
+)
+
+
+async def aset_password(user, raw_password: str):
+    user.password = await hasher_pool.run(make_password, raw_password)
+    # Lets password validators know the password changed, like set_password
+    user._password = raw_password
+
+
+async def acheck_password(user, raw_password: str) -> bool:
+    encoded = user.password
+    is_correct = await hasher_pool.run(check_password, raw_password, encoded)
+
+    # Upgrade hashes created with outdated algorithm or parameters
+    if is_correct:
+        preferred = get_hasher()
+        hasher = identify_hasher(encoded)
+        if hasher.algorithm != preferred.algorithm or preferred.must_update(encoded):
+            await aset_password(user, raw_password)
+            user._password = None
+            await user.asave(update_fields=['password'])
+    return is_correct
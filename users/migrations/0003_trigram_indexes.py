@@ -0,0 +1,18 @@
+from django.db import migrations
+
+from indexes import TrigramIndex
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_token_version'),
+    ]
+
+    operations = [
+        # PostgreSQL only, used by icontains filters
+        TrigramIndex(model_name='user', field='username', name='user_username_trgm'),
+        TrigramIndex(model_name='user', field='email', name='user_email_trgm'),
+        TrigramIndex(model_name='user', field='first_name', name='user_first_name_trgm'),
+        TrigramIndex(model_name='user', field='last_name', name='user_last_name_trgm'),
+    ]
@@ -28,7 +28,11 @@ class Manager(UserManager):
 class User(AbstractUser):
     email = models.EmailField(_("email address"), unique=True)
     avatar = models.ImageField(upload_to='avatars', blank=True, null=True)
+    # Sizes of generated thumbnails, see `thumbnails.derivatives`
+    avatar_thumbnails = models.JSONField(default=list, blank=True, editable=False)
     token = models.TextField(unique=True)
+    # Bumped whenever issued tokens have to stop working
+    token_version = models.PositiveIntegerField(default=0)
 
     objects = Manager()
 
@@ -37,13 +41,26 @@ class User(AbstractUser):
 
     def _generate_token(self):
         self.token = jwt.encode(
-            {"username": self.username, "email": self.email,
-             "iat": timezone.now()},
+            {"uid": self.pk, "username": self.username, "email": self.email,
+             "staff": self.is_staff, "superuser": self.is_superuser,
+             "ver": self.token_version, "iat": timezone.now()},
             settings.SECRET_KEY,
             algorithm="HS256"
         )
 
+    def _revoke_token(self):
+        """Invalidate all tokens issued so far and generate a new one"""
+        self.token_version += 1
+        self._generate_token()
+
     def save(self, *args, **kwargs):
-        if not self.token:
+        generated = not self.token
+        if generated:
             self._generate_token()
+        inserted = self.pk is None
         super().save(*args, **kwargs)
+
+        # User ID is known after the first insert, the token has to carry it
+        if generated and inserted:
+            self._generate_token()
+            super().save(update_fields=['token'])
@@ -1,9 +1,10 @@
 from ninja import ModelSchema, Schema, FilterSchema, Field
 from django.utils.translation import gettext_lazy as _
 from pydantic import field_validator, EmailStr, ValidationInfo
-from typing import Optional
+from typing import Optional, Dict
 
 from .models import User
+from thumbnails.derivatives import thumbnail_urls
 
 
 class PasswordMixin(Schema):
@@ -65,6 +66,8 @@ class RegistrationSchema(PasswordMixin):
 
 
 class UserSchema(ModelSchema):
+    avatar_thumbnails: Optional[Dict[str, str]] = Field(None)
+
     class Meta:
         model = User
         fields = [
@@ -72,6 +75,10 @@ class UserSchema(ModelSchema):
             'avatar', 'is_superuser', 'is_staff'
         ]
 
+    @staticmethod
+    def resolve_avatar_thumbnails(obj):
+        return thumbnail_urls(obj.avatar, obj.avatar_thumbnails)
+
 
 class LoginSchemaOut(UserSchema):
     token: str
@@ -1,11 +1,16 @@
 import tempfile
 import time
+import jwt
+from django.conf import settings
 from django.core.files import File
-from helpers import TestHelper
+from helpers import TestHelper, plain_storage
+from ninja.errors import HttpError
 from ninja.testing import TestAsyncClient
 
-from users.api import router
+from users.api import router, AsyncHttpBearer, TokenUser
 from users.models import User
+from users.cache import token_cache
+from users.hashing import hasher_pool, aset_password, acheck_password
 
 
 class TestCreate(TestHelper):
@@ -75,7 +80,8 @@ class TestRead(TestHelper):
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response2.status_code, 401)
-        self.assertEqual(len(json), 2)
+        self.assertEqual(json['count'], 2)
+        self.assertEqual(len(json['items']), 2)
 
     async def test_only_superuser_can_retrieve_user(self):
         super = await self.create_user(superuser=True)
@@ -92,6 +98,7 @@ class TestRead(TestHelper):
         self.assertEqual(json['username'], super.username)
 
 
+@plain_storage
 class TestUpdate(TestHelper):
     @classmethod
     def setUpClass(cls):
@@ -143,6 +150,7 @@ class TestUpdate(TestHelper):
             self.assertTrue(self.fileExists(td, f"avatars/{image.name}"))
 
 
+@plain_storage
 class TestDelete(TestHelper):
 
     def setUp(self):
@@ -238,3 +246,134 @@ class TestMisc(TestHelper):
 
         self.assertEqual(response.status_code, 200)
         self.assertNotEqual(old_token, js["token"])
+
+
+class TestAuthentication(TestHelper):
+    def setUp(self):
+        self.client = TestAsyncClient(router)
+
+    async def test_authenticated_user_is_served_from_cache(self):
+        user = await self.create_user(superuser=True)
+        headers = self.make_auth_header(user)
+
+        await self.client.get(f'/{user.pk}', headers=headers)
+        # Bypasses cache invalidation, so only the cached record knows the token
+        await User.objects.filter(pk=user.pk).aupdate(token='rotated')
+        response = await self.client.get(f'/{user.pk}', headers=headers)
+
+        self.assertEqual(response.status_code, 200)
+
+    async def test_cached_record_holds_only_authorization_fields(self):
+        user = await self.create_user()
+        headers = self.make_auth_header(user)
+        await self.client.patch('', {'first_name': 'Bill'}, headers=headers)
+
+        # Changed by another worker, this one still has the token cached
+        await User.objects.filter(pk=user.pk).aupdate(password='changed-elsewhere')
+        response = await self.client.patch('', {'last_name': 'Joel'}, headers=headers)
+        record = await token_cache.aget(user.token)
+
+        await user.arefresh_from_db()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(record), {'id', 'token_version', 'is_staff', 'is_superuser'})
+        self.assertEqual(user.password, 'changed-elsewhere')
+        self.assertEqual((user.first_name, user.last_name), ('Bill', 'Joel'))
+
+    async def test_revoked_token_is_not_accepted_from_token_cache(self):
+        user = await self.create_user(superuser=True)
+        headers = self.make_auth_header(user)
+        # Caches the token record and the version
+        await self.client.patch('', {'first_name': 'Bill'}, headers=headers)
+
+        # Revoked by another worker, the version expired here meanwhile
+        await User.objects.filter(pk=user.pk).aupdate(token_version=5)
+        await token_cache.ainvalidate('', user.pk)
+        response = await self.client.get(f'/{user.pk}', headers=headers)
+        response2 = await self.client.patch('', {'first_name': 'Joe'}, headers=headers)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response2.status_code, 401)
+
+    async def test_unknown_token_is_rejected(self):
+        response = await self.client.get('', headers={'Authorization': 'Bearer junk'})
+
+        self.assertEqual(response.status_code, 401)
+
+    async def test_old_token_is_rejected_after_generating_new_one(self):
+        user = await self.create_user(superuser=True)
+        headers = self.make_auth_header(user)
+        await self.client.get(f'/{user.pk}', headers=headers)
+
+        time.sleep(1)
+        await self.client.patch('/generate-token', headers=headers)
+        response = await self.client.get(f'/{user.pk}', headers=headers)
+
+        self.assertEqual(response.status_code, 401)
+
+    async def test_role_change_revokes_issued_tokens(self):
+        user = await self.create_user(superuser=True)
+        normie = await self.create_user(username='Frank')
+        normie_headers = self.make_auth_header(normie)
+        await self.client.get(f'/{normie.pk}', headers=normie_headers)
+
+        await self.client.post(
+            f'/{normie.pk}', {'is_superuser': True, 'is_staff': False},
+            headers=self.make_auth_header(user))
+        await normie.arefresh_from_db()
+        response = await self.client.get(f'/{normie.pk}', headers=normie_headers)
+        response2 = await self.client.get(
+            f'/{normie.pk}', headers=self.make_auth_header(normie))
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response2.status_code, 200)
+
+    async def test_token_carries_verifiable_claims(self):
+        user = await self.create_user(superuser=True)
+        claims = jwt.decode(user.token, settings.SECRET_KEY, algorithms=['HS256'])
+        forged = jwt.encode(claims, 'not-the-secret', algorithm='HS256')
+
+        response = await self.client.get(
+            f'/{user.pk}', headers={'Authorization': f'Bearer {forged}'})
+
+        self.assertEqual(claims['uid'], user.pk)
+        self.assertTrue(claims['superuser'])
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stateless_mode_does_not_load_user(self):
+        user = await self.create_user(superuser=True)
+        headers = self.make_auth_header(user)
+        auth = AsyncHttpBearer(is_superuser=True, stateless=True)
+
+        # Token lookup would fail, only the claims can authenticate the user
+        await User.objects.filter(pk=user.pk).aupdate(token='rotated')
+        token_user = await auth.authenticate(None, user.token)
+
+        self.assertIsInstance(token_user, TokenUser)
+        self.assertEqual(token_user.pk, user.pk)
+
+
+class TestPasswordHashing(TestHelper):
+    async def test_password_is_hashed_in_worker_pool(self):
+        user = User(username='mark')
+        completed = hasher_pool.stats()['completed']
+
+        await aset_password(user, 'Test1234')
+        is_correct = await acheck_password(user, 'Test1234')
+        is_wrong = await acheck_password(user, 'Test12345')
+
+        self.assertTrue(is_correct)
+        self.assertFalse(is_wrong)
+        self.assertEqual(hasher_pool.stats()['completed'], completed + 3)
+        self.assertEqual(hasher_pool.stats()['pending'], 0)
+
+    async def test_hashing_is_rejected_when_pool_is_saturated(self):
+        user = User(username='mark')
+        max_pending = hasher_pool.max_pending
+        hasher_pool.max_pending = 0
+        try:
+            with self.assertRaises(HttpError) as e:
+                await aset_password(user, 'Test1234')
+        finally:
+            hasher_pool.max_pending = max_pending
+
+        self.assertEqual(e.exception.status_code, 503)
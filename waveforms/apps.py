@@ -0,0 +1,5 @@
+from django.apps import AppConfig
+
+
+class WaveformsConfig(AppConfig):
+    name = 'waveforms'
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from tracks.models import Track
+from waveforms.peaks import generate_peaks
+
+
+class Command(BaseCommand):
+    help = 'Compute waveform peaks of already uploaded tracks'
+
+    def handle(self, *args, **options):
+        created = 0
+        for track in Track.objects.only('pk', 'file').iterator():
+            if generate_peaks(track.file):
+                created += 1
+        self.stdout.write(f'Track: {created} files processed')
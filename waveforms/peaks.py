@@ -0,0 +1,188 @@
+import logging
+import struct
+import subprocess
+import wave
+from typing import Iterator, List, Tuple
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db.models.fields.files import FieldFile
+
+from transcoding.transcoders import local_path
+
+
+logger = logging.getLogger("django")
+
+# Zoom levels in audio samples per pixel, each one a multiple of the first
+WAVEFORM_LEVELS = getattr(settings, 'WAVEFORM_LEVELS', [256, 1024, 4096])
+# Peaks are stored as 8 or 16 bit integers
+WAVEFORM_BITS = getattr(settings, 'WAVEFORM_BITS', 8)
+# Sample rate of audio decoded with ffmpeg, WAV files keep theirs
+DECODE_RATE = 44100
+# Frames decoded at once, memory use does not depend on the track length
+CHUNK_FRAMES = WAVEFORM_LEVELS[0] * 1024
+
+# Header of audiowaveform's `.dat` format, version 1 is single channel
+HEADER = struct.Struct('<iIiiI')
+CONTENT_TYPE = 'application/octet-stream'
+
+
+class DecodingError(Exception):
+    pass
+
+
+def peaks_name(name: str, samples_per_pixel: int) -> str:
+    return f'waveforms/{samples_per_pixel}/{name}.dat'
+
+
+def peaks_storage():
+    return storages['waveforms']
+
+
+def _to_int16(data: bytes, width: int) -> np.ndarray:
+    if width == 1:
+        return (np.frombuffer(data, np.uint8).astype(np.int16) - 128) << 8
+    if width == 2:
+        return np.frombuffer(data, '<i2')
+    if width == 3:
+        # Two most significant bytes of little endian 24 bit samples
+        return np.frombuffer(np.frombuffer(data, np.uint8).reshape(-1, 3)[:, 1:].tobytes(), '<i2')
+    return (np.frombuffer(data, '<i4') >> 16).astype(np.int16)
+
+
+def _mono(samples: np.ndarray, channels: int) -> np.ndarray:
+    if channels == 1:
+        return samples
+    return (samples.reshape(-1, channels).astype(np.int32).sum(axis=1) // channels).astype(np.int16)
+
+
+def _read_wav(path: str) -> Tuple[int, Iterator[np.ndarray]]:
+    wav = wave.open(path, 'rb')
+    channels, width = wav.getnchannels(), wav.getsampwidth()
+
+    def chunks():
+        with wav:
+            while True:
+                data = wav.readframes(CHUNK_FRAMES)
+                if not data:
+                    break
+                yield _mono(_to_int16(data, width), channels)
+    return wav.getframerate(), chunks()
+
+
+def _read_ffmpeg(path: str) -> Tuple[int, Iterator[np.ndarray]]:
+    command = [
+        'ffmpeg', '-nostdin', '-v', 'error', '-i', path, '-map', '0:a:0',
+        '-ac', '1', '-ar', str(DECODE_RATE), '-f', 's16le', '-',
+    ]
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise DecodingError('ffmpeg is not installed')
+
+    def chunks():
+        try:
+            while True:
+                data = process.stdout.read(CHUNK_FRAMES * 2)
+                if not data:
+                    break
+                yield np.frombuffer(data[:len(data) // 2 * 2], '<i2')
+        finally:
+            process.stdout.close()
+            if process.wait() != 0:
+                raise DecodingError(process.stderr.read().decode(errors='replace').strip())
+            process.stderr.close()
+    return DECODE_RATE, chunks()
+
+
+def read_pcm(path: str) -> Tuple[int, Iterator[np.ndarray]]:
+    """
+    Sample rate and chunks of mono 16 bit samples of the audio file. WAV
+    is read directly, everything else is decoded with ffmpeg.
+    """
+    try:
+        return _read_wav(path)
+    except (wave.Error, EOFError):
+        return _read_ffmpeg(path)
+
+
+def min_max(mins: np.ndarray, maxs: np.ndarray, factor: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge every `factor` consecutive peaks, the last group may be shorter"""
+    if not len(mins):
+        return mins, maxs
+    starts = np.arange(0, len(mins), factor)
+    return np.minimum.reduceat(mins, starts), np.maximum.reduceat(maxs, starts)
+
+
+def compute_peaks(chunks: Iterator[np.ndarray], levels: List[int]) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Minimum and maximum of every block of samples for each zoom level. Only
+    the finest level reads the samples, coarser ones merge its peaks.
+    """
+    finest = levels[0]
+    mins, maxs = [], []
+    for samples in chunks:
+        # Chunks hold whole blocks, except the last one
+        lo, hi = min_max(samples, samples, finest)
+        mins.append(lo)
+        maxs.append(hi)
+    mins = np.concatenate(mins) if mins else np.zeros(0, np.int16)
+    maxs = np.concatenate(maxs) if maxs else np.zeros(0, np.int16)
+    return [min_max(mins, maxs, level // finest) for level in levels]
+
+
+def encode_peaks(mins: np.ndarray, maxs: np.ndarray, sample_rate: int,
+                 samples_per_pixel: int, bits: int = 8) -> bytes:
+    """Peaks in audiowaveform's binary format, as read by peaks.js"""
+    if bits == 8:
+        # Arithmetic shift keeps the sign
+        mins, maxs = (mins >> 8).astype(np.int8), (maxs >> 8).astype(np.int8)
+    data = np.column_stack((mins, maxs)).astype(mins.dtype.newbyteorder('<')).tobytes()
+    flags = 1 if bits == 8 else 0
+    return HEADER.pack(1, flags, sample_rate, samples_per_pixel, len(mins)) + data
+
+
+def generate_peaks(file: FieldFile) -> bool:
+    """Store peaks of the audio file for every zoom level"""
+    if not file:
+        return False
+
+    storage = peaks_storage()
+    names = {level: peaks_name(file.name, level) for level in WAVEFORM_LEVELS}
+    # Shared files have their peaks already
+    if all(storage.exists(name) for name in names.values()):
+        return True
+
+    try:
+        with local_path(file) as path:
+            rate, chunks = read_pcm(path)
+            levels = compute_peaks(chunks, WAVEFORM_LEVELS)
+    except (OSError, DecodingError) as e:
+        logger.warning(f"Could not compute peaks of '{file.name}': {e}")
+        return False
+
+    for level, (mins, maxs) in zip(WAVEFORM_LEVELS, levels):
+        name = names[level]
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(encode_peaks(mins, maxs, rate, level, WAVEFORM_BITS)))
+    return True
+
+
+def delete_peaks(file: FieldFile):
+    """Delete peaks, unless the audio file is still used by other records"""
+    if not file:
+        return
+    references = getattr(file.storage, 'references', None)
+    if references and references(file.name) > 1:
+        return
+
+    storage = peaks_storage()
+    for level in WAVEFORM_LEVELS:
+        storage.delete(peaks_name(file.name, level))
+
+
+async def adelete_peaks(file: FieldFile):
+    await sync_to_async(delete_peaks)(file)
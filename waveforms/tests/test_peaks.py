@@ -0,0 +1,82 @@
+import io
+import struct
+import tempfile
+import wave
+from datetime import timedelta
+import numpy as np
+from asgiref.sync import sync_to_async
+
+from helpers import TestHelper
+
+from tracks.models import Track
+from waveforms.peaks import (
+    HEADER, WAVEFORM_LEVELS, compute_peaks, generate_peaks, peaks_name, peaks_storage
+)
+
+
+class TestPeaks(TestHelper):
+    def stereo_file(self, frames: int, rate: int = 8000):
+        # Left channel is a ramp, right one is silent
+        left = np.arange(frames, dtype=np.int16) * 2
+        samples = np.column_stack((left, np.zeros(frames, np.int16))).ravel()
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(rate)
+            wav.writeframes(samples.tobytes())
+        return self.content_file(buffer.getvalue(), 'ramp.wav')
+
+    def read(self, name):
+        with peaks_storage().open(name, 'rb') as f:
+            data = f.read()
+        return HEADER.unpack(data[:HEADER.size]), np.frombuffer(data[HEADER.size:], np.int8)
+
+    def test_coarse_levels_merge_fine_peaks(self):
+        samples = np.array([5, -3, 8, 1, -7, 2, 0, 4, 9, -1], np.int16)
+
+        (mins, maxs), (mins2, maxs2) = compute_peaks(iter([samples[:8], samples[8:]]), [2, 4])
+
+        self.assertEqual(mins.tolist(), [-3, 1, -7, 0, -1])
+        self.assertEqual(maxs.tolist(), [5, 8, 2, 4, 9])
+        self.assertEqual(mins2.tolist(), [-3, -7, -1])
+        self.assertEqual(maxs2.tolist(), [8, 4, 9])
+
+    def test_peaks_are_stored_for_every_level(self):
+        frames = 10000
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            track = Track.objects.create(
+                file=self.stereo_file(frames), title='Ramp', duration=timedelta(seconds=1))
+
+            self.assertTrue(generate_peaks(track.file))
+
+            for level in WAVEFORM_LEVELS:
+                header, data = self.read(peaks_name(track.file.name, level))
+                length = -(-frames // level)
+                self.assertEqual(header, (1, 1, 8000, level, length))
+                self.assertEqual(len(data), length * 2)
+            # Channels are averaged, 8 bit peaks keep the high byte
+            header, data = self.read(peaks_name(track.file.name, WAVEFORM_LEVELS[0]))
+            self.assertEqual(data[:4].tolist(), [0, 0, 1, 1])
+
+    async def test_guest_can_get_peaks(self):
+        with tempfile.TemporaryDirectory() as td, self.settings(MEDIA_ROOT=td):
+            track = await Track.objects.acreate(
+                file=self.stereo_file(3000), title='Ramp', duration=timedelta(seconds=1))
+            url = f'/api/tracks/{track.pk}/peaks'
+
+            response = await self.async_client.get(url)
+            await sync_to_async(generate_peaks)(track.file)
+            response2 = await self.async_client.get(url)
+            response3 = await self.async_client.get(url, {'samples_per_pixel': 4096})
+            response4 = await self.async_client.get(url, {'samples_per_pixel': 100})
+
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response2.status_code, 200)
+            self.assertEqual(response2['Content-Type'], 'application/octet-stream')
+            content = response2.getvalue()
+            self.assertEqual(struct.unpack('<i', content[12:16]), (256,))
+            self.assertEqual(len(content), HEADER.size + 2 * 12)
+            self.assertEqual(response3.status_code, 200)
+            self.assertEqual(response4.status_code, 422)
+